@@ -0,0 +1,108 @@
+"""Compare raw dump codecs on write time, read time and size.
+
+Uses the most recent real MLS and rentfaster scrapes if there are any, split into
+pages the same size the scrapers dump, and falls back to made up listings otherwise.
+"""
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+from typing import List
+
+from wheretolive.mls import parse as mls_parse
+from wheretolive.rawdump import available_codecs
+from wheretolive.rawdump import read_dump
+from wheretolive.rawdump import write_dump
+from wheretolive.rfaster import parse as rfaster_parse
+
+
+def _latest_day_listings(parse_module) -> List:
+    """Get the most recent day of raw listings for a source, if there is one."""
+    try:
+        scrape_days = parse_module._find_all_raw_scrape_days()
+    except FileNotFoundError:
+        return list()
+    if not scrape_days:
+        return list()
+    return parse_module._full_day_listings(max(scrape_days))
+
+
+def _fake_listings(n: int = 5_000) -> List:
+    """Make up listings roughly the shape and size of an MLS listing."""
+    words = ["bright", "spacious", "renovated", "garage", "yard", "close", "transit"]
+    return [
+        {
+            "Id": str(i),
+            "MlsNumber": f"A{i:07d}",
+            "PublicRemarks": " ".join(random.choices(words, k=120)),  # noqa: S311
+            "Building": {"Bedrooms": "3 + 1", "BathroomTotal": "2"},
+            "Property": {
+                "PriceUnformattedValue": str(random.randint(1, 2_000) * 1_000),  # noqa: S311
+                "Address": {"Latitude": "51.0", "Longitude": "-114.0"},
+            },
+        }
+        for i in range(n)
+    ]
+
+
+def _pages(listings: List, page_size: int) -> List[List]:
+    return [listings[i : i + page_size] for i in range(0, len(listings), page_size)]
+
+
+def benchmark(listings: List, page_size: int = 100) -> Dict[str, Dict[str, float]]:
+    """Time writing and reading a day's worth of pages with every codec.
+
+    Parameters
+    ----------
+    listings: List
+        Raw listings for a day
+    page_size: int, default 100
+        How many listings go in each dump
+
+    Returns
+    -------
+    Dict[str, Dict[str, float]]
+        Write seconds, read seconds and size in MB per codec
+    """
+    pages = _pages(listings, page_size)
+    results = dict()
+    for codec in available_codecs():
+        with tempfile.TemporaryDirectory() as tmp:
+            dump_dir = Path(tmp)
+            start = time.perf_counter()
+            paths = [
+                write_dump(dump_dir, f"page_{i}", page, codec)
+                for i, page in enumerate(pages)
+            ]
+            write_s = time.perf_counter() - start
+            start = time.perf_counter()
+            n_read = sum(len(read_dump(path)) for path in paths)
+            read_s = time.perf_counter() - start
+            assert n_read == len(listings)  # noqa: S101
+            size_mb = sum(path.stat().st_size for path in paths) / 1_000_000
+        results[codec] = {"write_s": write_s, "read_s": read_s, "size_mb": size_mb}
+    return results
+
+
+def main():
+    """Run the benchmark on every data set we can find and print the results."""
+    data_sets = {
+        "mls": _latest_day_listings(mls_parse),
+        "rfaster": _latest_day_listings(rfaster_parse),
+    }
+    data_sets = {name: listings for name, listings in data_sets.items() if listings}
+    if not data_sets:
+        data_sets = {"synthetic": _fake_listings()}
+    for name, listings in data_sets.items():
+        print(f"\n{name}: {len(listings):,.0f} listings")
+        print(f"{'codec':<8}{'write s':>10}{'read s':>10}{'size MB':>10}")
+        for codec, timing in benchmark(listings).items():
+            print(
+                f"{codec:<8}{timing['write_s']:>10.2f}"
+                f"{timing['read_s']:>10.2f}{timing['size_mb']:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Compare decoding raw MLS dumps into dicts and into typed structs.
+
+Uses the most recent real MLS scrape if there is one and falls back to made up
+listings otherwise, padded out with the agent and photo fields realtor.ca sends so
+the struct decoder has something to skip. Reports the best time of a few runs and
+how much memory the decoded listings take.
+"""
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+from typing import List
+from typing import Tuple
+
+from wheretolive.fastjson import listing_decoder
+from wheretolive.fastjson import loads
+from wheretolive.mls import parse as mls_parse
+from wheretolive.rawdump import write_dump
+
+
+def _latest_day_listings() -> List:
+    """Get the most recent day of raw MLS listings, if there is one."""
+    try:
+        scrape_days = mls_parse._find_all_raw_scrape_days()
+    except FileNotFoundError:
+        return list()
+    if not scrape_days:
+        return list()
+    return mls_parse._full_day_listings(max(scrape_days))
+
+
+def _fake_listings(n: int = 20_000) -> List:
+    """Make up listings shaped like realtor.ca results."""
+    rng = random.Random(0)
+    return [
+        {
+            "Id": str(20_000_000 + i),
+            "MlsNumber": f"A{i:07d}",
+            "PublicRemarks": "Bright and spacious " * 20,
+            "Building": {
+                "StoriesTotal": rng.choice(["1", "2", ""]),
+                "Bedrooms": rng.choice(["3 + 1", "2 + 0", "4", None]),
+                "BathroomTotal": "2",
+                "SizeInterior": rng.choice(["1200 sqft", "92.5 m2", None]),
+                "Type": "House",
+                "SizeExterior": None,
+                "Ammenities": "Exercise Centre, Party Room",
+            },
+            "Individual": [
+                {
+                    "IndividualID": 1_000 + j,
+                    "Name": "Some Realtor",
+                    "Organization": {
+                        "Name": "Some Realty",
+                        "Address": {"AddressText": "1 Main St|Calgary, Alberta"},
+                        "Phones": [
+                            {"PhoneType": "Telephone", "PhoneNumber": "555-1234"}
+                        ],
+                        "Websites": [{"Website": "https://example.com"}],
+                    },
+                    "Phones": [{"PhoneType": "Telephone", "PhoneNumber": "555-5678"}],
+                    "Photo": "https://example.com/agent.jpg",
+                }
+                for j in range(2)
+            ],
+            "Property": {
+                "Price": "$450,000",
+                "PriceUnformattedValue": str(rng.randint(100, 2_000) * 1_000),
+                "Type": "Single Family",
+                "Address": {
+                    "AddressText": f"{i} Some Street SW|Calgary, Alberta",
+                    "Longitude": "-114.07",
+                    "Latitude": "51.05",
+                },
+                "Photo": [
+                    {
+                        "SequenceId": str(j),
+                        "HighResPath": f"https://example.com/{i}/{j}_hi.jpg",
+                        "MedResPath": f"https://example.com/{i}/{j}_med.jpg",
+                        "LowResPath": f"https://example.com/{i}/{j}_lo.jpg",
+                        "LastUpdated": "2022-01-15 3:04:22 PM",
+                    }
+                    for j in range(8)
+                ],
+                "OwnershipType": "Freehold",
+                "ParkingSpaceTotal": "2",
+                "ParkingType": "Garage",
+            },
+            "Land": {"SizeTotal": None, "SizeFrontage": None},
+            "PostalCode": "T2T0A1",
+            "RelativeDetailsURL": f"/real-estate/{i}",
+            "StatusId": "1",
+            "PhotoChangeDateUTC": "2022-01-15 3:04:22 PM",
+            "PriceChangeDateUTC": "2022-01-15 3:04:22 PM",
+            "InsertedDateUTC": str(637_765_000_000_000_000 + i * 10 ** 9),
+        }
+        for i in range(n)
+    ]
+
+
+def _decode_lines(lines: List[bytes], decode: Callable) -> List:
+    return [decode(line) for line in lines]
+
+
+def _measure(lines: List[bytes], decode: Callable, repeats: int) -> Tuple[float, int]:
+    """Best time to decode every line and the memory the result takes."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _decode_lines(lines, decode)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    decoded = _decode_lines(lines, decode)  # noqa: F841
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, size
+
+
+def main(repeats: int = 3):
+    """Time each decoder and print the best of a few runs."""
+    raw = _latest_day_listings()
+    source = "latest scrape"
+    if not raw:
+        raw = _fake_listings()
+        source = "synthetic"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_dump(Path(tmp), "bench", raw, "jsonl")
+        lines = [line for line in path.read_bytes().splitlines() if line]
+    decoders = {
+        "json": json.loads,
+        "fastjson": loads,
+        "structs": listing_decoder("mls").decode,
+    }
+    print(f"{source}: {len(lines):,.0f} listings")
+    results = {
+        name: _measure(lines, decode, repeats) for name, decode in decoders.items()
+    }
+    base_time, base_size = results["json"]
+    for name, (seconds, size) in results.items():
+        print(
+            f"{name:<10}{seconds:>8.3f} s {base_time / seconds:>6.1f}x"
+            f"{size / 1e6:>10.1f} MB {base_size / size:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare the row by row and vectorized MLS cleaners.
+
+Uses the most recent real MLS scrape if there is one and falls back to made up
+listings otherwise. Also checks both cleaners give the same frame.
+"""
+import datetime as dt
+import random
+import time
+from typing import List
+
+import pandas as pd
+
+from wheretolive.mls import parse as mls_parse
+from wheretolive.mls.clean import clean_listings
+
+
+def _latest_day_listings() -> List:
+    """Get the most recent day of raw MLS listings, if there is one."""
+    try:
+        scrape_days = mls_parse._find_all_raw_scrape_days()
+    except FileNotFoundError:
+        return list()
+    if not scrape_days:
+        return list()
+    return mls_parse._full_day_listings(max(scrape_days))
+
+
+def _fake_listings(n: int = 20_000) -> List:
+    """Make up listings with the fields the cleaners look at."""
+    return [
+        {
+            "Id": str(20_000_000 + i),
+            "MlsNumber": f"A{i:07d}",
+            "PublicRemarks": "Bright and spacious",
+            "Building": {
+                "StoriesTotal": random.choice(["1", "2", ""]),  # noqa: S311
+                "Bedrooms": random.choice(["3 + 1", "2 + 0", "4", None]),  # noqa: S311
+                "BathroomTotal": "2",
+                "SizeInterior": random.choice(["1200 sqft", "92.5 m2", None]),  # noqa: S311
+                "Type": "House",
+            },
+            "Property": {
+                "PriceUnformattedValue": str(random.randint(100, 2_000) * 1_000),  # noqa: S311
+                "Type": random.choice(["Single Family"] * 9 + ["Vacant Land"]),  # noqa: S311
+                "Address": {
+                    "AddressText": f"{i} Some Street SW|Calgary, Alberta",
+                    "Longitude": "-114.07",
+                    "Latitude": "51.05",
+                },
+                "OwnershipType": "Freehold",
+            },
+            "Land": {"SizeTotal": None},
+            "PostalCode": "T2T0A1",
+            "RelativeDetailsURL": f"/real-estate/{i}",
+            "PriceChangeDateUTC": "2022-01-15 3:04:22 PM",
+            "InsertedDateUTC": str(637_765_000_000_000_000 + i * 10 ** 9),
+        }
+        for i in range(n)
+    ]
+
+
+def main(repeats: int = 3):
+    """Time both cleaners and print the best of a few runs."""
+    raw = _latest_day_listings()
+    source = "latest scrape"
+    if not raw:
+        raw = _fake_listings()
+        source = "synthetic"
+    date = dt.date.today()
+    timings = dict()
+    frames = dict()
+    for name, cleaner in [
+        ("row by row", mls_parse._clean_rowwise),
+        ("vectorized", clean_listings),
+    ]:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            frames[name] = mls_parse._type_listings(cleaner(iter(raw)), date)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    pd.testing.assert_frame_equal(frames["vectorized"], frames["row by row"])
+    print(f"{source}: {len(raw):,.0f} listings, outputs match")
+    for name, seconds in timings.items():
+        print(f"{name:<12}{seconds:>8.3f} s")
+    print(f"speedup     {timings['row by row'] / timings['vectorized']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Time working out location features in python for a day of listings.
+
+Uses made up reference data shaped like the real thing: nested isochrones for every
+place, mode and cutoff, a few thousand flood polygons and a few hundred grocery
+stores around Calgary, with listings scattered over the same area. Reports the best
+time of a few runs for each feature.
+"""
+import random
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from wheretolive import spatial
+from wheretolive.commutes import CUTOFF_TIMES
+from wheretolive.commutes import MODES
+from wheretolive.commutes import PLACES
+
+_CENTRE = (-114.07, 51.05)
+
+
+def _blob(lon: float, lat: float, radius: float, n_vertices: int = 200) -> Dict:
+    """Roughly round GeoJSON polygon, wobbly like a real isochrone."""
+    rng = random.Random(f"{lon}{lat}{radius}")
+    angles = np.linspace(0, 2 * np.pi, n_vertices, endpoint=False)
+    radii = radius * np.array([1 + 0.1 * rng.random() for _ in angles])
+    ring = np.column_stack([lon + radii * np.cos(angles), lat + radii * np.sin(angles)])
+    ring = np.vstack([ring, ring[:1]])
+    return {"type": "Polygon", "coordinates": [ring.tolist()]}
+
+
+def _fake_isochrones() -> List[Dict]:
+    rng = random.Random(0)
+    isochrones = list()
+    for place in PLACES:
+        lon = _CENTRE[0] + rng.uniform(-0.1, 0.1)
+        lat = _CENTRE[1] + rng.uniform(-0.1, 0.1)
+        for mode in MODES:
+            for cutoff_time in CUTOFF_TIMES:
+                shape = _blob(lon, lat, cutoff_time / 300)
+                entry = {"place_name": place, "mode": mode, "cutoff_time": cutoff_time}
+                isochrones.append({**entry, "shape": shape})
+    return isochrones
+
+
+def _fake_floods(n: int = 3_000) -> Dict[int, Dict]:
+    rng = random.Random(1)
+    return {
+        year: {
+            "features": [
+                {
+                    "geometry": _blob(
+                        _CENTRE[0] + rng.uniform(-0.2, 0.2),
+                        _CENTRE[1] + rng.uniform(-0.2, 0.2),
+                        0.002,
+                        n_vertices=40,
+                    )
+                }
+                for _ in range(n)
+            ]
+        }
+        for year in [20, 100]
+    }
+
+
+def _fake_groceries(n: int = 400) -> pd.DataFrame:
+    rng = np.random.default_rng(2)
+    return pd.DataFrame(
+        {
+            "name": [f"Store {i}" for i in range(n)],
+            "longitude": _CENTRE[0] + rng.uniform(-0.3, 0.3, n),
+            "latitude": _CENTRE[1] + rng.uniform(-0.2, 0.2, n),
+        }
+    )
+
+
+def _best_time(func: Callable, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(n_listings: int = 20_000, repeats: int = 3):
+    """Time each feature and print the best of a few runs."""
+    rng = np.random.default_rng(3)
+    lon = _CENTRE[0] + rng.uniform(-0.3, 0.3, n_listings)
+    lat = _CENTRE[1] + rng.uniform(-0.2, 0.2, n_listings)
+    start = time.perf_counter()
+    commute_index = spatial._commute_index(_fake_isochrones())
+    flood_index = spatial._flood_index(_fake_floods())
+    grocery_index = spatial._grocery_index(_fake_groceries())
+    print(f"Built indexes in {time.perf_counter() - start:.3f} s")
+    features = {
+        "commutes": lambda: spatial.commute_features(commute_index, lon, lat, PLACES),
+        "flood": lambda: spatial.flood_features(flood_index, lon, lat),
+        "grocery": lambda: spatial.grocery_features(grocery_index, lon, lat),
+    }
+    print(f"{n_listings:,.0f} listings")
+    for name, func in features.items():
+        print(f"{name:<10}{_best_time(func, repeats):>8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,25 @@
 """Daily runner to get MLS data and ingest it."""
+import datetime as dt
+import sys
+
+from wheretolive.logconf import get_logger
 from wheretolive.mls.ingest import update_mls_postgis
 from wheretolive.mls.parse import parse_scrapes
 from wheretolive.mls.scrape import scrape_all
 from wheretolive.mls.upload_candidates import upload_candidate
 
+logger = get_logger("daily_mls")
+
 scrape_all()
-parse_scrapes()
+parse_errors = parse_scrapes()
+for day, err in parse_errors.items():
+    logger.error(f"Failed to parse MLS scrape for {day}: {err!r}")
+# Ingest needs today's clean listings, older days that failed don't stop the run
+if dt.date.today() in parse_errors:
+    sys.exit(1)
 update_mls_postgis()
 upload_candidate("ian")
 upload_candidate("parents")
 upload_candidate("jill")
+if parse_errors:
+    sys.exit(1)
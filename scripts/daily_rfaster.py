@@ -4,12 +4,25 @@ Just saves them to the data folder. Separate logic will need to be used to provi
 to a database or cloud data store.
 
 """
+import datetime as dt
+import sys
+
+from wheretolive.logconf import get_logger
 from wheretolive.rfaster.ingest import update_rfaster_gis
 from wheretolive.rfaster.parse import parse_scrapes
 from wheretolive.rfaster.scrape import scrape_all
 from wheretolive.rfaster.upload_candidates import upload_candidate
 
+logger = get_logger("daily_rfaster")
+
 scrape_all()
-parse_scrapes()
+parse_errors = parse_scrapes()
+for day, err in parse_errors.items():
+    logger.error(f"Failed to parse rentfaster scrape for {day}: {err!r}")
+# Ingest needs today's clean listings, older days that failed don't stop the run
+if dt.date.today() in parse_errors:
+    sys.exit(1)
 update_rfaster_gis()
 upload_candidate("ian")
+if parse_errors:
+    sys.exit(1)
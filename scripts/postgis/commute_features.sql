@@ -0,0 +1,10 @@
+-- Fastest commute from each listing to each place by each mode, shared by every
+-- source. Filled by wheretolive.commutes and pivoted by the {source}_commutes views
+CREATE TABLE IF NOT EXISTS public.commute_features (
+  source VARCHAR(10) NOT NULL,
+  listing_id VARCHAR(20) NOT NULL,
+  place_name VARCHAR(50) NOT NULL,
+  commute_mode VARCHAR(50) NOT NULL,
+  cutoff_time INT NOT NULL,
+  PRIMARY KEY (source, listing_id, place_name, commute_mode)
+);
@@ -24,7 +24,8 @@ CREATE TABLE IF NOT EXISTS public.mls (
   link VARCHAR(200),
   price_change_dt TIMESTAMP,
   mls_insert_dt TIMESTAMP,
-  scrape_dt TIMESTAMP
+  scrape_dt TIMESTAMP,
+  delisted_dt TIMESTAMP
 );
 
 SELECT
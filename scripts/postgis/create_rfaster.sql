@@ -1,6 +1,6 @@
 -- Create tables for the raw rentfaster data
 CREATE TABLE IF NOT EXISTS public.rfaster (
-  rfaster_id VARCHAR(10) NOT NULL,
+  rfaster_id VARCHAR(10) NOT NULL PRIMARY KEY,
   price REAL,
   listing_description VARCHAR(5000),
   sq_feet_in REAL,
@@ -22,7 +22,8 @@ CREATE TABLE IF NOT EXISTS public.rfaster (
   cable BOOLEAN,
   util_check_listing BOOLEAN,
   scrape_dt TIMESTAMP,
-  first_seen_dt TIMESTAMP
+  first_seen_dt TIMESTAMP,
+  delisted_dt TIMESTAMP
 );
 
 SELECT
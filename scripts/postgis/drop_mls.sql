@@ -2,5 +2,8 @@
 DROP MATERIALIZED VIEW IF EXISTS mls_wide CASCADE;
 DROP VIEW IF EXISTS mls_flood;
 DROP VIEW IF EXISTS mls_commutes;
+DELETE FROM commute_features WHERE source = 'mls';
 DROP VIEW IF EXISTS mls_grocery;
 DROP TABLE IF EXISTS mls;
+DROP TABLE IF EXISTS mls_history;
+DROP TABLE IF EXISTS mls_staging;
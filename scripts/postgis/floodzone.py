@@ -3,10 +3,14 @@ import json
 from pathlib import Path
 from typing import Dict
 
+import pandas as pd
 import requests
 
 from wheretolive.logconf import get_logger
 from wheretolive.postgis import PostGIS
+from wheretolive.postgis import copy_frame
+from wheretolive.postgis import geojson_ewkt
+from wheretolive.postgis import subdivide_table
 
 logger = get_logger("floodzones")
 
@@ -43,17 +47,6 @@ def get_map(pct: int) -> Dict:
     return floodmap
 
 
-def _insertion_syntax(feature, scenario):
-    """Turn a geoJSON polygon feature into an insertion statement for staging."""
-    geo_shape = feature["geometry"]
-    geo_str = f"ST_GeomFromGeoJSON('{json.dumps(geo_shape)}')"
-    sql = f"""
-        INSERT INTO public.flood_staging (scenario, geom)
-        VALUES ('{scenario}', {geo_str})
-    """
-    return sql
-
-
 def stage_map(pct: int) -> None:
     """Push a map into PostGIS and do the necessary transformations."""
     floodmap = get_map(pct)
@@ -67,19 +60,26 @@ def stage_map(pct: int) -> None:
     );
     """
 
+    features = floodmap["features"]
+    staging_df = pd.DataFrame(
+        {
+            "scenario": scenario,
+            "geom": [geojson_ewkt(feature["geometry"]) for feature in features],
+        }
+    )
+
     with PostGIS().connection.begin() as conn:
         conn.execute(flood_staging)
         logger.info(f"Starting record insertion for {pct}")
-        for feature in floodmap["features"]:
-            sql = _insertion_syntax(feature, scenario)
-            conn.execute(sql)
+        copy_frame(conn, "public.flood_staging", staging_df)
         logger.info(f"Finished record insertion for {pct}")
 
 
 def union_map(year: int, start_fresh: bool = False) -> None:
     """Union all the polygons into one giant multipolygon.
 
-    Note, this takes a few minutes to run.
+    Then cut the map back up into small indexed pieces for looking up listings, see
+    ``subdivide_table``. Note, this takes a few minutes to run.
     """
     dropsql = "DROP TABLE IF EXISTS public.floodmap;"
     createsql = """
@@ -103,6 +103,7 @@ def union_map(year: int, start_fresh: bool = False) -> None:
         conn.execute(createsql)
         conn.execute(insertsql)
         logger.info("Finished aggregation for staged data.")
+        subdivide_table(conn, "public.floodmap")
 
 
 def main():
@@ -1,32 +1,67 @@
 -- Create views of distance to nearest grocery stores for MLS and rentfasters
+-- The 10 closest stores come off the geography index on grocery_stores (made by
+-- push_groceries) with a KNN search, then get re-ranked by distance on a sphere to
+-- keep the 3 nearest. Stores within 1 km get counted off the same index
 DROP VIEW IF EXISTS rfaster_grocery;
 CREATE OR REPLACE VIEW rfaster_grocery AS
 SELECT
   rfaster.rfaster_id AS rfaster_grocery_id,
-  grocery.name AS grocery_store_name,
-  grocery.dist AS m_to_grocery
+  nearest.names[1] AS grocery_store_name,
+  nearest.dists[1] AS m_to_grocery,
+  nearest.names AS nearest_grocery_names,
+  nearest.dists AS m_to_nearest_groceries,
+  nearby.n_stores AS groceries_within_1km
 FROM rfaster
 CROSS JOIN LATERAL (
-SELECT
-  grocery_stores.name,
-  ST_DistanceSphere(rfaster.geom, grocery_stores.geom) AS dist
-FROM grocery_stores
-ORDER BY dist
-		LIMIT 1
-) grocery;
+  SELECT
+    array_agg(name ORDER BY dist) AS names,
+    array_agg(dist ORDER BY dist) AS dists
+  FROM (
+    SELECT name, ST_DistanceSphere(rfaster.geom, geom) AS dist
+    FROM (
+      SELECT name, geom
+      FROM grocery_stores
+      ORDER BY geom::geography <-> rfaster.geom::geography
+      LIMIT 10
+    ) candidates
+    ORDER BY dist
+    LIMIT 3
+  ) k_nearest
+) nearest
+CROSS JOIN LATERAL (
+  SELECT count(*) AS n_stores
+  FROM grocery_stores
+  WHERE ST_DWithin(geom::geography, rfaster.geom::geography, 1000, false)
+) nearby;
 
 DROP VIEW IF EXISTS mls_grocery;
 CREATE OR REPLACE VIEW mls_grocery AS
 SELECT
   mls.mls_id AS mls_grocery_id,
-  grocery.name AS grocery_store_name,
-  grocery.dist AS m_to_grocery
+  nearest.names[1] AS grocery_store_name,
+  nearest.dists[1] AS m_to_grocery,
+  nearest.names AS nearest_grocery_names,
+  nearest.dists AS m_to_nearest_groceries,
+  nearby.n_stores AS groceries_within_1km
 FROM mls
 CROSS JOIN LATERAL (
-SELECT
-  grocery_stores.name,
-  ST_DistanceSphere(mls.geom, grocery_stores.geom) AS dist
-FROM grocery_stores
-ORDER BY dist
-		LIMIT 1
-) grocery;
+  SELECT
+    array_agg(name ORDER BY dist) AS names,
+    array_agg(dist ORDER BY dist) AS dists
+  FROM (
+    SELECT name, ST_DistanceSphere(mls.geom, geom) AS dist
+    FROM (
+      SELECT name, geom
+      FROM grocery_stores
+      ORDER BY geom::geography <-> mls.geom::geography
+      LIMIT 10
+    ) candidates
+    ORDER BY dist
+    LIMIT 3
+  ) k_nearest
+) nearest
+CROSS JOIN LATERAL (
+  SELECT count(*) AS n_stores
+  FROM grocery_stores
+  WHERE ST_DWithin(geom::geography, mls.geom::geography, 1000, false)
+) nearby;
@@ -0,0 +1,46 @@
+-- Move mls and rfaster to incremental ingest. Safe to run more than once.
+-- Listings that drop out of a scrape get a delisted date instead of being deleted,
+-- and every listing, delisting, relisting, price change and (for rentfaster) change
+-- in rented status lands in a history table.
+ALTER TABLE public.mls ADD COLUMN IF NOT EXISTS delisted_dt TIMESTAMP;
+ALTER TABLE public.rfaster ADD COLUMN IF NOT EXISTS delisted_dt TIMESTAMP;
+
+-- Upserts need a unique key to conflict on, mls already has one
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_constraint WHERE conname = 'rfaster_pkey'
+  ) THEN
+    ALTER TABLE public.rfaster ADD CONSTRAINT rfaster_pkey PRIMARY KEY (rfaster_id);
+  END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS public.mls_history (
+  mls_id INTEGER NOT NULL,
+  change_dt TIMESTAMP NOT NULL,
+  change_type VARCHAR(20) NOT NULL,
+  old_price REAL,
+  new_price REAL
+);
+CREATE INDEX IF NOT EXISTS mls_history_id_dt ON public.mls_history (mls_id, change_dt);
+
+CREATE TABLE IF NOT EXISTS public.rfaster_history (
+  rfaster_id VARCHAR(10) NOT NULL,
+  change_dt TIMESTAMP NOT NULL,
+  change_type VARCHAR(20) NOT NULL,
+  old_price REAL,
+  new_price REAL
+);
+CREATE INDEX IF NOT EXISTS rfaster_history_id_dt
+ON public.rfaster_history (rfaster_id, change_dt);
+
+-- Each day's scrape gets copied in here before being merged into the real table.
+-- Unlogged since it's rebuilt from the clean parquet every time anyway
+CREATE UNLOGGED TABLE IF NOT EXISTS public.mls_staging (
+  LIKE public.mls INCLUDING DEFAULTS
+);
+DROP TABLE IF EXISTS public.rfaster_staging;
+CREATE UNLOGGED TABLE public.rfaster_staging (
+  LIKE public.rfaster INCLUDING DEFAULTS
+);
@@ -9,7 +9,10 @@ SQL = """
     JOIN mls_commutes ON mls.mls_id = mls_commutes.mls_commute_id
     JOIN mls_grocery ON mls.mls_id = mls_grocery.mls_grocery_id
     JOIN mls_flood ON mls.mls_id = mls_flood.mls_flood_id
+    WHERE mls.delisted_dt IS NULL
     ;
+    -- Concurrent refreshes need a unique index to match old rows to new ones
+    CREATE UNIQUE INDEX mls_wide_mls_id ON mls_wide (mls_id);
 """
 
 with PostGIS().connection.begin() as conn:
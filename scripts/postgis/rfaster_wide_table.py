@@ -9,7 +9,10 @@ SQL = """
     JOIN rfaster_commutes ON rfaster.rfaster_id = rfaster_commutes.rfaster_commute_id
     JOIN rfaster_grocery ON rfaster.rfaster_id = rfaster_grocery.rfaster_grocery_id
     JOIN rfaster_flood ON rfaster.rfaster_id = rfaster_flood.rfaster_flood_id
+    WHERE rfaster.delisted_dt IS NULL
     ;
+    -- Concurrent refreshes need a unique index to match old rows to new ones
+    CREATE UNIQUE INDEX rfaster_wide_rfaster_id ON rfaster_wide (rfaster_id);
 """
 
 with PostGIS().connection.begin() as conn:
@@ -30,9 +30,21 @@ def create_rfaster():
     exec_sql("create_rfaster.sql")
 
 
+def migrate_listing_history():
+    """Add delisting, history and staging tables for incremental ingest."""
+    exec_sql("listing_history.sql")
+
+
+def create_commute_features():
+    """Create the table of fastest commutes shared by every source."""
+    exec_sql("commute_features.sql")
+
+
 if __name__ == "__main__":
     # drop_mls()
     # create_mls()
     # create_rfaster()
+    # migrate_listing_history()
+    # create_commute_features()
     # exec_sql("grocery_distance.sql")
     exec_sql("floodzonemap.sql")
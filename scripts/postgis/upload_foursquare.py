@@ -4,6 +4,8 @@ from pathlib import Path
 import pandas as pd
 
 from wheretolive.postgis import PostGIS
+from wheretolive.postgis import copy_frame
+from wheretolive.postgis import point_ewkb
 
 
 def grocery_df() -> pd.DataFrame:
@@ -19,14 +21,21 @@ def grocery_df() -> pd.DataFrame:
 
 
 def push_groceries() -> None:
-    """Push the groceries data set into PostGIS."""
+    """Push the groceries data set into PostGIS, indexed for nearest store lookups."""
     gdf = grocery_df()
     with PostGIS().connection.begin() as conn:
-        gdf.to_sql("grocery_stores", conn, index=False, if_exists="replace")
+        gdf.head(0).to_sql("grocery_stores", conn, index=False, if_exists="replace")
         add_geom = "SELECT AddGeometryColumn('public', 'grocery_stores','geom',4326,'POINT',2);"
         conn.execute(add_geom)
-        update_latlong = 'UPDATE public.grocery_stores SET geom = ST_SetSRID(ST_MakePoint("longitude"::double precision, "latitude"::double precision), 4326);'
-        conn.execute(update_latlong)
+        geom = point_ewkb(gdf["longitude"], gdf["latitude"])
+        copy_frame(conn, "grocery_stores", gdf.assign(geom=geom))
+        # Nearest store lookups order and filter by geography distance, which can
+        # only use an index on the geography, not the plain geometry
+        conn.execute(
+            "CREATE INDEX grocery_stores_geog_idx "
+            "ON grocery_stores USING GIST ((geom::geography)); "
+            "ANALYZE grocery_stores;"
+        )
 
 
 if __name__ == "__main__":
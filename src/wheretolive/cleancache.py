@@ -0,0 +1,267 @@
+"""Remember cleaned listings so unchanged listings never get cleaned twice.
+
+Most listings in a day's scrape are exactly the same as the day before. Each cleaned
+listing is saved in a small SQLite database keyed by the hash of its raw content and
+the version of the cleaner that made it, so parsing a day only does real work for
+listings that are new or changed. Bumping a cleaner's version makes every listing
+miss, and anything that hasn't been seen for a while gets thrown out to keep the
+cache from growing forever.
+"""
+import datetime as dt
+import pickle  # noqa: S403
+import sqlite3
+from itertools import islice
+from pathlib import Path
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+# Listings hashed and looked up at once, kept under SQLite's old limit on how many
+# values one query can take
+_BATCH_SIZE = 900
+
+# Marks a listing the cleaner skipped, so it doesn't get cleaned again either
+_SKIPPED = b""
+
+
+def _find_cache_file(source: str) -> Path:
+    """Where a source's cache lives."""
+    data_dir = Path(__file__).resolve().parents[2] / "data"
+    return data_dir / "cache" / f"{source}_clean.sqlite"
+
+
+def source_cache(source: str, version: str) -> "CleanCache":
+    """Open the cache for a source, like "mls" or "rfaster"."""
+    return CleanCache(_find_cache_file(source), version)
+
+
+class CleanCache:
+    """Cleaned listings keyed by raw content hash and cleaner version.
+
+    Parameters
+    ----------
+    path: Path
+        The SQLite file, created if it doesn't exist
+    version: str
+        Version of the cleaner, only entries from the same version are used
+    max_entries: int, default 500,000
+        Most entries to keep, the least recently seen go first past this
+    max_age_days: int, default 30
+        Drop entries that haven't been seen for this many days
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        version: str,
+        max_entries: int = 500_000,
+        max_age_days: int = 30,
+    ) -> None:
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        path.parent.mkdir(exist_ok=True, parents=True)
+        # Days parse in parallel processes, give them a while to wait on each other
+        self._conn = sqlite3.connect(str(path), timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cleaned (
+                hash TEXT NOT NULL,
+                version TEXT NOT NULL,
+                record BLOB NOT NULL,
+                last_seen TEXT NOT NULL,
+                PRIMARY KEY (hash, version)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cleaned_last_seen ON cleaned (last_seen)"
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "CleanCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get_many(self, hashes: List[str], seen: dt.date) -> Dict[str, Optional[Dict]]:
+        """Look up cleaned listings, marking the ones found as seen.
+
+        Parameters
+        ----------
+        hashes: List[str]
+            Raw listing hashes to look up
+        seen: dt.date
+            The scrape day they were seen on
+
+        Returns
+        -------
+        Dict[str, Optional[Dict]]
+            Cleaned listing by hash for every hash found, None for listings the
+            cleaner skipped. Hashes that weren't found are left out
+        """
+        found = dict()
+        unique = list(dict.fromkeys(hashes))
+        placeholders = ",".join("?" * len(unique))
+        rows = self._conn.execute(
+            f"SELECT hash, record FROM cleaned "  # noqa: S608
+            f"WHERE version = ? AND hash IN ({placeholders})",
+            [self.version, *unique],
+        )
+        for digest, record in rows:
+            if record == _SKIPPED:
+                found[digest] = None
+            else:
+                found[digest] = pickle.loads(record)  # noqa: S301
+        self._conn.executemany(
+            "UPDATE cleaned SET last_seen = max(last_seen, ?) "
+            "WHERE hash = ? AND version = ?",
+            [(seen.isoformat(), digest, self.version) for digest in found],
+        )
+        self._conn.commit()
+        return found
+
+    def put_many(self, records: Dict[str, Optional[Dict]], seen: dt.date) -> None:
+        """Save cleaned listings.
+
+        Parameters
+        ----------
+        records: Dict[str, Optional[Dict]]
+            Cleaned listing by raw hash, None for listings the cleaner skipped
+        seen: dt.date
+            The scrape day they were seen on
+        """
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO cleaned (hash, version, record, last_seen) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (
+                    digest,
+                    self.version,
+                    _SKIPPED if record is None else pickle.dumps(record, protocol=5),
+                    seen.isoformat(),
+                )
+                for digest, record in records.items()
+            ],
+        )
+        self._conn.commit()
+
+    def evict(self, today: Optional[dt.date] = None) -> int:
+        """Drop entries not seen lately, then the oldest past the size bound.
+
+        Parameters
+        ----------
+        today: dt.date, optional
+            What counts as today when working out ages
+
+        Returns
+        -------
+        int
+            How many entries were dropped
+        """
+        if today is None:
+            today = dt.date.today()
+        cutoff = today - dt.timedelta(days=self.max_age_days)
+        n_old = self._conn.execute(
+            "DELETE FROM cleaned WHERE last_seen < ?", [cutoff.isoformat()]
+        ).rowcount
+        n_over = self._conn.execute(
+            """
+            DELETE FROM cleaned WHERE rowid IN (
+                SELECT rowid FROM cleaned ORDER BY last_seen DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            [self.max_entries],
+        ).rowcount
+        self._conn.commit()
+        if n_old or n_over:
+            logger.info(
+                f"Evicted {n_old:,.0f} stale and {n_over:,.0f} excess cleaned "
+                f"listings from {self.path.name}"
+            )
+        return n_old + n_over
+
+
+def _plain_records(cleaned_df: pd.DataFrame) -> List[Dict]:
+    """Turn a frame into records of plain python values, which unpickle quickly."""
+    plain_df = cleaned_df.astype(object).where(cleaned_df.notna(), None)
+    for col in cleaned_df.columns:
+        if pd.api.types.is_datetime64_any_dtype(cleaned_df[col]):
+            plain_df[col] = [
+                None if ts is None else ts.to_pydatetime() for ts in plain_df[col]
+            ]
+    columns = list(plain_df.columns)
+    values = [plain_df[col].tolist() for col in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def clean_cached(
+    hashed: Iterable[Tuple[str, Callable[[], Dict]]],
+    clean: Callable[[List[Dict]], Tuple[pd.DataFrame, np.ndarray]],
+    cache: CleanCache,
+    seen: dt.date,
+) -> pd.DataFrame:
+    """Clean raw listings, only loading and cleaning ones not in the cache.
+
+    Parameters
+    ----------
+    hashed: Iterable[Tuple[str, Callable[[], Dict]]]
+        The hash of each raw listing and a function that loads it, so listings in
+        the cache never have to be loaded at all
+    clean: Callable[[List[Dict]], Tuple[pd.DataFrame, np.ndarray]]
+        A source's ``clean_with_positions``
+    cache: CleanCache
+        Where cleaned listings are remembered
+    seen: dt.date
+        The scrape day of the listings
+
+    Returns
+    -------
+    pd.DataFrame
+        The cleaned listings, in raw order
+    """
+    hashed = iter(hashed)
+    hashes = list()
+    cached = dict()
+    misses = dict()
+    while True:
+        batch = list(islice(hashed, _BATCH_SIZE))
+        if not batch:
+            break
+        batch_hashes = [digest for digest, _ in batch]
+        hashes.extend(batch_hashes)
+        cached.update(cache.get_many(batch_hashes, seen))
+        for digest, load in batch:
+            if digest not in cached and digest not in misses:
+                misses[digest] = load()
+    fresh = dict.fromkeys(misses)
+    if misses:
+        cleaned_df, positions = clean(list(misses.values()))
+        miss_hashes = list(misses)
+        for position, record in zip(positions, _plain_records(cleaned_df)):
+            fresh[miss_hashes[position]] = record
+        cache.put_many(fresh, seen)
+    logger.info(
+        f"Cleaned {len(misses):,.0f} of {len(hashes):,.0f} listings, "
+        "the rest came from the cache"
+    )
+    records = {**cached, **fresh}
+    return pd.DataFrame(
+        [records[digest] for digest in hashes if records[digest] is not None]
+    )
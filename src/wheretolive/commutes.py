@@ -0,0 +1,171 @@
+"""Commute times from listings to the places I care about.
+
+Every listing gets matched against ``isochrone_bands`` with one indexed spatial join,
+against the subdivided copy so each check only looks at a small piece of a band.
+The bands for a place and mode don't overlap, so a listing lands in the one band for
+its shortest cutoff time, which is kept for each place and mode in the
+``commute_features`` table, shared by every source. The ``{source}_commutes`` views
+just pivot that table into the same boolean and label columns the old CASE per
+place, mode and cutoff views had.
+
+A listing is within ``n`` minutes whenever its fastest cutoff is at most ``n``, which
+holds because the isochrones for a place and mode are nested.
+"""
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from sqlalchemy import text
+
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+# Could add more but let's start with these
+MODES = ["CAR", "WALK, TRANSIT", "WALK"]
+
+PLACES = ["DOWNTOWN", "GF_WORK", "BROTHER", "TO_BC", "MOMMA_JILL"]
+
+CUTOFF_TIMES = [i for i in range(10, 65, 5)]
+
+# Key column of each source's listings table and the places it gets commutes to
+SOURCES = {
+    "mls": {"key": "mls_id", "places": PLACES},
+    "rfaster": {"key": "rfaster_id", "places": PLACES[:-1]},
+}
+
+
+def mode_label(mode: str) -> str:
+    """How a commute mode is written in column names, like "WALK_TRANSIT"."""
+    return mode.replace(", ", "_")
+
+
+def fastest_column(place: str, mode: str) -> str:
+    """Column with the fastest commute to a place by a mode, in minutes."""
+    return f"{place}_{mode_label(mode)}_fastest"
+
+
+def _sql_list(values: List) -> str:
+    return ", ".join(
+        f"'{value}'" if isinstance(value, str) else str(value) for value in values
+    )
+
+
+def refresh_commute_features(
+    conn, source: str, active_only: bool = True, keys: Optional[Sequence[str]] = None
+) -> int:
+    """Recompute the fastest commutes for a source's listings.
+
+    Parameters
+    ----------
+    conn: sqlalchemy.engine.Connection
+        Connection to run it in, the old features stay visible until it commits
+    source: str
+        "mls" or "rfaster"
+    active_only: bool, default True
+        Only redo listings that aren't delisted, delisted ones keep what they had.
+        Redo everything after the isochrones change
+    keys: Sequence[str], optional
+        Only redo these listings, like the ones a merge added or moved, see
+        ``wheretolive.upsert.changed_keys``. Everything else keeps what it had
+
+    Returns
+    -------
+    int
+        Rows written to ``commute_features``
+    """
+    key = SOURCES[source]["key"]
+    conditions = list()
+    params = dict()
+    if keys is not None:
+        if not keys:
+            logger.info(f"No new or moved {source} listings, commutes unchanged")
+            return 0
+        conditions.append(f"l.{key}::text = ANY(:keys)")
+        params["keys"] = list(keys)
+    if active_only:
+        conditions.append("l.delisted_dt IS NULL")
+    only = "".join(f" AND {condition}" for condition in conditions)
+    if only:
+        delete = f"""
+            DELETE FROM commute_features c
+            USING {source} l
+            WHERE c.source = '{source}' AND c.listing_id = l.{key}::text {only};
+            """
+    else:
+        delete = f"DELETE FROM commute_features WHERE source = '{source}';"
+    conn.execute(text(delete), params)
+    insert = f"""
+        INSERT INTO commute_features
+            (source, listing_id, place_name, commute_mode, cutoff_time)
+        SELECT '{source}', l.{key}::text, b.place_name, b.commute_mode,
+            min(b.cutoff_time)
+        FROM {source} l
+        JOIN isochrone_bands_subdivided b ON ST_Intersects(b.geom, l.geom)
+        WHERE
+            b.place_name IN ({_sql_list(SOURCES[source]["places"])})
+            AND b.commute_mode IN ({_sql_list(MODES)})
+            AND b.cutoff_time IN ({_sql_list(CUTOFF_TIMES)})
+            {only}
+        -- Points right on the edge of a piece touch both sides of it
+        GROUP BY l.{key}, b.place_name, b.commute_mode;
+        """
+    n_rows = conn.execute(text(insert), params).rowcount
+    logger.info(f"Found {n_rows:,.0f} {source} commutes")
+    return n_rows
+
+
+def _commute_columns(place: str, mode: str) -> List[str]:
+    """Boolean column for each cutoff and the label column for a place and mode."""
+    fastest = f"f.{fastest_column(place, mode)}"
+    prefix = f"{place}_{mode_label(mode)}"
+    columns = [
+        f"COALESCE({fastest} <= {cutoff_time}, False) AS {prefix}_{cutoff_time}"
+        for cutoff_time in CUTOFF_TIMES
+    ]
+    columns.append(
+        f"COALESCE('up_to_' || {fastest} || '_min', 'over_60_or_unknown') "
+        f"AS {prefix}_time"
+    )
+    return columns
+
+
+def commute_view_sql(source: str) -> str:
+    """Make the view pivoting a source's commute features to a column per cutoff."""
+    key = SOURCES[source]["key"]
+    pairs = [(place, mode) for mode in MODES for place in SOURCES[source]["places"]]
+    fastest = ",\n            ".join(
+        f"min(cutoff_time) FILTER (WHERE place_name = '{place}' "
+        f"AND commute_mode = '{mode}') AS {fastest_column(place, mode)}"
+        for place, mode in pairs
+    )
+    columns = ",\n        ".join(
+        column for place, mode in pairs for column in _commute_columns(place, mode)
+    )
+    return f"""
+    DROP VIEW IF EXISTS {source}_commutes CASCADE;
+    CREATE VIEW {source}_commutes AS
+    WITH fastest AS (
+        SELECT
+            listing_id,
+            {fastest}
+        FROM commute_features
+        WHERE source = '{source}'
+        GROUP BY listing_id
+    )
+    SELECT
+        l.{key} AS {source}_commute_id,
+        {columns}
+    FROM public.{source} l
+    LEFT JOIN fastest f ON f.listing_id = l.{key}::text;
+    """
+
+
+def create_commute_view(conn, source: str) -> None:
+    """Fill in every commute for a source and replace its commutes view.
+
+    Drops anything built on the view, like the wide table, so rebuild those after.
+    """
+    refresh_commute_features(conn, source, active_only=False)
+    conn.execute(commute_view_sql(source))
+    logger.info(f"Created {source}_commutes")
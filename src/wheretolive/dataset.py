@@ -0,0 +1,222 @@
+"""Partitioned parquet dataset of clean listings across every scrape day.
+
+Each day's ``clean.pq`` only covers that day, so anything looking across days has to
+open every file. Parsing also writes each day into a hive partitioned dataset per
+source, laid out like::
+
+    data/dataset/source=mls/scrape_date=2022-02-06/part.0.parquet
+
+with a ``_metadata`` file at the root of each source holding the schema and the row
+group statistics of every partition. Readers can filter on ``scrape_date`` and any
+other column and only the partitions and row groups that could match get read, for
+example the price history of one listing::
+
+    read_dataset("mls", columns=["scrape_date", "price"], filters=[("mls_id", "==", 1)])
+
+MLS and rentfaster listings don't share a schema, so each source is its own dataset.
+"""
+import datetime as dt
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import fastparquet
+import pandas as pd
+
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+# Small enough row groups that their statistics actually narrow down a search
+_ROW_GROUP_SIZE = 10_000
+
+
+def _find_dataset_dir(source: str) -> Path:
+    """Get the root of the dataset for one source."""
+    data_dir = Path(__file__).resolve().parents[2] / "data"
+    return data_dir / "dataset" / f"source={source}"
+
+
+def _partition_file(source: str, date: dt.date) -> Path:
+    """Where one day's partition lives."""
+    return (
+        _find_dataset_dir(source) / f"scrape_date={date:%Y-%m-%d}" / "part.0.parquet"
+    )
+
+
+def has_partition(source: str, date: dt.date) -> bool:
+    """Check if a day has been written to a source's dataset."""
+    return _partition_file(source, date).exists()
+
+
+def _plain_categories(listings_df: pd.DataFrame) -> pd.DataFrame:
+    """Store categorical columns as plain text.
+
+    Clean listings already have declared types that are the same every day, but the
+    categories themselves change from day to day and partitions with different
+    categories can't be read back as one dataset.
+
+    Parameters
+    ----------
+    listings_df: pd.DataFrame
+        A day of clean listings
+
+    Returns
+    -------
+    pd.DataFrame
+        The listings with categories turned back into strings
+    """
+    listings_df = listings_df.copy()
+    for col in listings_df.columns:
+        series = listings_df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            listings_df[col] = series.astype(object).where(series.notna(), None)
+    return listings_df
+
+
+def write_partition(
+    source: str,
+    date: dt.date,
+    listings_df: pd.DataFrame,
+    sort_by: Optional[str] = None,
+) -> Path:
+    """Write a day of clean listings into a source's dataset.
+
+    Rewriting a day replaces its partition, so reparsing never duplicates rows.
+    Call ``refresh_metadata`` once all the days are written.
+
+    Parameters
+    ----------
+    source: str
+        Which dataset to write to, like "mls" or "rfaster"
+    date: dt.date
+        The scrape date of the listings
+    listings_df: pd.DataFrame
+        The clean listings
+    sort_by: str, optional
+        Column to sort by before writing, sorting by id keeps each row group's id
+        range tight so looking up one listing can skip most of them
+
+    Returns
+    -------
+    Path
+        Where the partition was written
+    """
+    out_file = _partition_file(source, date)
+    out_file.parent.mkdir(exist_ok=True, parents=True)
+    listings_df = _plain_categories(listings_df)
+    if sort_by is not None:
+        listings_df = listings_df.sort_values(sort_by, kind="stable")
+    object_cols = [
+        col
+        for col in listings_df.columns
+        if pd.api.types.is_object_dtype(listings_df[col])
+    ]
+    fastparquet.write(
+        str(out_file),
+        listings_df.reset_index(drop=True),
+        row_group_offsets=_ROW_GROUP_SIZE,
+        write_index=False,
+        object_encoding={col: "utf8" for col in object_cols},
+    )
+    logger.info(f"Wrote {len(listings_df):,.0f} {source} listings to {out_file}")
+    return out_file
+
+
+def _partition_date(part_file: Path) -> dt.date:
+    """Get the scrape date back out of a partition's directory name."""
+    scrape_date = part_file.parent.name.split("=")[1]
+    return dt.datetime.strptime(scrape_date, "%Y-%m-%d").date()
+
+
+def refresh_metadata(
+    source: str,
+    conform: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    sort_by: Optional[str] = None,
+) -> Optional[Path]:
+    """Rebuild the dataset's ``_metadata`` from every partition.
+
+    Every partition has to have the same schema as the newest one, which was written
+    by the current parser. Partitions written before a schema change get rewritten
+    with ``conform`` if it's given. Any that still don't match are left out of the
+    metadata with a warning rather than failing, reparse those days to add them
+    back.
+
+    Parameters
+    ----------
+    source: str
+        Which dataset to refresh
+    conform: Callable[[pd.DataFrame], pd.DataFrame], optional
+        Brings an old partition's listings up to the current schema, like
+        ``apply_schema`` with the source's declared types
+    sort_by: str, optional
+        Column to sort rewritten partitions by, see ``write_partition``
+
+    Returns
+    -------
+    Optional[Path]
+        The metadata file, or None if there are no partitions yet
+    """
+    dataset_dir = _find_dataset_dir(source)
+    part_files = sorted(dataset_dir.glob("scrape_date=*/part.0.parquet"))
+    if not part_files:
+        return None
+    current = fastparquet.ParquetFile(str(part_files[-1]))
+    matching = [current]
+    for part_file in part_files[:-1]:
+        partition = fastparquet.ParquetFile(str(part_file))
+        if partition._schema != current._schema and conform is not None:
+            date = _partition_date(part_file)
+            try:
+                listings_df = conform(partition.to_pandas())
+                write_partition(source, date, listings_df, sort_by)
+            except (TypeError, ValueError) as err:
+                logger.warning(f"Couldn't bring {date} up to the current schema: {err}")
+            partition = fastparquet.ParquetFile(str(part_file))
+        if partition._schema != current._schema:
+            logger.warning(
+                f"Leaving {part_file} out of the {source} dataset, its schema is "
+                "out of date"
+            )
+            continue
+        matching.append(partition)
+    # Same order as the days, with the newest last. Rooted at the dataset so a
+    # single day still gets its metadata there, partitioned by scrape date
+    matching = matching[1:] + matching[:1]
+    fastparquet.writer.merge(matching, verify_schema=True, root=str(dataset_dir))
+    logger.info(f"Refreshed {source} dataset metadata over {len(matching)} days")
+    return dataset_dir / "_metadata"
+
+
+def read_dataset(
+    source: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+) -> pd.DataFrame:
+    """Read listings across scrape days, only touching what the query needs.
+
+    Parameters
+    ----------
+    source: str
+        Which dataset to read
+    columns: List[str], optional
+        Only read these columns, ``scrape_date`` can be included
+    filters: List[Tuple[str, str, Any]], optional
+        Conditions like ``("scrape_date", ">=", "2022-01-01")``, partitions and
+        row groups whose statistics rule out a match are skipped
+
+    Returns
+    -------
+    pd.DataFrame
+        The matching listings. Filters only prune whole row groups, so filter the
+        result again if exact matches are needed
+    """
+    return pd.read_parquet(
+        _find_dataset_dir(source),
+        engine="fastparquet",
+        columns=columns,
+        filters=filters,
+    )
@@ -0,0 +1,114 @@
+"""Fast JSON encoding and decoding of raw listings.
+
+The standard library decodes every listing into nested dicts holding every field the
+site sends, most of which parsing never looks at. When ``msgspec`` is installed, raw
+listings can instead be decoded straight into small typed structs that only have the
+fields the cleaners use, everything else is skipped without ever being built. When
+``orjson`` (or failing that ``msgspec``) is installed, plain encoding and decoding
+use it instead of the standard library. Nothing here is required, without either
+package everything falls back to ``json`` and behaves the same, just slower.
+
+Struct decoding is only for parsing. Dumps and the raw store always keep the full
+listing exactly as the site sent it.
+"""
+import importlib
+import json
+from functools import lru_cache
+from typing import Any
+from typing import List
+from typing import Optional
+from typing import Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Where each source keeps the structs for its raw listings
+_STRUCT_MODULES = {
+    "mls": "wheretolive.mls.structs",
+    "rfaster": "wheretolive.rfaster.structs",
+}
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode to compact UTF-8 JSON with the fastest encoder around."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    if msgspec is not None:
+        return msgspec.json.encode(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode JSON into plain python objects with the fastest decoder around."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+class ListingDecoder:
+    """Decode raw listings, either into plain dicts or into a struct type.
+
+    Parameters
+    ----------
+    listing_type: type, optional
+        ``msgspec.Struct`` to decode each listing into, plain dicts if not given
+    """
+
+    def __init__(self, listing_type: Optional[type] = None) -> None:
+        self.listing_type = listing_type
+        if listing_type is None:
+            self._decoder = None
+            self._array_decoder = None
+        else:
+            self._decoder = msgspec.json.Decoder(listing_type)
+            self._array_decoder = msgspec.json.Decoder(List[listing_type])
+
+    @property
+    def is_typed(self) -> bool:
+        return self.listing_type is not None
+
+    def decode(self, data: Union[bytes, str]) -> Any:
+        """Decode a single listing."""
+        if self._decoder is None:
+            return loads(data)
+        return self._decoder.decode(data)
+
+    def decode_array(self, data: Union[bytes, str]) -> List:
+        """Decode a JSON array of listings."""
+        if self._array_decoder is None:
+            return loads(data)
+        return self._array_decoder.decode(data)
+
+
+@lru_cache(maxsize=None)
+def listing_decoder(source: str) -> ListingDecoder:
+    """Get the fastest decoder for a source's raw listings.
+
+    Parameters
+    ----------
+    source: str
+        Which source the listings are from, "mls" or "rfaster"
+
+    Returns
+    -------
+    ListingDecoder
+        Decodes into the source's ``Listing`` struct if ``msgspec`` is installed,
+        into plain dicts otherwise
+    """
+    if source not in _STRUCT_MODULES:
+        raise ValueError(
+            f"Unknown source {source}, expected one of {list(_STRUCT_MODULES)}"
+        )
+    if msgspec is None:
+        return ListingDecoder()
+    structs = importlib.import_module(_STRUCT_MODULES[source])
+    return ListingDecoder(structs.Listing)
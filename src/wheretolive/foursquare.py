@@ -12,6 +12,7 @@ import pandas as pd
 import requests
 from dotenv import load_dotenv
 
+from wheretolive.geobounds import get_bounds
 from wheretolive.logconf import get_logger
 
 logger = get_logger(__name__)
@@ -21,12 +22,15 @@ load_dotenv()
 FS_KEY = os.getenv("FOURSQUARE_KEY")
 
 
-def _latlong_grid(steps: int = 20) -> List[Dict[str, str]]:
+def _latlong_grid(
+    steps: int = 20, place: str = "Calgary, Canada"
+) -> List[Dict[str, str]]:
     """Iterate over a grid of equally sized points across calgary."""
-    west_bound = -114.3157587
-    east_bound = -113.8600018
-    north_bound = 51.2125013
-    south_bound = 50.842526
+    bounds = get_bounds(place)
+    west_bound = bounds.west
+    east_bound = bounds.east
+    north_bound = bounds.north
+    south_bound = bounds.south
     n_to_s = np.linspace(start=north_bound, stop=south_bound, endpoint=True, num=steps)
     e_to_w = np.linspace(start=east_bound, stop=west_bound, endpoint=True, num=steps)
     rectangles = list()
@@ -0,0 +1,132 @@
+"""Look up and cache the bounding boxes of the places we search.
+
+Geocoding is a network round trip, so results are saved to a small JSON file keyed
+by the place query and only looked up again once they're older than the TTL. If the
+lookup fails and there's a stale entry we fall back to it, so once the cache is warm
+everything works offline.
+"""
+import datetime as dt
+import json
+import threading
+from pathlib import Path
+from typing import Dict
+from typing import NamedTuple
+
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+_CACHE_TTL = dt.timedelta(days=30)
+
+_MEMORY: Dict[str, "Bounds"] = dict()
+_LOCK = threading.Lock()
+
+
+class Bounds(NamedTuple):
+    """Bounding box and centre point of a place."""
+
+    west: float
+    east: float
+    south: float
+    north: float
+    lat: float
+    lng: float
+
+
+def _get_cache_file() -> Path:
+    """Find where to save cached bounds."""
+    return Path(__file__).resolve().parents[2] / "data" / "cache" / "geobounds.json"
+
+
+def _read_cache() -> Dict:
+    """Load every cached entry, or nothing if there's no cache yet."""
+    cache_file = _get_cache_file()
+    if not cache_file.exists():
+        return dict()
+    with open(cache_file, "r") as f:
+        return json.load(f)
+
+
+def _write_cache(cache: Dict) -> None:
+    """Save the cache, swapping the file in whole so readers never see half of it."""
+    cache_file = _get_cache_file()
+    cache_file.parent.mkdir(exist_ok=True, parents=True)
+    tmp_file = cache_file.with_suffix(".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(cache, f, indent=2)
+    tmp_file.replace(cache_file)
+
+
+def _geocode(query: str) -> Bounds:
+    """Look up a place on OpenStreetMap.
+
+    Parameters
+    ----------
+    query: str
+        The place to search for, like "Calgary, Canada"
+
+    Returns
+    -------
+    Bounds
+        The bounding box of the place
+
+    Raises
+    ------
+    RuntimeError
+        If the place couldn't be found
+    """
+    # Importing geocoder is slow too, only pay for it when we need a lookup
+    import geocoder
+
+    logger.info(f"Geocoding {query}")
+    g = geocoder.osm(query)
+    if not g.ok:
+        raise RuntimeError(f"Couldn't geocode {query}: {g.status}")
+    return Bounds(
+        west=g.west, east=g.east, south=g.south, north=g.north, lat=g.lat, lng=g.lng
+    )
+
+
+def get_bounds(
+    query: str = "Calgary, Canada", ttl: dt.timedelta = _CACHE_TTL
+) -> Bounds:
+    """Get the bounding box of a place, geocoding it only if the cache is stale.
+
+    Parameters
+    ----------
+    query: str, default "Calgary, Canada"
+        The place to search for
+    ttl: dt.timedelta, default 30 days
+        How old a cached entry can be before we look it up again
+
+    Returns
+    -------
+    Bounds
+        The bounding box of the place
+    """
+    with _LOCK:
+        if query in _MEMORY:
+            return _MEMORY[query]
+        cache = _read_cache()
+        entry = cache.get(query)
+        if entry is not None:
+            fetched = dt.datetime.fromisoformat(entry["fetched"])
+            if dt.datetime.now() - fetched < ttl:
+                bounds = Bounds(**entry["bounds"])
+                _MEMORY[query] = bounds
+                return bounds
+        try:
+            bounds = _geocode(query)
+        except Exception as err:
+            if entry is None:
+                raise
+            logger.warning(f"Couldn't refresh bounds for {query}, using stale: {err}")
+            bounds = Bounds(**entry["bounds"])
+        else:
+            cache[query] = {
+                "fetched": dt.datetime.now().isoformat(),
+                "bounds": bounds._asdict(),
+            }
+            _write_cache(cache)
+        _MEMORY[query] = bounds
+        return bounds
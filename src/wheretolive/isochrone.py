@@ -6,8 +6,15 @@ organized.
 import json
 from pathlib import Path
 
+import pandas as pd
+
+from wheretolive.commutes import SOURCES
+from wheretolive.commutes import refresh_commute_features
 from wheretolive.logconf import get_logger
 from wheretolive.postgis import PostGIS
+from wheretolive.postgis import copy_frame
+from wheretolive.postgis import geojson_ewkt
+from wheretolive.postgis import subdivide_table
 
 logger = get_logger(__name__)
 
@@ -31,14 +38,18 @@ def _get_isochrones():
     return isochrones
 
 
+def _read_sql(query_file: str) -> str:
+    """Read a sql script saved in this folder."""
+    sql_dir = Path(__file__).resolve().parent
+    with open(sql_dir / query_file, "r") as f:
+        return f.read()
+
+
 def exec_sql(query_file: str):
     """Run a sql script saved in this folder."""
     pg_db = PostGIS().connection
-    sql_dir = Path(__file__).resolve().parent
-    with open(sql_dir / query_file, "r") as f:
-        sql = f.read()
     with pg_db.begin() as conn:
-        conn.execute(sql)
+        conn.execute(_read_sql(query_file))
 
 
 def setup_isochrone_table():
@@ -47,28 +58,36 @@ def setup_isochrone_table():
     logger.info("Created fresh isochrone table.")
 
 
-def _insertion_syntax(iso_entry):
-    """Turn an isochrone dictionary entry to an insertion statement."""
-    # (ST_GeomFromGeoJSON('{"type":"Point","coordinates":[-48.23456,20.12345]}')) As wkt;
-    geo_shape = iso_entry["shape"]
-    geo_str = f"ST_GeomFromGeoJSON('{json.dumps(geo_shape)}')"
-    sql = f"""
-        INSERT INTO public.isochrones (place_name, commute_mode, cutoff_time, geom)
-        VALUES ('{iso_entry["place_name"]}', '{iso_entry["mode"]}', {iso_entry["cutoff_time"]}, {geo_str})
-    """
-    return sql
+def _isochrone_df(iso_entries) -> pd.DataFrame:
+    """Turn isochrone dictionary entries into rows for the isochrones table."""
+    return pd.DataFrame(
+        {
+            "place_name": [iso_entry["place_name"] for iso_entry in iso_entries],
+            "commute_mode": [iso_entry["mode"] for iso_entry in iso_entries],
+            "cutoff_time": [iso_entry["cutoff_time"] for iso_entry in iso_entries],
+            "geom": [geojson_ewkt(iso_entry["shape"]) for iso_entry in iso_entries],
+        }
+    )
 
 
 def insert_isochrones():
-    """Add isochrone entries to the table."""
+    """Add isochrone entries to the table and rebuild the bands made from them.
+
+    Bands are the non-overlapping part of each isochrone not covered by a faster
+    one, see ``isochrone_bands.sql``. Commutes get looked up against a subdivided
+    copy of the bands.
+    """
     pg_db = PostGIS().connection
-    iso_entries = _get_isochrones()
+    iso_df = _isochrone_df(_get_isochrones())
     with pg_db.begin() as conn:
-        for iso_entry in iso_entries:
-            sql = _insertion_syntax(iso_entry)
-            conn.execute(sql)
-            msg = f"Inserted isochrone for {iso_entry['place_name']}, {iso_entry['mode']}, {iso_entry['cutoff_time']}"
-            logger.info(msg)
+        n_rows = copy_frame(conn, "public.isochrones", iso_df)
+        logger.info(f"Inserted {n_rows:,.0f} isochrones")
+        conn.execute(_read_sql("isochrone_bands.sql"))
+        logger.info("Rebuilt isochrone bands")
+        subdivide_table(conn, "public.isochrone_bands")
+        # Every listing's commutes change along with the isochrones
+        for source in SOURCES:
+            refresh_commute_features(conn, source, active_only=False)
 
 
 if __name__ == "__main__":
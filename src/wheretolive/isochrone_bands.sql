@@ -0,0 +1,39 @@
+-- Non-overlapping commute time bands made from the isochrones. Each band is the area
+-- reachable within its cutoff_time but not within any faster cutoff, so for a place
+-- and mode every location falls in at most one band
+CREATE TABLE IF NOT EXISTS public.isochrone_bands (
+  place_name VARCHAR(50),
+  commute_mode VARCHAR(50),
+  min_time INT,
+  cutoff_time INT,
+  geom geometry(MultiPolygon, 4326)
+);
+
+CREATE INDEX IF NOT EXISTS isochrone_bands_geom_idx
+ON public.isochrone_bands USING GIST (geom);
+
+TRUNCATE TABLE public.isochrone_bands;
+
+INSERT INTO public.isochrone_bands (
+  place_name, commute_mode, min_time, cutoff_time, geom
+)
+SELECT
+  i.place_name,
+  i.commute_mode,
+  COALESCE(faster.cutoff_time, 0),
+  i.cutoff_time,
+  -- The fastest band is the whole isochrone, there's nothing to take away
+  ST_Multi(
+    ST_CollectionExtract(COALESCE(ST_Difference(i.geom, faster.geom), i.geom), 3)
+  )
+FROM public.isochrones i
+CROSS JOIN LATERAL (
+  SELECT max(f.cutoff_time) AS cutoff_time, ST_Union(f.geom) AS geom
+  FROM public.isochrones f
+  WHERE
+    f.place_name = i.place_name
+    AND f.commute_mode = i.commute_mode
+    AND f.cutoff_time < i.cutoff_time
+) faster;
+
+ANALYZE public.isochrone_bands;
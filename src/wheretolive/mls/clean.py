@@ -0,0 +1,326 @@
+"""Clean raw MLS listings a column at a time.
+
+``_ListingCleaner`` in ``parse`` cleans one listing at a time, which means dozens of
+dictionary lookups, a ``strptime`` and some string munging in python for every
+listing. Here the raw listings get flattened into columns in one pass and all the
+cleaning happens on whole columns with pandas. The result is exactly what
+``pd.DataFrame`` gives for the row by row cleaner's output, so everything downstream
+of it is the same either way.
+"""
+import datetime as dt
+from typing import Dict
+from typing import Iterable
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+# Bump whenever cleaning changes so cached clean listings get redone
+CLEANER_VERSION = "2"
+
+# Every raw field we need, in the order ``_raw_fields`` pulls them out
+_RAW_COLUMNS = [
+    "mls_id",
+    "mls_number",
+    "stories",
+    "listing_description",
+    "raw_bedrooms",
+    "bathrooms",
+    "raw_sq_feet",
+    "listing_type",
+    "amenities",
+    "price",
+    "property_type",
+    "listing_address",
+    "longitude",
+    "latitude",
+    "ownership_type",
+    "parking",
+    "parking_spaces",
+    "lot_size",
+    "postal_code",
+    "raw_link",
+    "raw_price_change",
+    "raw_inserted",
+]
+
+# Same columns in the same order as the row by row cleaner
+_COLUMNS = [
+    "mls_id",
+    "mls_number",
+    "stories",
+    "listing_description",
+    "bedrooms_above",
+    "bedrooms_below",
+    "bedrooms",
+    "bathrooms",
+    "sq_feet_in",
+    "listing_type",
+    "amenities",
+    "price",
+    "property_type",
+    "listing_address",
+    "longitude",
+    "latitude",
+    "ownership_type",
+    "parking",
+    "parking_spaces",
+    "lot_size",
+    "postal_code",
+    "link",
+    "price_change_dt",
+    "mls_insert_dt",
+]
+
+_DATETIME_COLUMNS = ["price_change_dt", "mls_insert_dt"]
+
+_INT_RGX = r"\s*[+-]?\d+\s*"
+
+
+def _raw_fields(listing: Dict) -> Tuple:
+    """Pull the fields we need out of one raw listing.
+
+    Spelled out by hand since this runs once per listing and a plain tuple of
+    lookups is a lot quicker than looping over a table of keys.
+    """
+    building = listing.get("Building")
+    prop = listing.get("Property")
+    address = prop.get("Address")
+    return (
+        listing.get("Id"),
+        listing.get("MlsNumber"),
+        building.get("StoriesTotal"),
+        listing.get("PublicRemarks"),
+        building.get("Bedrooms"),
+        building.get("BathroomTotal"),
+        building.get("SizeInterior"),
+        building.get("Type"),
+        building.get("Ammenities"),
+        prop.get("PriceUnformattedValue"),
+        prop.get("Type"),
+        address.get("AddressText"),
+        address.get("Longitude"),
+        address.get("Latitude"),
+        prop.get("OwnershipType"),
+        prop.get("ParkingType"),
+        prop.get("ParkingSpaceTotal"),
+        listing.get("Land").get("SizeTotal"),
+        listing.get("PostalCode"),
+        listing.get("RelativeDetailsURL"),
+        listing.get("PriceChangeDateUTC"),
+        listing.get("InsertedDateUTC"),
+    )
+
+
+def _struct_fields(listing) -> Tuple:
+    """Same as ``_raw_fields`` for a listing decoded into ``structs.Listing``."""
+    building = listing.building
+    prop = listing.property
+    address = prop.address
+    return (
+        listing.id,
+        listing.mls_number,
+        building.stories_total,
+        listing.public_remarks,
+        building.bedrooms,
+        building.bathroom_total,
+        building.size_interior,
+        building.type,
+        building.ammenities,
+        prop.price_unformatted_value,
+        prop.type,
+        address.address_text,
+        address.longitude,
+        address.latitude,
+        prop.ownership_type,
+        prop.parking_type,
+        prop.parking_space_total,
+        listing.land.size_total,
+        listing.postal_code,
+        listing.relative_details_url,
+        listing.price_change_date_utc,
+        listing.inserted_date_utc,
+    )
+
+
+def _flatten(raw: Iterable) -> pd.DataFrame:
+    """Pull every field we need out of the raw listings in a single pass.
+
+    Parameters
+    ----------
+    raw: Iterable
+        Raw listings as dicts or ``structs.Listing``, can be a generator
+
+    Returns
+    -------
+    pd.DataFrame
+        One object column per raw field, missing fields are None
+    """
+    rows = [
+        _raw_fields(listing) if isinstance(listing, dict) else _struct_fields(listing)
+        for listing in raw
+    ]
+    columns = zip(*rows) if rows else [()] * len(_RAW_COLUMNS)
+    return pd.DataFrame(
+        {
+            name: np.array(values, dtype=object)
+            for name, values in zip(_RAW_COLUMNS, columns)
+        }
+    )
+
+
+def _split_bedrooms(raw_bedrooms: pd.Series) -> pd.DataFrame:
+    """Split "3 + 1" style bedrooms into above and below grade.
+
+    Follows the row by row cleaner exactly: split counts stay as text, anything
+    without a " + " is all above grade if it's a whole number and 0 and 0 if not.
+
+    Parameters
+    ----------
+    raw_bedrooms: pd.Series
+        Raw bedrooms text, None where missing
+
+    Returns
+    -------
+    pd.DataFrame
+        bedrooms_above, bedrooms_below and bedrooms columns
+    """
+    n = len(raw_bedrooms)
+    above = np.full(n, None, dtype=object)
+    below = np.full(n, None, dtype=object)
+    total = np.full(n, None, dtype=object)
+    present = raw_bedrooms.notna().to_numpy()
+    text = raw_bedrooms.astype("string")
+    has_plus = text.str.contains(" + ", regex=False).fillna(False).to_numpy(bool)
+    if has_plus.any():
+        parts = text[has_plus].str.split(" + ", regex=False)
+        if (parts.str.len() != 2).any():
+            raise ValueError(f"Can't split bedrooms {list(text[has_plus])}")
+        split_above = parts.str[0]
+        split_below = parts.str[1]
+        if not (
+            split_above.str.fullmatch(_INT_RGX).all()
+            and split_below.str.fullmatch(_INT_RGX).all()
+        ):
+            raise ValueError(f"Can't parse bedrooms {list(text[has_plus])}")
+        above[has_plus] = split_above.to_numpy(object)
+        below[has_plus] = split_below.to_numpy(object)
+        total[has_plus] = (
+            split_above.astype(int).to_numpy() + split_below.astype(int).to_numpy()
+        ).astype(object)
+    no_plus = present & ~has_plus
+    if no_plus.any():
+        logger.warning(
+            f"No + separator for {no_plus.sum()} listings, "
+            "assuming all bedrooms above grade"
+        )
+        values = text[no_plus]
+        is_int = values.str.fullmatch(_INT_RGX).to_numpy(bool)
+        if not is_int.all():
+            logger.warning(f"Can't parse bedrooms for {(~is_int).sum()} listings")
+        whole = np.zeros(len(values), dtype=object)
+        whole[is_int] = values[is_int].astype(int).tolist()
+        above[no_plus] = whole
+        below[no_plus] = 0
+        total[no_plus] = whole
+    return pd.DataFrame(
+        {"bedrooms_above": above, "bedrooms_below": below, "bedrooms": total},
+        index=raw_bedrooms.index,
+    )
+
+
+def _sq_feet(raw_sq_feet: pd.Series) -> pd.Series:
+    """Strip units off interior size, converting the odd listing in m2 to sqft."""
+    is_m2 = raw_sq_feet.str.contains("m2", regex=False).fillna(False).astype(bool)
+    in_sqft = raw_sq_feet.where(~is_m2).str.replace(" sqft", "", regex=False)
+    sq_feet = pd.to_numeric(in_sqft).astype(float)
+    if is_m2.any():
+        m2 = raw_sq_feet[is_m2].str.replace(" m2", "", regex=False).astype(float)
+        sq_feet[is_m2] = m2 * 10.7639
+    return sq_feet
+
+
+def _ticks_to_datetime(raw_timestamp: str) -> dt.datetime:
+    """Convert one .NET tick count to a datetime the way the row cleaner does."""
+    # Something about the formatting here has the epoch start wrong
+    # this corrects it
+    clean_timestamp = dt.datetime.fromtimestamp(int(raw_timestamp) / 10_000_000)
+    return clean_timestamp.replace(year=clean_timestamp.year - 1969)
+
+
+def _insert_dates(raw_inserted: pd.Series) -> pd.Series:
+    """Convert .NET ticks to datetimes.
+
+    The conversion goes through local time, so it can't be done with plain column
+    arithmetic and still match. Each distinct value only gets converted once.
+    """
+    present = raw_inserted.dropna()
+    lookup = {tick: _ticks_to_datetime(tick) for tick in present.unique()}
+    return pd.to_datetime(raw_inserted.map(lookup, na_action="ignore"))
+
+
+def _price_change_dates(raw_dates: pd.Series) -> pd.Series:
+    """Parse text dates, same format as the row by row cleaner."""
+    return pd.to_datetime(raw_dates, format="%Y-%m-%d %H:%M:%S %p")
+
+
+def clean_listings(raw: Iterable) -> pd.DataFrame:
+    """Clean raw MLS listings into a frame, skipping vacant land.
+
+    Parameters
+    ----------
+    raw: Iterable
+        Raw listings as dicts or ``structs.Listing``, can be a generator
+
+    Returns
+    -------
+    pd.DataFrame
+        The same frame ``pd.DataFrame`` builds from the row by row cleaner's output
+    """
+    return clean_with_positions(raw)[0]
+
+
+def clean_with_positions(raw: Iterable) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Clean raw MLS listings, keeping track of which raw listing each row is from.
+
+    Parameters
+    ----------
+    raw: Iterable
+        Raw listings as dicts or ``structs.Listing``, can be a generator
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, np.ndarray]
+        The same frame as ``clean_listings`` and the position in ``raw`` of every
+        row of it, listings that were skipped don't show up
+    """
+    flat = _flatten(raw)
+    is_kept = flat["property_type"].ne("Vacant Land").to_numpy(bool)
+    positions = np.flatnonzero(is_kept)
+    flat = flat[is_kept].reset_index(drop=True)
+    if flat.empty:
+        return pd.DataFrame(), positions
+    cleaned = flat.join(_split_bedrooms(flat["raw_bedrooms"]))
+    # Want to be able to parse this as None when converting to integer
+    no_stories = cleaned["stories"].isna() | cleaned["stories"].eq("")
+    cleaned["stories"] = cleaned["stories"].where(~no_stories, None)
+    cleaned["sq_feet_in"] = _sq_feet(flat["raw_sq_feet"])
+    # A missing link comes out as "None" in the row by row cleaner's f-string
+    cleaned["link"] = "https://www.realtor.ca" + flat["raw_link"].fillna("None")
+    cleaned["price_change_dt"] = _price_change_dates(flat["raw_price_change"])
+    cleaned["mls_insert_dt"] = _insert_dates(flat["raw_inserted"])
+    # Let pandas pick column types from the values, same as it does for the row
+    # by row cleaner's dictionaries
+    cleaned_df = pd.DataFrame(
+        {
+            col: cleaned[col]
+            if col in _DATETIME_COLUMNS and cleaned[col].notna().any()
+            else cleaned[col].to_numpy(dtype=object)
+            for col in _COLUMNS
+        }
+    )
+    return cleaned_df, positions
@@ -2,9 +2,16 @@
 import datetime as dt
 
 import pandas as pd
+from wheretolive.commutes import refresh_commute_features
 from wheretolive.logconf import get_logger
 from wheretolive.mls.common import _find_scrapes_dir
 from wheretolive.postgis import PostGIS
+from wheretolive.postgis import copy_frame
+from wheretolive.postgis import point_ewkb
+from wheretolive.postgis import refresh_materialized_view
+from wheretolive.spatial import feature_columns
+from wheretolive.upsert import changed_keys
+from wheretolive.upsert import merge_staged
 
 logger = get_logger(__name__)
 
@@ -17,24 +24,34 @@ def get_mls_scrape_df(scrape_date: dt.date = None) -> pd.DataFrame:
 
 
 def update_mls_postgis(scrape_date: dt.date = None):
-    """Update the data set in MLS to the scraped date."""
+    """Merge the scraped date into MLS, only touching listings that changed.
+
+    Listings missing from the scrape get marked delisted rather than deleted, see
+    ``wheretolive.upsert``.
+    """
     db = PostGIS().connection
     mls_df = get_mls_scrape_df(scrape_date)
+    # Python location features are only for offline analysis, the database works
+    # out its own, see wheretolive.spatial
+    mls_df = mls_df.drop(columns=feature_columns("mls"), errors="ignore")
+    if mls_df.empty:
+        # Merging nothing would mark every listing delisted
+        raise ValueError(f"No MLS listings scraped for {scrape_date}")
+    # Locations go in with the rows instead of an UPDATE rewriting every row
+    mls_df = mls_df.assign(geom=point_ewkb(mls_df["longitude"], mls_df["latitude"]))
+    with db.begin() as conn:
+        conn.execute("TRUNCATE mls_staging;")
+        n_rows = copy_frame(conn, "mls_staging", mls_df)
+        logger.info(f"Copied {n_rows:,.0f} records with locations into staging")
+        # Only listings that are new or moved need their commutes redone
+        moved = changed_keys(conn, "mls", "mls_id", ["geom"])
+        merge_staged(conn, "mls", "mls_id", list(mls_df.columns))
+    # Refresh after the merge commits so the merge's locks aren't held meanwhile
     with db.begin() as conn:
-        # Remove old entries
-        logger.info("Truncating old MLS records")
-        conn.execute("TRUNCATE mls;")
-        mls_df.to_sql(name="mls", con=conn, index=False, if_exists="append")
-        logger.info(f"Inserted {len(mls_df):,.0f} records into MLS table")
-        update_latlong = 'UPDATE public.mls SET geom = ST_SetSRID(ST_MakePoint("longitude"::double precision, "latitude"::double precision), 4326);'
-        conn.execute(update_latlong)
-        logger.info("Parsed latlong location from latitude and longitude columns")
-    # Try breaking this into chunks
+        refresh_commute_features(conn, "mls", keys=moved)
     with db.begin() as conn:
-        logger.info("Starting materialized view refresh")
-        refresh_wide = "REFRESH MATERIALIZED VIEW mls_wide;"
-        conn.execute(refresh_wide)
-        logger.info("Refreshed wide materialized view of MLS listings.")
+        refresh_materialized_view(conn, "mls_wide")
+
 
 if __name__ == "__main__":
     update_mls_postgis()
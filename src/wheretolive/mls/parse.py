@@ -1,47 +1,147 @@
 """Parse and clean up scraped data sets."""
 import datetime as dt
-import json
 import re
-import zipfile
+from functools import partial
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import pandas as pd
+from wheretolive.cleancache import clean_cached
+from wheretolive.cleancache import source_cache
+from wheretolive.dataset import has_partition
+from wheretolive.dataset import refresh_metadata
+from wheretolive.dataset import write_partition
+from wheretolive.fastjson import ListingDecoder
+from wheretolive.fastjson import listing_decoder
 from wheretolive.logconf import get_logger
+from wheretolive.mls.clean import CLEANER_VERSION
+from wheretolive.mls.clean import clean_listings
+from wheretolive.mls.clean import clean_with_positions
 from wheretolive.mls.common import _find_base_dir, _find_scrapes_dir
+from wheretolive.parsing import parse_days
+from wheretolive.rawdump import find_dumps
+from wheretolive.rawdump import iter_dumps
+from wheretolive.rawdump import read_dump
+from wheretolive.rawstore import compact_dumps
+from wheretolive.rawstore import has_manifest
+from wheretolive.rawstore import iter_day
+from wheretolive.rawstore import iter_day_hashes
+from wheretolive.rawstore import listing_hash
+from wheretolive.rawstore import load_listing
+from wheretolive.rawstore import load_day
+from wheretolive.rawstore import unstored_dumps
+from wheretolive.schema import Schema
+from wheretolive.schema import apply_schema
+from wheretolive.spatial import add_spatial_features
 
 logger = get_logger(__name__)
 
+_RAW_PATTERN = "mls_*_maxprice_*"
+
 
 def _find_raw_zips(date: dt.date = None) -> List[Path]:
-    """Find the raw price grouped scrapes."""
+    """Find the raw price grouped scrapes that aren't in the raw store yet."""
     if date is None:
         date = dt.date.today()
     scrapes_dir = _find_scrapes_dir(date)
-    return list(scrapes_dir.glob("mls_*_maxprice_*.zip"))
+    return unstored_dumps(scrapes_dir, find_dumps(scrapes_dir, _RAW_PATTERN))
 
 
 def _load_raw_zip(zip: Path) -> List:
-    """Get a list of listings from a zipped json."""
-    zipname = zip.name
-    jsonname = zipname.replace(".zip", ".json")
-    with zipfile.ZipFile(zip, mode="r") as z:
-        with z.open(jsonname) as f:
-            listings = json.loads(f.read().decode("utf-8"))
-    return listings
+    """Get a list of listings from a raw dump, whatever codec it was saved with."""
+    return read_dump(zip)
 
 
 def _full_day_listings(date: dt.date = None) -> List:
-    """Combine raw zips for a day into a full raw list."""
+    """Combine raw zips for a day into a full raw list.
+
+    Days that have been moved into the raw store are rebuilt from their manifest.
+    """
     if date is None:
         date = dt.date.today()
     all_listings = list()
+    scrapes_dir = _find_scrapes_dir(date)
+    if has_manifest(scrapes_dir):
+        all_listings.extend(load_day(_find_base_dir(), scrapes_dir))
     zipfiles = _find_raw_zips(date)
     for f in zipfiles:
         all_listings.extend(_load_raw_zip(f))
     return all_listings
 
 
+def _iter_day_listings(
+    date: dt.date = None, decoder: Optional[ListingDecoder] = None
+) -> Iterator:
+    """Stream a day's raw listings one at a time.
+
+    Same listings in the same order as ``_full_day_listings``, but never holds the
+    whole day in memory. Raw zips are decoded a few at a time on background threads,
+    into structs instead of dicts if given a typed ``decoder``.
+    """
+    if date is None:
+        date = dt.date.today()
+    scrapes_dir = _find_scrapes_dir(date)
+    if has_manifest(scrapes_dir):
+        yield from iter_day(_find_base_dir(), scrapes_dir, decoder)
+    yield from iter_dumps(_find_raw_zips(date), decoder=decoder)
+
+
+def _iter_day_hashed(date: dt.date = None) -> Iterator[Tuple[str, Callable[[], Dict]]]:
+    """Stream the content hash of each raw listing along with a way to load it.
+
+    Days in the raw store already know every listing's hash, so their listings only
+    get read from the store if something asks for them, and then straight into
+    structs if ``msgspec`` is around. Listings still in raw zips have to be hashed
+    from their full content, so those stay dicts.
+    """
+    if date is None:
+        date = dt.date.today()
+    scrapes_dir = _find_scrapes_dir(date)
+    base_dir = _find_base_dir()
+    decoder = listing_decoder("mls")
+    if has_manifest(scrapes_dir):
+        for digest in iter_day_hashes(scrapes_dir):
+            yield digest, partial(load_listing, base_dir, digest, decoder)
+    for listing in iter_dumps(_find_raw_zips(date)):
+        yield listing_hash(listing), partial(_identity, listing)
+
+
+def _identity(listing: Dict) -> Dict:
+    return listing
+
+
+def _compact_day(date: dt.date = None) -> Optional[Path]:
+    """Move a day's raw dumps into the deduplicated raw store.
+
+    Only listings that changed since they were last stored take up new space, the
+    day itself is left with just a manifest.
+
+    Parameters
+    ----------
+    date: dt.date, optional
+        The day to compact, defaults to today
+
+    Returns
+    -------
+    Optional[Path]
+        The day's manifest, or None if there were no dumps to compact
+    """
+    if date is None:
+        date = dt.date.today()
+    scrapes_dir = _find_scrapes_dir(date)
+    # Including any a crash left behind after they were stored
+    zipfiles = find_dumps(scrapes_dir, _RAW_PATTERN)
+    if not zipfiles:
+        return None
+    return compact_dumps(_find_base_dir(), scrapes_dir, zipfiles, "Id")
+
+
+def compact_scrapes() -> None:
+    """Move every day's raw dumps into the deduplicated raw store."""
+    for scrape_day in sorted(_find_all_raw_scrape_days()):
+        _compact_day(scrape_day)
+
+
 class _ListingCleaner:
     def __init__(self, raw_listing) -> None:
         self.raw_listing = raw_listing
@@ -140,9 +240,9 @@ class _ListingCleaner:
             # Almost everything lists in square feet. Annoying
             if "m2" in raw_sq_feet:
                 sqft = float(raw_sq_feet.replace(" m2", "")) * 10.7639
-                self._cleaned["sq_feet_in"] = f"{sqft}"
             else:
-                self._cleaned["sq_feet_in"] = raw_sq_feet.replace(" sqft", "")
+                sqft = float(raw_sq_feet.replace(" sqft", ""))
+            self._cleaned["sq_feet_in"] = sqft
 
         self._cleaned["listing_type"] = self.raw_listing.get("Building").get("Type")
         self._cleaned["amenities"] = self.raw_listing.get("Building").get("Ammenities")
@@ -192,52 +292,127 @@ class _ListingCleaner:
         return self._cleaned
 
 
-def _parse_listings(date: dt.date = None) -> pd.DataFrame:
-    """Clean up raw listings to a DataFrame."""
-    if date is None:
-        date = dt.date.today()
-    raw = _full_day_listings(date)
+def _clean_rowwise(raw: Iterable[Dict]) -> pd.DataFrame:
+    """Clean raw listings one at a time with ``_ListingCleaner``."""
     cleaned_listings = list()
     for raw_listing in raw:
         cleaned_listing = _ListingCleaner(raw_listing).clean_listing
         if cleaned_listing is not None:
             cleaned_listings.append(cleaned_listing)
-    _ = None
-    listings_df = pd.DataFrame(cleaned_listings).assign(scrape_dt=date).drop_duplicates()
-    numeric_cols = [
-        "mls_id",
-        "stories",
-        "bedrooms_above",
-        "bedrooms_below",
-        "bedrooms",
-        "bathrooms",
-        "sq_feet_in",
-        "price",
-    ]
-    datetime_cols = [
-        "price_change_dt",
-        "scrape_dt",
-        "mls_insert_dt",
-    ]
-    for col in numeric_cols:
-        listings_df[col] = pd.to_numeric(listings_df[col])
-    for col in datetime_cols:
-        listings_df[col] = pd.to_datetime(listings_df[col], format="%Y-%m-%d")
-    return listings_df
+    return pd.DataFrame(cleaned_listings)
+
+
+# Every column of a day's clean MLS listings and its type
+_SCHEMA: Schema = {
+    "mls_id": "int64",
+    "mls_number": "object",
+    "stories": "float32",
+    "listing_description": "object",
+    "bedrooms_above": "Int8",
+    "bedrooms_below": "Int8",
+    "bedrooms": "Int8",
+    "bathrooms": "Int8",
+    "sq_feet_in": "float32",
+    "listing_type": "category",
+    "amenities": "object",
+    "price": "float64",
+    "property_type": "category",
+    "listing_address": "object",
+    "longitude": "float32",
+    "latitude": "float32",
+    "ownership_type": "category",
+    "parking": "object",
+    "parking_spaces": "Int16",
+    "lot_size": "object",
+    "postal_code": "object",
+    "link": "object",
+    "price_change_dt": "datetime64[ns]",
+    "mls_insert_dt": "datetime64[ns]",
+    "scrape_dt": "datetime64[ns]",
+}
+
+
+def _type_listings(cleaned_df: pd.DataFrame, date: dt.date) -> pd.DataFrame:
+    """Add the scrape date, drop duplicates and set column types."""
+    listings_df = cleaned_df.assign(scrape_dt=date).drop_duplicates()
+    return apply_schema(listings_df, _SCHEMA, "mls")
+
+
+def _parse_listings(
+    date: dt.date = None, vectorized: bool = True, use_cache: bool = True
+) -> pd.DataFrame:
+    """Clean up raw listings to a DataFrame.
+
+    Parameters
+    ----------
+    date: dt.date, optional
+        The scrape day, today if not given
+    vectorized: bool, default True
+        Clean whole columns at once with ``clean_listings``, otherwise fall back to
+        cleaning one listing at a time. Both give the same result
+    use_cache: bool, default True
+        Reuse cleaned listings from earlier parses for listings that haven't
+        changed, only applies when vectorized
+
+    Returns
+    -------
+    pd.DataFrame
+        Clean listings for the day
+    """
+    if date is None:
+        date = dt.date.today()
+    if not vectorized:
+        cleaned_df = _clean_rowwise(_iter_day_listings(date))
+    elif use_cache:
+        with source_cache("mls", CLEANER_VERSION) as cache:
+            hashed = _iter_day_hashed(date)
+            cleaned_df = clean_cached(hashed, clean_with_positions, cache, date)
+    else:
+        decoder = listing_decoder("mls")
+        cleaned_df = clean_listings(_iter_day_listings(date, decoder))
+    return _type_listings(cleaned_df, date)
+
+
+def _write_dataset_partition(date: dt.date, listings_df: pd.DataFrame) -> None:
+    """Add a day of clean listings to the cross day dataset."""
+    write_partition("mls", date, listings_df, sort_by="mls_id")
+
+
+def _conform_partition(listings_df: pd.DataFrame) -> pd.DataFrame:
+    """Bring a day written to the dataset under an older schema up to date."""
+    return apply_schema(listings_df, _SCHEMA, "mls")
 
 
 def _raw_to_parquet(date: dt.date = None, force_overwrite: bool = False) -> Path:
-    """Take a raw scrape and save a dataframe to parquet."""
+    """Take a raw scrape and save a dataframe to parquet.
+
+    The day also gets written to the partitioned dataset of every scrape day.
+    """
     if date is None:
         date = dt.date.today()
     out_dir = _find_scrapes_dir(date)
     out_file = out_dir / "clean.pq"
     if out_file.exists() and (not force_overwrite):
         logger.debug(f"{out_file} exists, skipping")
+        if not has_partition("mls", date):
+            _write_dataset_partition(
+                date,
+                apply_schema(
+                    pd.read_parquet(
+                        out_file, engine="fastparquet", columns=list(_SCHEMA)
+                    ),
+                    _SCHEMA,
+                    "mls",
+                ),
+            )
     else:
         logger.info(f"Saving clean parquet to {out_file}")
         listings_df = _parse_listings(date)
-        listings_df.to_parquet(out_file, engine="fastparquet")
+        # Location features only go in the day's file, the dataset keeps the schema
+        add_spatial_features(listings_df, "mls").to_parquet(
+            out_file, engine="fastparquet"
+        )
+        _write_dataset_partition(date, listings_df)
     return out_file
 
 
@@ -253,13 +428,34 @@ def _find_all_raw_scrape_days() -> List[dt.date]:
     return scrape_days
 
 
-def parse_scrapes(force_overwrite: bool = False):
-    """Parse all raw scrapes and save them as parquet files."""
-    scrape_days = _find_all_raw_scrape_days()
-    for scrape_day in scrape_days:
-        _raw_to_parquet(scrape_day, force_overwrite)
+def parse_scrapes(
+    force_overwrite: bool = False, max_workers: Optional[int] = 1
+) -> Dict[dt.date, BaseException]:
+    """Parse all raw scrapes and save them as parquet files.
+
+    A day that fails to parse doesn't stop the rest, its error gets returned.
+
+    Parameters
+    ----------
+    force_overwrite: bool, default False
+        Reparse days that already have a clean parquet file
+    max_workers: int, optional, default 1
+        Parse this many days at once in separate processes, None for one per CPU
+
+    Returns
+    -------
+    Dict[dt.date, BaseException]
+        The error from every day that failed to parse
+    """
+    errors = parse_days(
+        _raw_to_parquet, _find_all_raw_scrape_days(), force_overwrite, max_workers
+    )
+    refresh_metadata("mls", conform=_conform_partition, sort_by="mls_id")
+    with source_cache("mls", CLEANER_VERSION) as cache:
+        cache.evict()
+    return errors
 
 
 if __name__ == "__main__":
-    parse_scrapes(True)
+    parse_scrapes(True, max_workers=None)
     print("hurray!")
@@ -2,18 +2,34 @@
 import datetime as dt
 import json
 import time
-import zipfile
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from pathlib import Path
+from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Tuple
 
-import geocoder
-import requests
+from wheretolive.fastjson import loads
+from wheretolive.geobounds import get_bounds
 from wheretolive.logconf import get_logger
 from wheretolive.mls.common import _find_base_dir
+from wheretolive.mls.common import _find_scrapes_dir
+from wheretolive.mls.parse import _compact_day
+from wheretolive.mls.parse import _find_all_raw_scrape_days
+from wheretolive.mls.parse import _full_day_listings
+from wheretolive.rawdump import DEFAULT_CODEC
+from wheretolive.rawdump import write_dump
+from wheretolive.scraping import Checkpoint
+from wheretolive.scraping import RateLimiter
+from wheretolive.scraping import ScraperClient
 
 logger = get_logger(__name__)
 
-_GEOBOUND = geocoder.osm("Calgary, Canada")
+_PLACE = "Calgary, Canada"
+
+_CLIENT: Optional[ScraperClient] = None
 
 
 def _mls_cookie() -> dict:
@@ -40,6 +56,27 @@ def _mls_cookie() -> dict:
 	}
 
 
+def _mls_client() -> ScraperClient:
+    """Get the shared client for talking to realtor.ca.
+
+    Headers and cookies only get set up once and every page reuses the same
+    keep-alive connections.
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        headers = {
+            "user-agent": "Mozilla/5.0 (Linux; Android 12; Pixel 3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.87 Mobile Safari/537.36",
+            "referer": "https://www.realtor.ca",
+            "origin": "https://www.realtor.ca",
+            "sec-ch-ua": '" Not A;Brand";v="99", "Chromium";v="98", "Google Chrome";v="98"',
+            "sec-ch-ua-mobile": "?1",
+            "sec-ch-ua-platform": "Android",
+            "sec-fetch-site": "same-site",
+        }
+        _CLIENT = ScraperClient(headers=headers, cookies=_mls_cookie())
+    return _CLIENT
+
+
 def _mls_scrape_page(
     max_results: int = 100,
     price_min: int = 0,
@@ -47,6 +84,9 @@ def _mls_scrape_page(
     property_type: int = 1,
     language: str = "English",
     max_attempts_page: int = 10,
+    limiter: Optional[RateLimiter] = None,
+    sort: str = "1-A",
+    current_page: int = 1,
 ) -> List:
     """Scrape from MLS.
 
@@ -71,17 +111,27 @@ def _mls_scrape_page(
         I also don't know why they skipped 7, maybe it's deprecated
     language: ["English", "French"] default English
         Result language
+    max_attempts_page: int, default 10
+        How many times to try the page before giving up
+    limiter: RateLimiter, optional
+        Shared limiter to wait on before every request, used when scraping
+        price bands concurrently
+    sort: str, default "1-A"
+        Sort order, "1-A" is price ascending and "6-D" is newest listings first
+    current_page: int, default 1
+        Which page of ``max_results`` listings to return
 
     """
     languages = {"English": "1", "French": "2"}
-    g = _GEOBOUND
+    g = get_bounds(_PLACE)
     payload = {
         "CultureId": languages[language],
         # Hard code to mobile, seems to allow it to work
         "ApplicationId": "1",
         "Version": "7.0",
         "RecordsPerPage": max_results,
-        "MaximumResults": max_results,
+        "MaximumResults": max_results * current_page,
+        "CurrentPage": current_page,
         "PropertySearchTypeId": property_type,
         "PriceMin": price_min,
         "PriceMax": price_max,
@@ -99,7 +149,7 @@ def _mls_scrape_page(
         "LongitudeMax": g.east,
         "LatitudeMin": g.south,
         "LatitudeMax": g.north,
-        "Sort": "1-A",
+        "Sort": sort,
         # "SortOrder": "A",
         # "SortBy": "1",
         "viewState": "m",
@@ -107,35 +157,19 @@ def _mls_scrape_page(
         "Latitude": g.lat,
         "ZoomLevel": "11",
     }
-    headers = {
-        "accept-encoding": 'gzip, deflate, br',
-        "user-agent": "Mozilla/5.0 (Linux; Android 12; Pixel 3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.87 Mobile Safari/537.36",
-        "referer": "https://www.realtor.ca",
-        "origin": "https://www.realtor.ca",
-        "sec-ch-ua": '" Not A;Brand";v="99", "Chromium";v="98", "Google Chrome";v="98"',
-        "sec-ch-ua-mobile": "?1",
-        "sec-ch-ua-platform": "Android",
-        "sec-fetch-site": "same-site",
-
-    }
     uri = "https://api2.realtor.ca/Listing.svc/PropertySearch_Post"
     logger.info(
         f"Querying MLS listings priced between ${price_min:,.0f} and ${price_max:,.0f}"
     )
-    attempts = 0
-    while attempts < max_attempts_page:
-        attempts += 1
-        session = requests.Session()
-        r = session.post(uri, data=payload, headers=headers, cookies=_mls_cookie())
-        if r.ok:
-            results = r.json()["Results"]
-            return results
-        else:
-            # Give a longer sleep between failed attempts
-            logger.warning(f"failed for price range {price_min}, {price_max}, attempt: {attempts}")
-            time.sleep(5)
-    # Give it some time first
-    raise RuntimeError(f"failed for price range {price_min}, {price_max} after {attempts} tries")
+    try:
+        r = _mls_client().post(
+            uri, data=payload, limiter=limiter, max_attempts=max_attempts_page
+        )
+    except RuntimeError as err:
+        raise RuntimeError(
+            f"failed for price range {price_min}, {price_max}"
+        ) from err
+    return loads(r.content)["Results"]
 
 
 def _max_result_price(results) -> float:
@@ -151,40 +185,429 @@ def _max_result_price(results) -> float:
     )
 
 
-def _dump_result(results) -> Path:
-    """Save results to a zipped json."""
+def _dump_result(
+    results, price_min: Optional[int] = None, codec: str = DEFAULT_CODEC
+) -> Path:
+    """Save results to a compressed json dump.
+
+    Concurrent band scrapes pass in the bottom of their band so two bands that
+    happen to top out at the same price don't overwrite each other.
+    """
     max_price: str = f"{_max_result_price(results):.0f}".zfill(8)
     today: str = f"{dt.date.today():%Y-%m-%d}"
     base_dir = _find_base_dir()
     dump_dir = base_dir / today
     dump_dir.mkdir(exist_ok=True, parents=True)
-    filename = f"mls_{today}_maxprice_{max_price}"
-    zipname = f"{filename}.zip"
-    jsonname = f"{filename}.json"
-    with zipfile.ZipFile(dump_dir / zipname, "w", compression=zipfile.ZIP_LZMA) as z:
-        with z.open(jsonname, "w") as d:
-            d.write(json.dumps(results).encode("utf-8"))
+    if price_min is None:
+        filename = f"mls_{today}_maxprice_{max_price}"
+    else:
+        min_price: str = f"{price_min}".zfill(8)
+        filename = f"mls_{today}_minprice_{min_price}_maxprice_{max_price}"
+    return write_dump(dump_dir, filename, results, codec)
+
 
-    return dump_dir / zipname
+def _checkpoint(date: dt.date = None) -> Checkpoint:
+    """Get the checkpoint manifest for a day's scrape."""
+    return Checkpoint(_find_scrapes_dir(date) / "checkpoint.json")
 
 
 def scrape_all():
-    """Save all currently available listings."""
+    """Save all currently available listings.
+
+    Every page is recorded in the day's checkpoint, so if this dies part way
+    through running it again picks up from the last page that finished.
+    """
+    checkpoint = _checkpoint()
+    if checkpoint.complete:
+        logger.info("MLS scrape already finished today")
+        return
     price_min: int = 0
-    results = None
-    while results or price_min == 0:
+    unit = checkpoint.get(f"price_min_{price_min}")
+    while unit is not None:
+        if unit["next_price_min"] is None:
+            checkpoint.mark_complete()
+            _save_full_scrape_state()
+            _compact_day()
+            return
+        price_min = unit["next_price_min"]
+        unit = checkpoint.get(f"price_min_{price_min}")
+    if price_min:
+        logger.info(f"Resuming MLS scrape from ${price_min:,.0f}")
+    while True:
         results = _mls_scrape_page(price_min=price_min)
-        if results:
-            _dump_result(results)
+        if not results:
+            checkpoint.mark_done(f"price_min_{price_min}", next_price_min=None)
+            break
+        dump = _dump_result(results)
         top_price = int(round(_max_result_price(results), 0))
         # Break out of loop if there's only one listing left
         if top_price - 1 == price_min:
+            checkpoint.mark_done(f"price_min_{price_min}", dump, next_price_min=None)
             break
         # have to subtract 1 in case there are multiple listings with
         # the same price and my cutoff is partway through them
-        price_min = top_price - 1
+        next_price_min = top_price - 1
+        checkpoint.mark_done(
+            f"price_min_{price_min}", dump, next_price_min=next_price_min
+        )
+        price_min = next_price_min
         # wait a second so I don't hammer the server too hard
         time.sleep(1)
+    checkpoint.mark_complete()
+    logger.info(f"MLS scrape finished: {_mls_client().stats.summary()}")
+    _save_full_scrape_state()
+    _compact_day()
+
+
+def _price_bands(
+    price_min: int = 0, price_max: int = 10_000_000, n_bands: int = 16
+) -> List[Tuple[int, int]]:
+    """Split a price range into bands to scrape independently.
+
+    Listings are bunched up at the low end of the range, so band edges are spaced
+    quadratically rather than evenly. That way the bands near the bottom are narrow
+    and the ones covering the sparse high end are wide.
+
+    Parameters
+    ----------
+    price_min: int, default 0
+        Bottom of the full range
+    price_max: int, default $10M
+        Top of the full range
+    n_bands: int, default 16
+        How many bands to split into
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        (price_min, price_max) of each band. Neighbouring bands share their edge
+        price so nothing falls through the gap, duplicates get dropped in parsing
+    """
+    span = price_max - price_min
+    edges = [price_min + round(span * (i / n_bands) ** 2) for i in range(n_bands + 1)]
+    # dedupe edges in case the range is too small for the number of bands
+    edges = sorted(set(edges))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _scrape_band(
+    price_min: int,
+    price_max: int,
+    limiter: RateLimiter,
+    max_results: int = 100,
+    checkpoint: Optional[Checkpoint] = None,
+) -> Tuple[Optional[Path], List[Tuple[int, int]]]:
+    """Scrape one price band, or split it if it has too many listings.
+
+    Bands recorded in the checkpoint aren't requested again, their dump or
+    sub bands are read back from the manifest instead.
+
+    Parameters
+    ----------
+    price_min: int
+        Bottom of the band
+    price_max: int
+        Top of the band
+    limiter: RateLimiter
+        Shared limiter across all the band workers
+    max_results: int, default 100
+        Page size, if we get this many back the band was truncated
+    checkpoint: Checkpoint, optional
+        Manifest to record the band in once it's done
+
+    Returns
+    -------
+    Tuple[Optional[Path], List[Tuple[int, int]]]
+        Where the band was dumped, if it was, and any sub bands that still need
+        to be scraped
+    """
+    key = f"band_{price_min}_{price_max}"
+    if checkpoint is None:
+        checkpoint = _checkpoint()
+    unit = checkpoint.get(key)
+    if unit is not None:
+        output = unit.get("output")
+        dump = None if output is None else checkpoint.path.parent / output
+        return dump, [tuple(band) for band in unit["sub_bands"]]
+    dump, sub_bands = _scrape_band_page(price_min, price_max, limiter, max_results)
+    checkpoint.mark_done(key, dump, sub_bands=sub_bands)
+    return dump, sub_bands
+
+
+def _scrape_band_page(
+    price_min: int,
+    price_max: int,
+    limiter: RateLimiter,
+    max_results: int = 100,
+) -> Tuple[Optional[Path], List[Tuple[int, int]]]:
+    """Request a band and either dump it or work out how to split it."""
+    results = _mls_scrape_page(
+        max_results=max_results,
+        price_min=price_min,
+        price_max=price_max,
+        limiter=limiter,
+    )
+    if not results:
+        return None, []
+    if len(results) >= max_results:
+        if price_max - price_min > 1:
+            mid = (price_min + price_max) // 2
+            logger.info(
+                f"Band ${price_min:,.0f} to ${price_max:,.0f} hit MaximumResults, splitting"
+            )
+            return None, [(price_min, mid), (mid, price_max)]
+        logger.warning(
+            f"Band ${price_min:,.0f} to ${price_max:,.0f} can't be split further, "
+            "some listings may be missing"
+        )
+    return _dump_result(results, price_min=price_min), []
+
+
+def scrape_all_concurrent(
+    n_bands: int = 16,
+    max_workers: int = 4,
+    requests_per_second: float = 2.0,
+    price_min: int = 0,
+    price_max: int = 10_000_000,
+    max_results: int = 100,
+) -> List[Path]:
+    """Save all currently available listings, scraping price bands in parallel.
+
+    Unlike ``scrape_all`` the bands don't depend on each other, so total run time
+    is bounded by ``requests_per_second`` rather than by how long each round trip
+    to the server takes. Finished bands are recorded in the day's checkpoint and
+    skipped if the scrape is rerun.
+
+    Parameters
+    ----------
+    n_bands: int, default 16
+        How many bands to split the price range into up front
+    max_workers: int, default 4
+        Most bands to have in flight at once
+    requests_per_second: float, default 2.0
+        Most requests to send per second across all workers
+    price_min: int, default 0
+        Lowest price to search
+    price_max: int, default $10M
+        Highest price to search
+    max_results: int, default 100
+        Page size for each band request
+
+    Returns
+    -------
+    List[Path]
+        All the dumped result files, none if today's scrape had already finished
+    """
+    checkpoint = _checkpoint()
+    if checkpoint.complete:
+        logger.info("MLS scrape already finished today")
+        return list()
+    limiter = RateLimiter(requests_per_second)
+    # set up the shared client before any worker threads go looking for it
+    _mls_client()
+    dumped: List[Path] = list()
+    bands = _price_bands(price_min, price_max, n_bands)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {
+            executor.submit(_scrape_band, lo, hi, limiter, max_results, checkpoint)
+            for lo, hi in bands
+        }
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dump, sub_bands = future.result()
+                    if dump is not None:
+                        dumped.append(dump)
+                    for lo, hi in sub_bands:
+                        pending.add(
+                            executor.submit(
+                                _scrape_band, lo, hi, limiter, max_results, checkpoint
+                            )
+                        )
+        except Exception:
+            for future in pending:
+                future.cancel()
+            raise
+    checkpoint.mark_complete()
+    logger.info(f"Scraped {len(dumped)} MLS price bands")
+    logger.info(f"MLS scrape finished: {_mls_client().stats.summary()}")
+    _save_full_scrape_state()
+    _compact_day()
+    return dumped
+
+
+def _parse_price_change(raw_date: Optional[str]) -> Optional[dt.datetime]:
+    """Read PriceChangeDateUTC the same way the parser does."""
+    if raw_date is None:
+        return None
+    return dt.datetime.strptime(raw_date, "%Y-%m-%d %H:%M:%S %p")
+
+
+class _ScrapeState:
+    """What we knew about the listings as of a scrape.
+
+    Tracks the newest ``InsertedDateUTC`` and ``PriceChangeDateUTC`` we've seen
+    along with every listing ``Id``, which is enough to tell whether a freshly
+    scraped listing is new or re-priced.
+    """
+
+    def __init__(self, full_scrape_date: dt.date) -> None:
+        self.full_scrape_date = full_scrape_date
+        self.max_inserted = 0
+        self.max_price_change: Optional[dt.datetime] = None
+        self.ids = set()
+
+    def update(self, listings: List) -> None:
+        """Fold a batch of raw listings into the state."""
+        for listing in listings:
+            self.ids.add(listing.get("Id"))
+            inserted = listing.get("InsertedDateUTC")
+            if inserted is not None:
+                self.max_inserted = max(self.max_inserted, int(inserted))
+            price_change = _parse_price_change(listing.get("PriceChangeDateUTC"))
+            if price_change is not None and (
+                self.max_price_change is None or price_change > self.max_price_change
+            ):
+                self.max_price_change = price_change
+
+    def is_changed(self, listing: Dict) -> bool:
+        """Check if a raw listing is new or re-priced since this state."""
+        if listing.get("Id") not in self.ids:
+            return True
+        inserted = listing.get("InsertedDateUTC")
+        if inserted is not None and int(inserted) > self.max_inserted:
+            return True
+        price_change = _parse_price_change(listing.get("PriceChangeDateUTC"))
+        if price_change is None:
+            return False
+        return self.max_price_change is None or price_change > self.max_price_change
+
+    def save(self, path: Path) -> None:
+        """Write the state out as json."""
+        state = {
+            "full_scrape_date": f"{self.full_scrape_date:%Y-%m-%d}",
+            "max_inserted": self.max_inserted,
+            "max_price_change": (
+                None
+                if self.max_price_change is None
+                else self.max_price_change.isoformat()
+            ),
+            "ids": sorted(self.ids),
+        }
+        path.parent.mkdir(exist_ok=True, parents=True)
+        with open(path, "w") as f:
+            json.dump(state, f)
+
+    @classmethod
+    def load(cls, path: Path) -> "_ScrapeState":
+        """Read a state saved with ``save``."""
+        with open(path, "r") as f:
+            raw_state = json.load(f)
+        state = cls(dt.date.fromisoformat(raw_state["full_scrape_date"]))
+        state.max_inserted = raw_state["max_inserted"]
+        if raw_state["max_price_change"] is not None:
+            state.max_price_change = dt.datetime.fromisoformat(
+                raw_state["max_price_change"]
+            )
+        state.ids = set(raw_state["ids"])
+        return state
+
+
+def _state_file(date: dt.date = None) -> Path:
+    """Where the scrape state for a day lives."""
+    return _find_scrapes_dir(date) / "state.json"
+
+
+def _save_full_scrape_state(date: dt.date = None) -> None:
+    """Record the state of a day that was scraped in full."""
+    if date is None:
+        date = dt.date.today()
+    state = _ScrapeState(full_scrape_date=date)
+    state.update(_full_day_listings(date))
+    state.save(_state_file(date))
+
+
+def _previous_scrape_day(date: dt.date = None) -> Optional[dt.date]:
+    """Find the most recent day before ``date`` that has a scrape."""
+    if date is None:
+        date = dt.date.today()
+    earlier_days = [day for day in _find_all_raw_scrape_days() if day < date]
+    return max(earlier_days, default=None)
+
+
+def scrape_delta(
+    max_pages: int = 50, full_every_days: int = 7, max_results: int = 100
+) -> Optional[Path]:
+    """Only pull listings that are new or re-priced since the last scrape.
+
+    Listings are requested newest first and we stop as soon as a whole page has
+    nothing we didn't already know about. The changes are merged into the previous
+    day's listings to rebuild a full view of today, which is dumped like any other
+    scrape so parsing doesn't need to know the difference.
+
+    The search can't be sorted or filtered on price change date, so re-priced
+    listings only get picked up if they show up in the newest pages, and delisted
+    listings stay in the merged view. To bound that drift we fall back to a full
+    ``scrape_all`` when there's no previous scrape or the last full one is more
+    than ``full_every_days`` old.
+
+    Parameters
+    ----------
+    max_pages: int, default 50
+        Most newest-first pages to request before giving up on finding the end
+    full_every_days: int, default 7
+        How many days we can go on deltas before doing a full scrape again
+    max_results: int, default 100
+        Page size
+
+    Returns
+    -------
+    Optional[Path]
+        Manifest of the merged listings, or None if we fell back to a full scrape
+    """
+    today = dt.date.today()
+    previous_day = _previous_scrape_day(today)
+    if previous_day is None:
+        logger.info("No previous MLS scrape, doing a full one")
+        scrape_all()
+        return None
+    previous_listings = _full_day_listings(previous_day)
+    if _state_file(previous_day).exists():
+        state = _ScrapeState.load(_state_file(previous_day))
+    else:
+        state = _ScrapeState(full_scrape_date=previous_day)
+        state.update(previous_listings)
+    if (today - state.full_scrape_date).days >= full_every_days:
+        logger.info(f"Last full MLS scrape was {state.full_scrape_date}, redoing it")
+        scrape_all()
+        return None
+    delta = list()
+    for page in range(1, max_pages + 1):
+        results = _mls_scrape_page(
+            max_results=max_results, sort="6-D", current_page=page
+        )
+        changed = [listing for listing in results if state.is_changed(listing)]
+        delta.extend(changed)
+        if not changed or len(results) < max_results:
+            break
+        time.sleep(1)
+    else:
+        logger.warning(f"Still finding new MLS listings after {max_pages} pages")
+    logger.info(
+        f"Found {len(delta):,.0f} new or re-priced MLS listings since {previous_day}"
+    )
+    merged = {listing.get("Id"): listing for listing in previous_listings}
+    merged.update((listing.get("Id"), listing) for listing in delta)
+    merged_listings = sorted(
+        merged.values(),
+        key=lambda listing: float(listing.get("Property").get("PriceUnformattedValue")),
+    )
+    _dump_result(merged_listings)
+    state.update(delta)
+    state.save(_state_file(today))
+    logger.info(f"MLS delta scrape finished: {_mls_client().stats.summary()}")
+    return _compact_day()
 
 
 if __name__ == "__main__":
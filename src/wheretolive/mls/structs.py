@@ -0,0 +1,59 @@
+"""Typed shape of a raw realtor.ca listing, only the fields cleaning uses.
+
+Each entry of a search's ``Results`` carries agent details, photos, open houses and
+plenty more that parsing never looks at. Decoding into these structs skips all of it
+and leaves ``Building``, ``Property`` and its ``Address`` as small objects with the
+few fields ``clean._struct_fields`` reads. Needs ``msgspec``, see ``fastjson``.
+"""
+from typing import Optional
+from typing import Union
+
+import msgspec
+
+# The site sends numbers as text, don't fall over if one comes through bare or as a bool
+Scalar = Optional[Union[str, bool, int, float]]
+
+
+class Building(msgspec.Struct, rename="pascal"):
+    stories_total: Scalar = None
+    bedrooms: Optional[str] = None
+    bathroom_total: Scalar = None
+    size_interior: Optional[str] = None
+    type: Optional[str] = None
+    ammenities: Optional[str] = None
+
+
+class Address(msgspec.Struct, rename="pascal"):
+    address_text: Optional[str] = None
+    longitude: Scalar = None
+    latitude: Scalar = None
+
+
+class Property(msgspec.Struct, rename="pascal"):
+    price_unformatted_value: Scalar = None
+    type: Optional[str] = None
+    address: Address = msgspec.field(default_factory=Address)
+    ownership_type: Optional[str] = None
+    parking_type: Optional[str] = None
+    parking_space_total: Scalar = None
+
+
+class Land(msgspec.Struct, rename="pascal"):
+    size_total: Optional[str] = None
+
+
+class Listing(msgspec.Struct, rename="pascal"):
+    id: Scalar = None
+    mls_number: Optional[str] = None
+    public_remarks: Optional[str] = None
+    building: Building = msgspec.field(default_factory=Building)
+    property: Property = msgspec.field(default_factory=Property)
+    land: Land = msgspec.field(default_factory=Land)
+    postal_code: Optional[str] = None
+    relative_details_url: Optional[str] = msgspec.field(
+        default=None, name="RelativeDetailsURL"
+    )
+    price_change_date_utc: Optional[str] = msgspec.field(
+        default=None, name="PriceChangeDateUTC"
+    )
+    inserted_date_utc: Scalar = msgspec.field(default=None, name="InsertedDateUTC")
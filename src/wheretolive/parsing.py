@@ -0,0 +1,73 @@
+"""Parse many scrape days at once.
+
+Each day's raw scrape parses into its own files independent of every other day, so
+a full reparse can run days side by side on a process pool. Parsing is CPU bound
+python, so processes rather than threads are what actually spread it over cores.
+"""
+import datetime as dt
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+
+def parse_days(
+    raw_to_parquet: Callable[[dt.date, bool], object],
+    scrape_days: List[dt.date],
+    force_overwrite: bool = False,
+    max_workers: Optional[int] = 1,
+) -> Dict[dt.date, BaseException]:
+    """Run a source's day parser over many days, carrying on past failures.
+
+    Parameters
+    ----------
+    raw_to_parquet: Callable[[dt.date, bool], object]
+        Parses one day, has to be a module level function so it can be sent to
+        another process
+    scrape_days: List[dt.date]
+        Days to parse
+    force_overwrite: bool, default False
+        Reparse days that have already been parsed
+    max_workers: int, optional, default 1
+        How many processes to use, 1 parses in this process one day at a time and
+        None uses one per CPU
+
+    Returns
+    -------
+    Dict[dt.date, BaseException]
+        The error from every day that failed, empty if they all worked
+    """
+    scrape_days = sorted(scrape_days)
+    errors = dict()
+    if max_workers == 1:
+        for scrape_day in scrape_days:
+            try:
+                raw_to_parquet(scrape_day, force_overwrite)
+            except Exception as err:
+                logger.exception(f"Failed to parse {scrape_day}")
+                errors[scrape_day] = err
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(raw_to_parquet, day, force_overwrite): day
+                for day in scrape_days
+            }
+            for future in as_completed(futures):
+                scrape_day = futures[future]
+                try:
+                    future.result()
+                except Exception as err:
+                    logger.error(f"Failed to parse {scrape_day}: {err!r}")
+                    errors[scrape_day] = err
+    if errors:
+        logger.warning(
+            f"{len(errors)} of {len(scrape_days)} days failed to parse: "
+            f"{', '.join(str(day) for day in sorted(errors))}"
+        )
+    return dict(sorted(errors.items()))
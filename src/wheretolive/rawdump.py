@@ -0,0 +1,378 @@
+"""Read and write raw scrape dumps.
+
+Every scraped page gets saved as its own dump. Originally those were always LZMA
+zipped JSON arrays, which are small but slow to write and even slower to read back
+when parsing. Dumps can now be written with any of these codecs:
+
+lzma: the original zipped JSON array, kept so old dumps still read the same
+gzip: gzipped JSON Lines, the default, much faster than LZMA for a bit more disk
+zstd: zstandard compressed JSON Lines, fastest of the lot, needs ``zstandard``
+jsonl: uncompressed JSON Lines
+
+Readers don't need to know which codec was used, it's worked out from the file.
+
+``read_dump`` loads a whole dump at once. ``iter_dump`` and ``iter_dumps`` stream
+listings out one at a time instead, so parsing a day never has to hold every raw
+listing, or the text they were decoded from, in memory at once. They can also decode
+into typed structs with a ``fastjson.ListingDecoder``.
+"""
+import gzip
+import io
+import json
+import queue
+import threading
+import zipfile
+from pathlib import Path
+from typing import IO
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from wheretolive.fastjson import ListingDecoder
+from wheretolive.fastjson import dumps
+from wheretolive.fastjson import loads
+
+DEFAULT_CODEC = "gzip"
+
+_SUFFIXES = {
+    "lzma": ".zip",
+    "gzip": ".jsonl.gz",
+    "zstd": ".jsonl.zst",
+    "jsonl": ".jsonl",
+}
+
+_ZIP_MAGIC = b"PK\x03\x04"
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Characters of a JSON array read at a time when streaming an LZMA dump
+_CHUNK_SIZE = 1 << 16
+
+
+def _zstandard():
+    """Import zstandard, which is only needed for the zstd codec."""
+    try:
+        import zstandard
+    except ImportError as err:
+        raise ImportError(
+            "The zstd codec needs the zstandard package, install it or pick "
+            "another codec"
+        ) from err
+    return zstandard
+
+
+def available_codecs() -> List[str]:
+    """List the codecs that can be used in this environment."""
+    codecs = list(_SUFFIXES)
+    try:
+        _zstandard()
+    except ImportError:
+        codecs.remove("zstd")
+    return codecs
+
+
+def _write_jsonl(f: IO[bytes], listings: List) -> None:
+    """Write listings one per line."""
+    for listing in listings:
+        f.write(dumps(listing))
+        f.write(b"\n")
+
+
+def _read_jsonl(f: IO[bytes]) -> List:
+    """Read listings written one per line."""
+    return [loads(line) for line in f if line.strip()]
+
+
+def write_dump(
+    dump_dir: Path, filename: str, listings: List, codec: str = DEFAULT_CODEC
+) -> Path:
+    """Save a page of listings.
+
+    Parameters
+    ----------
+    dump_dir: Path
+        Folder to save into
+    filename: str
+        Name of the dump without any extension
+    listings: List
+        Raw listings to save
+    codec: str, default "gzip"
+        One of "lzma", "gzip", "zstd" or "jsonl"
+
+    Returns
+    -------
+    Path
+        Where the dump was saved, with the extension for the codec
+    """
+    if codec not in _SUFFIXES:
+        raise ValueError(f"Unknown codec {codec}, expected one of {list(_SUFFIXES)}")
+    dump_dir.mkdir(exist_ok=True, parents=True)
+    path = dump_dir / f"{filename}{_SUFFIXES[codec]}"
+    if codec == "lzma":
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_LZMA) as z:
+            with z.open(f"{filename}.json", "w") as d:
+                d.write(dumps(listings))
+    elif codec == "gzip":
+        # Level 6 is where gzip stops getting meaningfully smaller for JSON
+        with gzip.open(path, "wb", compresslevel=6) as f:
+            _write_jsonl(f, listings)
+    elif codec == "zstd":
+        compressor = _zstandard().ZstdCompressor(level=3)
+        with open(path, "wb") as raw, compressor.stream_writer(raw) as f:
+            _write_jsonl(f, listings)
+    else:
+        with open(path, "wb") as f:
+            _write_jsonl(f, listings)
+    return path
+
+
+def read_dump(path: Path) -> List:
+    """Load a page of listings saved with any codec.
+
+    Parameters
+    ----------
+    path: Path
+        The dump to load
+
+    Returns
+    -------
+    List
+        The raw listings in the dump
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(_ZIP_MAGIC):
+        with zipfile.ZipFile(path, mode="r") as z:
+            with z.open(z.namelist()[0]) as f:
+                return loads(f.read())
+    if magic.startswith(_GZIP_MAGIC):
+        with gzip.open(path, "rb") as f:
+            return _read_jsonl(f)
+    if magic.startswith(_ZSTD_MAGIC):
+        decompressor = _zstandard().ZstdDecompressor()
+        with open(path, "rb") as raw, decompressor.stream_reader(raw) as f:
+            return _read_jsonl(io.BufferedReader(f))
+    with open(path, "rb") as f:
+        return _read_jsonl(f)
+
+
+def find_dumps(dump_dir: Path, pattern: str) -> List[Path]:
+    """Find every dump in a folder matching a name pattern, whatever its codec.
+
+    Parameters
+    ----------
+    dump_dir: Path
+        Folder to look in
+    pattern: str
+        Glob for the dump names without an extension, like "mls_*_maxprice_*"
+
+    Returns
+    -------
+    List[Path]
+        Matching dumps, sorted by name so results come out in a stable order
+    """
+    dumps = set()
+    for suffix in _SUFFIXES.values():
+        dumps.update(dump_dir.glob(f"{pattern}{suffix}"))
+    return sorted(dumps)
+
+
+def _iter_json_array(f: IO[str]) -> Iterator:
+    """Decode the items of a JSON array one at a time as the text comes in.
+
+    Parameters
+    ----------
+    f: IO[str]
+        Text holding a single JSON array
+
+    Yields
+    ------
+    Any
+        Each item of the array
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(_CHUNK_SIZE)
+    idx = 0
+    eof = False
+
+    def _skip(idx: int, chars: str) -> int:
+        while idx < len(buf) and buf[idx] in chars:
+            idx += 1
+        return idx
+
+    def _more(idx: int):
+        # Drop what's been decoded so the buffer only ever holds about one chunk
+        chunk = f.read(_CHUNK_SIZE)
+        return buf[idx:] + chunk, 0, not chunk
+
+    idx = _skip(idx, " \t\r\n")
+    if not buf.startswith("[", idx):
+        raise ValueError("Expected a JSON array")
+    idx += 1
+    while True:
+        idx = _skip(idx, " \t\r\n,")
+        if idx == len(buf):
+            if eof:
+                raise ValueError("JSON array ended early")
+            buf, idx, eof = _more(idx)
+            continue
+        if buf[idx] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, idx)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            buf, idx, eof = _more(idx)
+            continue
+        if end == len(buf) and not eof:
+            # A number cut off at the end of a chunk still decodes, so make sure
+            # there's something after it before trusting it
+            buf, idx, eof = _more(idx)
+            continue
+        yield item
+        idx = end
+
+
+def iter_dump(path: Path, decoder: Optional[ListingDecoder] = None) -> Iterator:
+    """Stream the listings out of a dump saved with any codec.
+
+    Parameters
+    ----------
+    path: Path
+        The dump to load
+    decoder: ListingDecoder, optional
+        Decode listings with this instead of into plain dicts. An LZMA dump gets
+        decoded a whole page at a time when it's given
+
+    Yields
+    ------
+    Dict
+        Each raw listing in the dump, in order
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(_ZIP_MAGIC):
+        with zipfile.ZipFile(path, mode="r") as z:
+            with z.open(z.namelist()[0]) as raw:
+                if decoder is None:
+                    text = io.TextIOWrapper(raw, encoding="utf-8")
+                    yield from _iter_json_array(text)
+                else:
+                    yield from decoder.decode_array(raw.read())
+        return
+    if magic.startswith(_GZIP_MAGIC):
+        opener = gzip.open(path, "rb")
+    elif magic.startswith(_ZSTD_MAGIC):
+        opener = io.BufferedReader(
+            _zstandard().ZstdDecompressor().stream_reader(open(path, "rb"))
+        )
+    else:
+        opener = open(path, "rb")
+    decode = loads if decoder is None else decoder.decode
+    with opener as f:
+        for line in f:
+            if line.strip():
+                yield decode(line)
+
+
+_DONE = object()
+
+
+def _decode_into(
+    path: Path,
+    out: "queue.Queue",
+    stop: threading.Event,
+    decoder: Optional[ListingDecoder] = None,
+    timeout: float = 0.1,
+) -> None:
+    """Stream a dump onto a queue, ending with a done marker or the error."""
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=timeout)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for listing in iter_dump(path, decoder):
+            if not _put(listing):
+                return
+    except Exception as err:
+        _put(err)
+        return
+    _put(_DONE)
+
+
+def iter_dumps(
+    paths: Sequence[Path],
+    max_workers: int = 4,
+    max_queued: int = 1_000,
+    decoder: Optional[ListingDecoder] = None,
+) -> Iterator:
+    """Stream listings out of many dumps, decoding several dumps at once.
+
+    Dumps are decoded on background threads, each one into its own bounded queue,
+    and read back in the order they were given so the result is always the same.
+    Decompression lets go of the GIL, so that part overlaps with parsing. At most
+    ``max_workers * max_queued`` decoded listings are waiting at any time.
+
+    Parameters
+    ----------
+    paths: Sequence[Path]
+        Dumps to load
+    max_workers: int, default 4
+        How many dumps to decode at once
+    max_queued: int, default 1,000
+        How many decoded listings each dump can get ahead of the reader by
+    decoder: ListingDecoder, optional
+        Decode listings with this instead of into plain dicts
+
+    Yields
+    ------
+    Dict
+        Every raw listing from every dump, in order
+    """
+    paths = list(paths)
+    if max_workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield from iter_dump(path, decoder)
+        return
+    queues = [queue.Queue(maxsize=max_queued) for _ in paths]
+    stop = threading.Event()
+    next_path = iter(range(len(paths)))
+    lock = threading.Lock()
+
+    def _worker() -> None:
+        # Dumps are handed out in order, so the one being read is always either
+        # finished or has a thread on it and the reader can't get stuck
+        while not stop.is_set():
+            with lock:
+                i = next(next_path, None)
+            if i is None:
+                return
+            _decode_into(paths[i], queues[i], stop, decoder)
+
+    threads = [
+        threading.Thread(target=_worker, daemon=True)
+        for _ in range(min(max_workers, len(paths)))
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for q in queues:
+            while True:
+                item = q.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,338 @@
+"""Deduplicated store of raw listings shared across scrape days.
+
+Most listings are byte for byte the same as they were the day before, so rather than
+every day keeping its own full copy, each listing is saved once under the hash of its
+content. A day only keeps a manifest of the id and hash of every listing it saw, and
+a day's raw listings are rebuilt by looking each hash up in the store.
+
+Listings are appended to one pack file per day, each one its own gzip member, so
+the store stays a few hundred files instead of one per listing. An append only
+index says which pack each hash is in and where. Packs are written before the
+index, so a crash part way through only ever leaves unreferenced bytes at the end
+of a pack. Stores from before packs still read from their loose objects.
+"""
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import IO
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
+
+from wheretolive.fastjson import ListingDecoder
+from wheretolive.fastjson import dumps
+from wheretolive.fastjson import loads
+from wheretolive.logconf import get_logger
+from wheretolive.rawdump import iter_dump
+from wheretolive.rawdump import iter_dumps
+from wheretolive.rawdump import write_dump
+
+logger = get_logger(__name__)
+
+_MANIFEST_NAME = "manifest"
+
+# Index entries by store, along with how much of the index file they cover
+_INDEXES: Dict[Path, Tuple[int, Dict[str, Tuple[str, int, int]]]] = dict()
+
+
+def listing_hash(listing: Dict) -> str:
+    """Hash a raw listing by its content.
+
+    Keys are sorted first so the same listing hashes the same no matter what order
+    the site sent its fields in. Always goes through the standard library so hashes
+    don't change with whichever fast JSON package happens to be installed.
+
+    Parameters
+    ----------
+    listing: Dict
+        The raw listing
+
+    Returns
+    -------
+    str
+        Hex digest of the listing
+    """
+    canonical = json.dumps(listing, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _object_path(store_dir: Path, digest: str) -> Path:
+    """Where a listing lived before packs, one gzipped file per hash."""
+    return store_dir / "objects" / digest[:2] / f"{digest}.json.gz"
+
+
+def _pack_path(store_dir: Path, pack: str) -> Path:
+    return store_dir / "packs" / f"{pack}.pack"
+
+
+def _index_path(store_dir: Path) -> Path:
+    return store_dir / "packs" / "index.tsv"
+
+
+def _manifest_path(day_dir: Path) -> Path:
+    return day_dir / f"{_MANIFEST_NAME}.jsonl.gz"
+
+
+def has_manifest(day_dir: Path) -> bool:
+    """Check if a day has been moved into the store."""
+    return _manifest_path(day_dir).exists()
+
+
+def _load_index(store_dir: Path) -> Dict[str, Tuple[str, int, int]]:
+    """Pack, offset and length of every listing in the store, by hash.
+
+    Kept between calls, and only what's been appended since gets read.
+    """
+    path = _index_path(store_dir)
+    read_to, index = _INDEXES.get(path, (0, dict()))
+    size = path.stat().st_size if path.exists() else 0
+    if size == read_to:
+        return index
+    if size < read_to:
+        # Not the index that was read before, start over
+        read_to, index = 0, dict()
+    with open(path, "rb") as f:
+        f.seek(read_to)
+        data = f.read()
+    # Leave a line that's still being written for next time
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].splitlines():
+        fields = line.decode("utf-8").split("\t")
+        # A crash can leave half a line behind, it never made it into a manifest
+        if len(fields) != 4 or not fields[2].isdigit() or not fields[3].isdigit():
+            continue
+        digest, pack, offset, length = fields
+        index[digest] = (pack, int(offset), int(length))
+    _INDEXES[path] = (read_to + end, index)
+    return index
+
+
+def _append_index(store_dir: Path, lines: List[str]) -> None:
+    path = _index_path(store_dir)
+    with open(path, "ab") as f:
+        # Start clean after half a line left by a crash
+        if f.tell() and not _ends_with_newline(path):
+            f.write(b"\n")
+        f.write("".join(lines).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _iter_manifest(day_dir: Path) -> Iterator[Dict]:
+    if has_manifest(day_dir):
+        yield from iter_dump(_manifest_path(day_dir))
+
+
+def stored_dumps(day_dir: Path) -> Set[str]:
+    """Names of the dumps a day's manifest already has the listings of.
+
+    The manifest starts with them, before the listings.
+    """
+    for entry in _iter_manifest(day_dir):
+        return set(entry.get("dumps", []))
+    return set()
+
+
+def unstored_dumps(day_dir: Path, dumps: Sequence[Path]) -> List[Path]:
+    """Leave out dumps that are already in the store, see ``compact_dumps``."""
+    stored = stored_dumps(day_dir)
+    return [path for path in dumps if path.name not in stored]
+
+
+def store_day(
+    store_dir: Path,
+    day_dir: Path,
+    listings: Iterable,
+    id_key: str,
+    dump_names: Iterable[str] = (),
+) -> Path:
+    """Save a day's listings into the store and add them to its manifest.
+
+    Only listings the store hasn't seen before get written, to the end of the day's
+    pack. The manifest is swapped in whole once everything is stored.
+
+    Parameters
+    ----------
+    store_dir: Path
+        Root of the store, shared by every day from the same source
+    day_dir: Path
+        The day's scrape folder, where the manifest goes
+    listings: Iterable
+        Raw listings from the day that aren't in its manifest yet
+    id_key: str
+        Which field of a listing is its id, kept in the manifest for reference
+    dump_names: Iterable[str], optional
+        Names of the dumps the listings came from, so they're never stored twice
+
+    Returns
+    -------
+    Path
+        Where the manifest was saved
+    """
+    index = _load_index(store_dir)
+    pack = day_dir.name
+    pack_path = _pack_path(store_dir, pack)
+    pack_path.parent.mkdir(exist_ok=True, parents=True)
+    entries = list()
+    new_lines = list()
+    new_hashes = set()
+    with open(pack_path, "ab") as f:
+        offset = f.tell()
+        for listing in listings:
+            digest = listing_hash(listing)
+            entries.append({"id": listing.get(id_key), "hash": digest})
+            if digest in index or digest in new_hashes:
+                continue
+            data = gzip.compress(dumps(listing), compresslevel=6, mtime=0)
+            f.write(data)
+            new_lines.append(f"{digest}\t{pack}\t{offset}\t{len(data)}\n")
+            new_hashes.add(digest)
+            offset += len(data)
+        f.flush()
+        os.fsync(f.fileno())
+    if new_lines:
+        _append_index(store_dir, new_lines)
+    old_entries = [entry for entry in _iter_manifest(day_dir) if "hash" in entry]
+    header = {"dumps": sorted(stored_dumps(day_dir).union(dump_names))}
+    # Write then rename so a crash never leaves a truncated manifest behind
+    tmp_path = write_dump(
+        day_dir, f"{_MANIFEST_NAME}.tmp", [header, *old_entries, *entries], "gzip"
+    )
+    manifest = tmp_path.replace(_manifest_path(day_dir))
+    logger.info(
+        f"Stored {len(entries):,.0f} listings for {day_dir.name}, "
+        f"{len(new_hashes):,.0f} new"
+    )
+    return manifest
+
+
+def compact_dumps(
+    store_dir: Path, day_dir: Path, dumps: Sequence[Path], id_key: str
+) -> Path:
+    """Move a day's raw dumps into the store, then delete them.
+
+    Safe to run again after a crash at any point. Dumps the manifest already has
+    are only deleted, never stored a second time.
+
+    Parameters
+    ----------
+    store_dir: Path
+        Root of the store
+    day_dir: Path
+        The day's scrape folder
+    dumps: Sequence[Path]
+        Every dump in the day's folder, whether it's been stored or not
+    id_key: str
+        Which field of a listing is its id
+
+    Returns
+    -------
+    Path
+        The day's manifest
+    """
+    new_dumps = unstored_dumps(day_dir, dumps)
+    if new_dumps or not has_manifest(day_dir):
+        store_day(
+            store_dir,
+            day_dir,
+            iter_dumps(new_dumps),
+            id_key,
+            [path.name for path in new_dumps],
+        )
+    for path in dumps:
+        path.unlink()
+    return _manifest_path(day_dir)
+
+
+def load_day(store_dir: Path, day_dir: Path) -> List:
+    """Rebuild a day's raw listings from its manifest.
+
+    Parameters
+    ----------
+    store_dir: Path
+        Root of the store
+    day_dir: Path
+        The day's scrape folder
+
+    Returns
+    -------
+    List
+        The raw listings, in the order they were stored
+    """
+    return list(iter_day(store_dir, day_dir))
+
+
+def iter_day(
+    store_dir: Path, day_dir: Path, decoder: Optional[ListingDecoder] = None
+) -> Iterator:
+    """Stream a day's raw listings from its manifest one at a time.
+
+    Parameters
+    ----------
+    store_dir: Path
+        Root of the store
+    day_dir: Path
+        The day's scrape folder
+    decoder: ListingDecoder, optional
+        Decode listings with this instead of into plain dicts
+
+    Yields
+    ------
+    Dict
+        Each raw listing, in the order they were stored
+    """
+    decode = loads if decoder is None else decoder.decode
+    packs = dict()
+    try:
+        for digest in iter_day_hashes(day_dir):
+            yield decode(_read_listing(store_dir, digest, packs))
+    finally:
+        for f in packs.values():
+            f.close()
+
+
+def iter_day_hashes(day_dir: Path) -> Iterator[str]:
+    """Stream the hash of every listing in a day without loading the listings."""
+    for entry in _iter_manifest(day_dir):
+        if "hash" in entry:
+            yield entry["hash"]
+
+
+def _read_listing(store_dir: Path, digest: str, packs: Dict[str, IO[bytes]]) -> bytes:
+    """Read a listing's JSON, keeping the packs it opens around in ``packs``."""
+    location = _load_index(store_dir).get(digest)
+    if location is None:
+        with gzip.open(_object_path(store_dir, digest), "rb") as f:
+            return f.read()
+    pack, offset, length = location
+    if pack not in packs:
+        packs[pack] = open(_pack_path(store_dir, pack), "rb")
+    f = packs[pack]
+    f.seek(offset)
+    return gzip.decompress(f.read(length))
+
+
+def load_listing(
+    store_dir: Path, digest: str, decoder: Optional[ListingDecoder] = None
+):
+    """Load one raw listing from the store by its hash, as a dict by default."""
+    packs = dict()
+    try:
+        data = _read_listing(store_dir, digest, packs)
+    finally:
+        for f in packs.values():
+            f.close()
+    return loads(data) if decoder is None else decoder.decode(data)
@@ -0,0 +1,211 @@
+"""Clean raw rentfaster listings a column at a time.
+
+``_ListingCleaner`` in ``parse`` deep copies every listing and runs its regexes, date
+parsing and utility checks in python one listing at a time. Here the raw listings go
+into one frame and the same cleaning happens on whole columns: string methods for
+square footage and ids, a lookup of each distinct availability for dates and
+boolean masks for utilities, dens and rentals. The result is exactly what
+``pd.DataFrame`` gives for the row by row cleaner's output.
+"""
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+# Bump whenever cleaning changes so cached clean listings get redone
+CLEANER_VERSION = "1"
+
+_NOT_HOUSING = ["Office Space", "Parking Spot", "Storage", "Shared"]
+
+_UTILITIES = ["electricity", "water", "heat", "internet", "cable"]
+
+# Added by cleaning, in the order the row by row cleaner adds them
+_EXTRA_COLUMNS = ["raw_sq_feet", *_UTILITIES, "util_check_listing"]
+
+
+def _availability_dates(availability: pd.Series) -> pd.Series:
+    """Parse availability to dates, only parsing each distinct value once.
+
+    There are only a handful of distinct availabilities on any day, so running
+    them through the row by row parser keeps every quirk of it for almost no cost.
+    """
+    # Avoid a circular import, parse imports this module
+    from wheretolive.rfaster.parse import _ListingCleaner
+
+    lookup = {
+        value: _ListingCleaner._avdate_parser(value)
+        for value in availability.dropna().unique()
+    }
+    avdate = availability.map(lookup, na_action="ignore").astype(object)
+    return avdate.where(availability.notna(), None)
+
+
+def _sq_feet(raw_sq_feet: pd.Series) -> pd.Series:
+    """Pull the square footage out of the raw text.
+
+    Anything mentioning "plus", ranges and other text that isn't a single number
+    come out as None, so do "0" and blanks.
+    """
+    sq_feet = raw_sq_feet.astype(object)
+    present = sq_feet.notna()
+    text = sq_feet[present].astype(str)
+    digits = text.str.replace(r"[A-Za-z~\.\ <>,]", "", regex=True)
+    digits = digits.where(~text.str.lower().str.contains("plus", regex=False), "")
+    is_int = digits.str.fullmatch(r"[+-]?\d+") & digits.ne("0")
+    parsed = pd.Series(None, index=digits.index, dtype=object)
+    parsed[is_int] = digits[is_int].astype(int).tolist()
+    # int() reads 1_000 as 1000, leave those few to python
+    odd = digits.str.contains("_", regex=False) & digits.ne("0")
+    for idx in digits.index[odd]:
+        try:
+            parsed[idx] = int(digits[idx])
+        except ValueError:
+            parsed[idx] = None
+    sq_feet[present] = parsed
+    return sq_feet
+
+
+def _listing_ids(ids: pd.Series, links: pd.Series) -> pd.Series:
+    """Make ids unique per listing from the number after the link's underscore.
+
+    See ``_ListingCleaner._parse_listing_id`` for why.
+    """
+    if ids.isna().any() or links.isna().any():
+        bad = ids.isna() | links.isna()
+        raise ValueError(
+            f"ID: {ids[bad].iloc[0]} Link: {links[bad].iloc[0]} validation error"
+        )
+    link_end = links.astype(str).str.extract(r"^.*\/([0-9_]*$)", expand=False)
+    if link_end.isna().any():
+        bad_link = links[link_end.isna()].iloc[0]
+        raise ValueError(f"Couldn't parse link from {bad_link}")
+    n_underscores = link_end.str.count("_")
+    if n_underscores.gt(1).any():
+        raise ValueError(
+            f"Couldn't split link end {link_end[n_underscores.gt(1)].iloc[0]}"
+        )
+    unique_ids = link_end.where(n_underscores.eq(1), ids.astype(str) + "_0")
+    return unique_ids.astype(object)
+
+
+def _utility_flags(utilities: pd.Series) -> pd.DataFrame:
+    """Flag which utilities are included.
+
+    Utilities come either as a list, where a utility has to be an entry, or as
+    text, where it just has to show up somewhere, same as python's ``in``.
+    """
+    utilities = utilities.astype(object)
+    has_any = utilities.notna() & utilities.str.len().fillna(0).gt(0)
+    is_list = utilities.map(lambda v: isinstance(v, list), na_action="ignore")
+    is_list = is_list.fillna(False).astype(bool)
+    listed = utilities[has_any & is_list].explode()
+    text = utilities[has_any & ~is_list].astype(str)
+
+    def _included(entry: str) -> pd.Series:
+        included = pd.Series(False, index=utilities.index)
+        included[text.index] = text.str.contains(entry, regex=False)
+        if not listed.empty:
+            in_list = listed.eq(entry).groupby(level=0).any()
+            included[in_list.index] = in_list
+        return included.astype(bool)
+
+    flags = {util_key: _included(util_key.title()) for util_key in _UTILITIES}
+    flags["util_check_listing"] = _included("See Full Description")
+    return pd.DataFrame(flags)
+
+
+def _column_order(rows: list, first_valid: Optional[int], all_columns) -> list:
+    """Order columns the way pd.DataFrame orders the row by row cleaner's dicts."""
+    if first_valid is None:
+        return list()
+    first_keys = [k for k in rows[first_valid] if k != "utilities_included"]
+    skip = set(first_keys) | set(_EXTRA_COLUMNS) | {"utilities_included"}
+    rest = [col for col in all_columns if col not in skip]
+    return first_keys + _EXTRA_COLUMNS + rest
+
+
+def _struct_row(listing) -> Dict:
+    """Turn a listing decoded into ``structs.Listing`` into a raw dict."""
+    return {field: getattr(listing, field) for field in listing.__struct_fields__}
+
+
+def clean_listings(raw: Iterable) -> pd.DataFrame:
+    """Clean raw rentfaster listings into a frame, skipping anything not housing.
+
+    Parameters
+    ----------
+    raw: Iterable
+        Raw listings as dicts or ``structs.Listing``, can be a generator
+
+    Returns
+    -------
+    pd.DataFrame
+        The same frame ``pd.DataFrame`` builds from the row by row cleaner's output
+    """
+    return clean_with_positions(raw)[0]
+
+
+def clean_with_positions(raw: Iterable) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Clean raw rentfaster listings, keeping track of where each row came from.
+
+    Parameters
+    ----------
+    raw: Iterable
+        Raw listings as dicts or ``structs.Listing``, can be a generator
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, np.ndarray]
+        The same frame as ``clean_listings`` and the position in ``raw`` of every
+        row of it, listings that were skipped don't show up
+    """
+    rows = [
+        listing if isinstance(listing, dict) else _struct_row(listing)
+        for listing in raw
+    ]
+    if not rows:
+        return pd.DataFrame(), np.array([], dtype=int)
+    listings = pd.DataFrame(rows, dtype=object)
+    is_valid = ~listings["type"].isin(_NOT_HOUSING) & listings["avdate"].ne(
+        "No Vacancy"
+    )
+    valid_positions = np.flatnonzero(is_valid.to_numpy(bool))
+    first_valid = int(valid_positions[0]) if len(valid_positions) else None
+    columns = _column_order(rows, first_valid, listings.columns)
+    del rows
+    listings = listings[is_valid.to_numpy(bool)].reset_index(drop=True)
+    if listings.empty:
+        return pd.DataFrame(), valid_positions
+
+    listings["avdate"] = _availability_dates(listings["availability"])
+    # Keep the raw square footage in case there's a parsing error I need to fix
+    listings["raw_sq_feet"] = listings["sq_feet"]
+    listings["sq_feet"] = _sq_feet(listings["sq_feet"])
+    listings["id"] = _listing_ids(listings["id"], listings["link"])
+
+    # Bedrooms like "1 + Den" and a den of "Yes" mean the same thing
+    den = listings["den"]
+    den = den.mask(den.isin(["No", ""]), False).mask(den.eq("Yes"), True)
+    bedrooms = listings["bedrooms"].astype(object)
+    has_den = bedrooms.str.contains(" + Den", regex=False).fillna(False).astype(bool)
+    listings["den"] = den.mask(has_den, True)
+    bedrooms = bedrooms.mask(has_den, bedrooms.str.replace(" + Den", "", regex=False))
+    listings["bedrooms"] = bedrooms.mask(bedrooms.isin(["bachelor", "none"]), "0")
+    listings["baths"] = listings["baths"].mask(listings["baths"].eq("none"), None)
+
+    flags = _utility_flags(listings["utilities_included"])
+    for col in flags.columns:
+        listings[col] = flags[col]
+    listings["link"] = "https://www.rentfaster.ca" + listings["link"].astype(str)
+    listings["rented"] = listings["rented"].ne("Not-Rented")
+    # Let pandas pick column types from the values, same as it does for the row
+    # by row cleaner's dictionaries
+    cleaned_df = pd.DataFrame({col: listings[col].tolist() for col in columns})
+    return cleaned_df, valid_positions
@@ -3,12 +3,46 @@ import datetime as dt
 
 import pandas as pd
 
+from wheretolive.commutes import refresh_commute_features
 from wheretolive.logconf import get_logger
 from wheretolive.postgis import PostGIS
+from wheretolive.postgis import copy_frame
+from wheretolive.postgis import point_ewkb
+from wheretolive.postgis import refresh_materialized_view
 from wheretolive.rfaster.common import _find_scrapes_dir
+from wheretolive.upsert import changed_keys
+from wheretolive.upsert import merge_staged
 
 logger = get_logger(__name__)
 
+# Clean listing column to rfaster table column, for every column the table keeps.
+# Python location features are left out, see wheretolive.spatial
+_TABLE_COLUMNS = {
+    "id": "rfaster_id",
+    "price": "price",
+    "title": "listing_description",
+    "sq_feet": "sq_feet_in",
+    "avdate": "avdate",
+    "link": "link",
+    "rented": "rented",
+    "smoking": "smoking",
+    "lease_term": "lease_term",
+    "garage_size": "garage_size",
+    "bedrooms": "bedrooms",
+    "den": "den",
+    "baths": "bathrooms",
+    "cats": "cats",
+    "dogs": "dogs",
+    "electricity": "electricity",
+    "water": "water",
+    "heat": "heat",
+    "internet": "internet",
+    "cable": "cable",
+    "util_check_listing": "util_check_listing",
+    "scrape_dt": "scrape_dt",
+    "first_seen_dt": "first_seen_dt",
+}
+
 
 def get_rfaster_scrape_df(scrape_date: dt.date = None) -> pd.DataFrame:
     """Read a clean scraped rentfaster date to a dataframe."""
@@ -17,94 +51,47 @@ def get_rfaster_scrape_df(scrape_date: dt.date = None) -> pd.DataFrame:
     return rfaster_df
 
 
+def _to_table_columns(rfaster_df: pd.DataFrame) -> pd.DataFrame:
+    """Rename clean listing columns to the rfaster table's, dropping the rest."""
+    geom = point_ewkb(rfaster_df["longitude"], rfaster_df["latitude"])
+    return rfaster_df.rename(columns=_TABLE_COLUMNS)[
+        list(_TABLE_COLUMNS.values())
+    ].assign(geom=geom)
+
+
 def update_rfaster_gis(scrape_date: dt.date = None):
-    """Update rfaster data to the scraped date."""
+    """Merge the scraped date into rfaster, only touching listings that changed.
+
+    Listings missing from the scrape get marked delisted rather than deleted, and
+    the first seen date of a listing only ever moves earlier. See
+    ``wheretolive.upsert``.
+    """
     db = PostGIS().connection
     rfaster_df = get_rfaster_scrape_df(scrape_date)
+    if rfaster_df.empty:
+        # Merging nothing would mark every listing delisted
+        raise ValueError(f"No rentfaster listings scraped for {scrape_date}")
+    table_df = _to_table_columns(rfaster_df)
     logger.info(f"Uploading rfaster data for {scrape_date}")
     with db.begin() as conn:
-        rfaster_df.to_sql("rfaster_staging", conn, if_exists="replace", index=False)
-        add_geom = "SELECT AddGeometryColumn('public', 'rfaster_staging','geom',4326,'POINT',2);"
-        conn.execute(add_geom)
-        update_latlong = 'UPDATE public.rfaster_staging SET geom = ST_SetSRID(ST_MakePoint("longitude"::double precision, "latitude"::double precision), 4326);'
-        conn.execute(update_latlong)
-        first_seen = """
-        UPDATE rfaster_staging
-        SET first_seen_dt = subquery.min_seen
-        FROM (
-            SELECT
-                rfaster_staging.id,
-                LEAST(rfaster_staging.scrape_dt, rfaster.first_seen_dt) AS min_seen
-            FROM
-                rfaster_staging
-                LEFT JOIN rfaster
-                ON rfaster_staging.id = rfaster.rfaster_id
-        ) AS subquery
-        WHERE rfaster_staging.id = subquery.id;
-        """
-        logger.info("Updating rentfaster staging with first seen date.")
-        conn.execute(first_seen)
-        logger.info("Truncating old rfaster table.")
-        conn.execute("TRUNCATE rfaster;")
-        insertion = """
-        INSERT INTO rfaster (
-            rfaster_id,
-            price,
-            listing_description,
-            sq_feet_in,
-            avdate,
-            link,
-            rented,
-            smoking,
-            lease_term,
-            garage_size,
-            bedrooms,
-            den,
-            bathrooms,
-            cats,
-            dogs,
-            electricity,
-            water,
-            heat,
-            internet,
-            cable,
-            util_check_listing,
-            scrape_dt,
-            first_seen_dt,
-            geom
+        conn.execute("TRUNCATE rfaster_staging;")
+        n_rows = copy_frame(conn, "rfaster_staging", table_df)
+        logger.info(f"Copied {n_rows:,.0f} records with locations into staging")
+        # Only listings that are new or moved need their commutes redone
+        moved = changed_keys(conn, "rfaster", "rfaster_id", ["geom"])
+        merge_staged(
+            conn,
+            "rfaster",
+            "rfaster_id",
+            list(table_df.columns),
+            keep_first=["first_seen_dt"],
+            status_column="rented",
         )
-        SELECT
-            id AS rfaster_id,
-            price,
-            title AS listing_description,
-            sq_feet AS sq_feet_in,
-            avdate,
-            link,
-            rented,
-            smoking,
-            lease_term,
-            garage_size,
-            bedrooms,
-            den,
-            baths AS bathrooms,
-            cats,
-            dogs,
-            electricity,
-            water,
-            heat,
-            internet,
-            cable,
-            util_check_listing,
-            scrape_dt,
-            first_seen_dt,
-            geom
-        FROM rfaster_staging;
-        """
-        logger.info("Updating rfaster from rfaster_staging.")
-        conn.execute(insertion)
-        refresh_wide = "REFRESH MATERIALIZED VIEW rfaster_wide;"
-        conn.execute(refresh_wide)
-        logger.info("Refreshed wide materialized view of rfaster listings.")
+    # Refresh after the merge commits so the merge's locks aren't held meanwhile
+    with db.begin() as conn:
+        refresh_commute_features(conn, "rfaster", keys=moved)
+    with db.begin() as conn:
+        refresh_materialized_view(conn, "rfaster_wide")
 
 
 if __name__ == "__main__":
@@ -1,17 +1,67 @@
 """Scrape and save raw Rentfaster data."""
 import datetime as dt
-import json
-import time
-import urllib.request
-import zipfile
+import itertools
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict
 from typing import List
+from typing import Optional
 
+from wheretolive.fastjson import loads
 from wheretolive.logconf import get_logger
+from wheretolive.rawdump import DEFAULT_CODEC
+from wheretolive.rawdump import write_dump
 from wheretolive.rfaster.common import _find_base_dir
+from wheretolive.rfaster.common import _find_scrapes_dir
+from wheretolive.rfaster.parse import _compact_day
+from wheretolive.rfaster.parse import _load_raw_zip
+from wheretolive.scraping import Checkpoint
+from wheretolive.scraping import RateLimiter
+from wheretolive.scraping import ScraperClient
 
 logger = get_logger(__name__)
 
+_CLIENT: Optional[ScraperClient] = None
+
+
+def _rfaster_client() -> ScraperClient:
+    """Get the shared client for talking to rentfaster."""
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = ScraperClient()
+    return _CLIENT
+
+
+def _get_search_page(
+    city_id: int = 1, page: int = 0, limiter: Optional[RateLimiter] = None
+) -> Dict:
+    """Retrieve the full search json for a specific page.
+
+    Parameters
+    ----------
+    city_id: int, default 1
+        The city_id to query, default is 1 for Calgary
+    page: int, default 0
+        Which page of results to get
+    limiter: RateLimiter, optional
+        Shared limiter to wait on before sending the request
+
+    Returns
+    -------
+    Dict:
+        Raw JSON of a rentfaster search page
+    """
+    # Modified from
+    # "https://github.com/furas/python-examples/blob/master/__scraping__/rentfaster.ca%20-%20requests/main.py"  # noqa: E510 B950
+    # This is a hard coded url so I don't have to worry about users passing file:/ or
+    # other custom schemes
+    logger.info(f"Querying Rentfaster listings page {page}.")
+    url = f"https://www.rentfaster.ca/api/search.json?proximity_type=location-city&novacancy=0&cur_page={page}&city_id={city_id}"  # noqa: E510 B950
+    r = _rfaster_client().get(url, limiter=limiter)
+    return loads(r.content)
+
 
 def get_listings_page(city_id: int = 1, page: int = 0) -> List:
     """Retrieve listings for a specific page.
@@ -35,56 +85,176 @@ def get_listings_page(city_id: int = 1, page: int = 0) -> List:
     List:
         Raw JSON of a rentfaster listing page
     """
-    # Modified from
-    # "https://github.com/furas/python-examples/blob/master/__scraping__/rentfaster.ca%20-%20requests/main.py"  # noqa: E510 B950
-    # This is a hard coded url so I don't have to worry about users passing file:/ or
-    # other custom schemes
-    logger.info(f"Querying Rentfaster listings page {page}.")
-    url = f"https://www.rentfaster.ca/api/search.json?proximity_type=location-city&novacancy=0&cur_page={page}&city_id={city_id}"  # noqa: E510 B950
-    r = urllib.request.urlopen(url)  # noqa: S310
-    data = json.loads(r.read())["listings"]
-    return data
+    return _get_search_page(city_id=city_id, page=page)["listings"]
 
 
-def _dump_result(results, page) -> Path:
-    """Save results to a zipped json."""
+def _dump_result(results, page, codec: str = DEFAULT_CODEC) -> Path:
+    """Save results to a compressed json dump."""
     today: str = f"{dt.date.today():%Y-%m-%d}"
     base_dir = _find_base_dir()
     dump_dir = base_dir / today
     dump_dir.mkdir(exist_ok=True, parents=True)
     filename = f"rfaster_{today}_page_{page}"
-    zipname = f"{filename}.zip"
-    jsonname = f"{filename}.json"
     logger.info(f"Dumping rentfaster listings page {page}.")
-    with zipfile.ZipFile(dump_dir / zipname, "w", compression=zipfile.ZIP_LZMA) as z:
-        with z.open(jsonname, "w") as d:
-            d.write(json.dumps(results).encode("utf-8"))
-    return dump_dir / zipname
+    return write_dump(dump_dir, filename, results, codec)
 
 
-def scrape_all(city_id: int = 1) -> None:
-    """Get all available listings from rentfaster.
+class _Deduplicator:
+    """Drop listings we've already saved from another page.
+
+    Listings get added and removed while we scrape, which shifts everything after
+    them onto a different page. Without this a listing that moved back a page
+    between requests gets saved twice.
+    """
+
+    def __init__(self) -> None:
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(listing: Dict):
+        # Multiple units can share an id, the link tells them apart
+        return listing.get("id"), listing.get("link")
+
+    def add_seen(self, listings: List) -> None:
+        """Record listings that were saved by an earlier run."""
+        with self._lock:
+            self._seen.update(self._key(listing) for listing in listings)
+
+    def new_listings(self, listings: List) -> List:
+        """Filter down to listings we haven't seen, and mark them as seen."""
+        fresh = list()
+        with self._lock:
+            for listing in listings:
+                key = self._key(listing)
+                if key not in self._seen:
+                    self._seen.add(key)
+                    fresh.append(listing)
+        return fresh
+
+
+def _scrape_page(
+    city_id: int,
+    page: int,
+    checkpoint: Checkpoint,
+    deduplicator: _Deduplicator,
+    limiter: Optional[RateLimiter] = None,
+) -> Dict:
+    """Fetch, deduplicate, dump and checkpoint one page.
 
     Parameters
     ----------
-    city_id: int, default 1
-        The city_id to query, default is 1 for Calgary
+    city_id: int
+        The city_id to query
+    page: int
+        Which page of results to get
+    checkpoint: Checkpoint
+        Manifest to record the page in once it's dumped
+    deduplicator: _Deduplicator
+        Shared record of which listings have already been saved
+    limiter: RateLimiter, optional
+        Shared limiter to wait on before sending the request
 
     Returns
     -------
-    List:
-        parsed list of all pages of rentfaster listings
+    Dict:
+        What was recorded in the checkpoint for the page
+    """
+    search = _get_search_page(city_id=city_id, page=page, limiter=limiter)
+    raw_listings = search["listings"]
+    listings = deduplicator.new_listings(raw_listings)
+    if len(listings) < len(raw_listings):
+        logger.info(
+            f"Dropped {len(raw_listings) - len(listings)} duplicate listings "
+            f"from page {page}."
+        )
+    dump = _dump_result(listings, page)
+    checkpoint.mark_done(
+        f"page_{page}",
+        dump,
+        n_raw=len(raw_listings),
+        n_listings=len(listings),
+        total=search.get("total"),
+    )
+    return checkpoint.get(f"page_{page}")
+
+
+def scrape_all(
+    city_id: int = 1, max_workers: int = 4, requests_per_second: float = 2.0
+) -> None:
+    """Get all available listings from rentfaster.
+
+    The first page tells us how many listings there are in total, which is enough
+    to work out how many pages to ask for and fetch the rest concurrently. We ask
+    for one page past the expected end, then keep going one page at a time until a
+    page comes back empty, in case listings were added while we scraped.
+
+    Every page is recorded in the day's checkpoint, so if this dies part way
+    through running it again only fetches the pages that didn't finish.
+
+    Parameters
+    ----------
+    city_id: int, default 1
+        The city_id to query, default is 1 for Calgary
+    max_workers: int, default 4
+        Most pages to have in flight at once
+    requests_per_second: float, default 2.0
+        Most requests to send per second across all workers
     """
-    # Not completely happy with how I've structured this while loop, but I'll deal
-    page = 0
-    page_list = get_listings_page(city_id=city_id, page=page)
-    _dump_result(page_list, page)
-    while page_list:
-        # be polite, don't hammer the server
-        time.sleep(1)
+    checkpoint = Checkpoint(_find_scrapes_dir() / "checkpoint.json")
+    if checkpoint.complete:
+        logger.info("Rentfaster scrape already finished today")
+        return
+    deduplicator = _Deduplicator()
+    limiter = RateLimiter(requests_per_second)
+    # set up the shared client before any worker threads go looking for it
+    _rfaster_client()
+    first_page = checkpoint.get("page_0")
+    if first_page is None:
+        first_page = _scrape_page(city_id, 0, checkpoint, deduplicator, limiter)
+    else:
+        logger.info("Resuming rentfaster scrape")
+    page_size = first_page["n_raw"]
+    if page_size == 0:
+        checkpoint.mark_complete()
+        _compact_day()
+        return
+    total = first_page["total"] or 0
+    expected_pages = max(math.ceil(int(total) / page_size), 1)
+    logger.info(f"Expecting {total} rentfaster listings over {expected_pages} pages")
+    # Reload anything saved by an earlier run so it doesn't get saved twice
+    for page in itertools.count():
+        unit = checkpoint.get(f"page_{page}")
+        if unit is not None:
+            deduplicator.add_seen(_load_raw_zip(checkpoint.path.parent / unit["output"]))
+        elif page > expected_pages:
+            break
+    todo = [
+        page
+        for page in range(1, expected_pages + 1)
+        if not checkpoint.is_done(f"page_{page}")
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(
+            executor.map(
+                lambda page: _scrape_page(
+                    city_id, page, checkpoint, deduplicator, limiter
+                ),
+                todo,
+            )
+        )
+    # Listings added mid scrape can push some past the page we expected to be last
+    page = expected_pages
+    unit = checkpoint.get(f"page_{page}")
+    while unit["n_raw"] > 0:
         page += 1
-        page_list = get_listings_page(city_id=city_id, page=page)
-        _dump_result(page_list, page)
+        unit = checkpoint.get(f"page_{page}")
+        if unit is None:
+            unit = _scrape_page(city_id, page, checkpoint, deduplicator, limiter)
+    logger.info(f"Scraped rentfaster pages 0 to {page}")
+    checkpoint.mark_complete()
+    _compact_day()
+    logger.info(f"Rentfaster scrape finished: {_rfaster_client().stats.summary()}")
 
 
 if __name__ == "__main__":
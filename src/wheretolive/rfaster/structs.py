@@ -0,0 +1,41 @@
+"""Typed shape of a raw rentfaster listing, only the fields cleaning uses.
+
+Entries of a search page's ``listings`` come with thumbnails, intros, addresses and
+more that never make it into a clean listing. Decoding into this struct skips those
+and ``clean._struct_row`` turns what's left into the same dict the cleaner gets from
+plain decoding. Field names match the site's keys. Needs ``msgspec``, see
+``fastjson``.
+"""
+from typing import List
+from typing import Optional
+from typing import Union
+
+import msgspec
+
+# Numbers come through as text, bare or as bools depending on the field and the day
+Scalar = Optional[Union[str, bool, int, float]]
+
+
+class Listing(msgspec.Struct):
+    id: Scalar = None
+    userId: Scalar = None  # noqa: N815
+    title: Optional[str] = None
+    price: Scalar = None
+    type: Optional[str] = None
+    sq_feet: Scalar = None
+    availability: Optional[str] = None
+    avdate: Optional[str] = None
+    location: Optional[str] = None
+    rented: Optional[str] = None
+    smoking: Optional[str] = None
+    lease_term: Optional[str] = None
+    garage_size: Optional[str] = None
+    bedrooms: Scalar = None
+    den: Scalar = None
+    baths: Scalar = None
+    cats: Scalar = None
+    dogs: Scalar = None
+    utilities_included: Optional[Union[List[str], str]] = None
+    link: Optional[str] = None
+    latitude: Scalar = None
+    longitude: Scalar = None
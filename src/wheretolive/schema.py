@@ -0,0 +1,78 @@
+"""Declared column types for clean listings.
+
+Rather than letting pandas guess a type for every column and fixing a few up
+afterwards, each source declares the type of every column it saves. Categories are
+dictionary encoded in parquet, counts use small nullable integers and coordinates
+are float32, which keeps clean files and the frames read from them small. Checking
+every day against the same declaration also means a change on the site's end fails
+loudly when parsing instead of quietly turning up as a different schema.
+"""
+from typing import Dict
+
+import pandas as pd
+
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+# Column name to pandas dtype, in the order columns should be saved
+Schema = Dict[str, str]
+
+_NUMERIC = {"Int8", "Int16", "Int32", "Int64", "int64", "float32", "float64"}
+
+
+def _typed_column(series: pd.Series, dtype: str) -> pd.Series:
+    """Convert one column to its declared type."""
+    if dtype in _NUMERIC:
+        return pd.to_numeric(series).astype(dtype)
+    if dtype.startswith("datetime64"):
+        return pd.to_datetime(series).astype(dtype)
+    if dtype == "object":
+        # Plain python strings with None for missing, whatever pandas picked
+        return series.astype(object).where(series.notna(), None)
+    return series.astype(dtype)
+
+
+def apply_schema(
+    listings_df: pd.DataFrame, schema: Schema, source: str, drop_extra: bool = False
+) -> pd.DataFrame:
+    """Give a frame of clean listings exactly the columns and types declared.
+
+    Parameters
+    ----------
+    listings_df: pd.DataFrame
+        Clean listings
+    schema: Schema
+        Column name to dtype for every column to keep
+    source: str
+        Which source the listings are from, for error messages
+    drop_extra: bool, default False
+        Drop columns that aren't declared with a warning instead of failing, for
+        sources that pass through whatever fields the site sends
+
+    Returns
+    -------
+    pd.DataFrame
+        The listings with just the declared columns, in order, as declared types
+
+    Raises
+    ------
+    ValueError
+        If a declared column is missing, a column doesn't fit its type, or there's
+        an undeclared column and ``drop_extra`` is False
+    """
+    missing = [col for col in schema if col not in listings_df.columns]
+    if missing:
+        raise ValueError(f"{source} listings are missing columns {missing}")
+    extra = [col for col in listings_df.columns if col not in schema]
+    if extra and not drop_extra:
+        raise ValueError(f"{source} listings have undeclared columns {extra}")
+    if extra:
+        logger.warning(f"Dropping undeclared {source} columns {extra}")
+    typed = dict()
+    for col, dtype in schema.items():
+        try:
+            typed[col] = _typed_column(listings_df[col], dtype)
+        except (TypeError, ValueError) as err:
+            raise ValueError(f"{source} column {col} doesn't fit {dtype}: {err}") from err
+    return pd.DataFrame(typed, index=listings_df.index)
@@ -0,0 +1,380 @@
+"""Helpers shared by the MLS and rentfaster scrapers."""
+import datetime as dt
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+
+class RateLimiter:
+    """Thread safe limiter on how many requests per second we send.
+
+    Every worker calls ``wait`` before it sends a request. Calls are spaced out
+    evenly so that across all threads we never go above ``requests_per_second``,
+    no matter how many workers are running.
+    """
+
+    def __init__(self, requests_per_second: float = 2.0) -> None:
+        """Create a limiter.
+
+        Parameters
+        ----------
+        requests_per_second: float, default 2.0
+            The most requests to allow through in a second across all threads
+        """
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second must be positive")
+        self._interval = 1.0 / requests_per_second
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until it's this caller's turn to send a request."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ScrapeStats:
+    """Running totals of what a scraper client has sent and received."""
+
+    def __init__(self) -> None:
+        """Start all the counters at zero."""
+        self.requests = 0
+        self.failures = 0
+        self.bytes = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, n_bytes: int, latency: float, ok: bool) -> None:
+        """Add one request to the totals.
+
+        Parameters
+        ----------
+        n_bytes: int
+            Size of the response body as it came over the wire
+        latency: float
+            Seconds from sending the request to having the full response
+        ok: bool
+            Whether the request succeeded
+        """
+        with self._lock:
+            self.requests += 1
+            self.failures += not ok
+            self.bytes += n_bytes
+            self.latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def summary(self) -> str:
+        """Describe the totals in a log friendly way."""
+        mean_latency = self.latency / self.requests if self.requests else 0.0
+        return (
+            f"{self.requests:,.0f} requests ({self.failures:,.0f} failed), "
+            f"{self.bytes / 1_000_000:,.1f} MB received, "
+            f"{mean_latency:.2f}s mean / {self.max_latency:.2f}s max latency"
+        )
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """Read how long the server asked us to wait, if it did.
+
+    Parameters
+    ----------
+    response: requests.Response
+        A failed response
+
+    Returns
+    -------
+    Optional[float]
+        Seconds to wait, or None if there's no usable Retry-After header
+    """
+    header = response.headers.get("Retry-After")
+    if header is None:
+        return None
+    try:
+        return max(float(header), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=dt.timezone.utc)
+    return max((retry_at - dt.datetime.now(dt.timezone.utc)).total_seconds(), 0.0)
+
+
+def _response_bytes(response: requests.Response) -> int:
+    """Size of a response on the wire, before it was decompressed."""
+    try:
+        return int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return len(response.content)
+
+
+def _backoff_delay(
+    attempt: int,
+    base: float = 1.0,
+    cap: float = 60.0,
+    retry_after: Optional[float] = None,
+) -> float:
+    """Work out how long to sleep before trying again.
+
+    Uses exponential backoff with full jitter so concurrent workers that failed at
+    the same time don't all come back at the same time either.
+
+    Parameters
+    ----------
+    attempt: int
+        Which attempt just failed, starting from 1
+    base: float, default 1.0
+        Upper bound on the first delay in seconds
+    cap: float, default 60.0
+        Upper bound on any delay in seconds
+    retry_after: float, optional
+        What the server asked for, always waited out in full
+
+    Returns
+    -------
+    float
+        Seconds to sleep
+    """
+    ceiling = min(cap, base * 2 ** (attempt - 1))
+    delay = random.uniform(0, ceiling)  # noqa: S311
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class ScraperClient:
+    """HTTP client that reuses one keep-alive connection pool for a scraper.
+
+    Headers and cookies are set once on the session, responses can come back
+    compressed (brotli is advertised when the ``brotli`` package is installed),
+    failed requests are retried with jittered exponential backoff, and everything
+    sent is counted in ``stats``.
+    """
+
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        cookies: Optional[Dict[str, str]] = None,
+        pool_maxsize: int = 10,
+        max_attempts: int = 10,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 60.0,
+        timeout: float = 30.0,
+    ) -> None:
+        """Set up the session and its connection pool.
+
+        Parameters
+        ----------
+        headers: Dict[str, str], optional
+            Headers to send with every request
+        cookies: Dict[str, str], optional
+            Cookies to start the session with
+        pool_maxsize: int, default 10
+            Connections to keep open per host, should be at least the number of
+            threads sharing the client
+        max_attempts: int, default 10
+            How many times to try a request before giving up
+        backoff_base: float, default 1.0
+            Upper bound on the first retry delay in seconds
+        backoff_cap: float, default 60.0
+            Upper bound on any retry delay in seconds
+        timeout: float, default 30.0
+            Seconds to wait on the server before counting an attempt as failed
+        """
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers.update({"accept-encoding": ACCEPT_ENCODING})
+        if headers:
+            self._session.headers.update(headers)
+        if cookies:
+            self._session.cookies.update(cookies)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.stats = ScrapeStats()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        limiter: Optional[RateLimiter] = None,
+        max_attempts: Optional[int] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send a request, retrying until it works or we run out of attempts.
+
+        Parameters
+        ----------
+        method: str
+            HTTP method, like "GET" or "POST"
+        url: str
+            Where to send it
+        limiter: RateLimiter, optional
+            Limiter to wait on before every attempt
+        max_attempts: int, optional
+            Override the client's attempt limit for this request
+        **kwargs
+            Passed along to ``requests.Session.request``
+
+        Returns
+        -------
+        requests.Response
+            The first successful response
+
+        Raises
+        ------
+        RuntimeError
+            If every attempt failed
+        """
+        if max_attempts is None:
+            max_attempts = self.max_attempts
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(1, max_attempts + 1):
+            if limiter is not None:
+                limiter.wait()
+            start = time.perf_counter()
+            try:
+                r = self._session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as err:
+                self.stats.record(0, time.perf_counter() - start, ok=False)
+                logger.warning(f"{method} {url} errored on attempt {attempt}: {err}")
+                retry_after = None
+            else:
+                self.stats.record(
+                    _response_bytes(r), time.perf_counter() - start, ok=r.ok
+                )
+                if r.ok:
+                    return r
+                logger.warning(
+                    f"{method} {url} returned {r.status_code} on attempt {attempt}"
+                )
+                retry_after = _retry_after(r)
+            if attempt < max_attempts:
+                time.sleep(
+                    _backoff_delay(
+                        attempt, self.backoff_base, self.backoff_cap, retry_after
+                    )
+                )
+        raise RuntimeError(f"{method} {url} failed after {max_attempts} tries")
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request, see ``request``."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request, see ``request``."""
+        return self.request("POST", url, **kwargs)
+
+
+class Checkpoint:
+    """Manifest of which units of a day's scrape are done.
+
+    A unit is a price band or a page, whatever the scraper works through. Each
+    completed unit is recorded along with the file it was dumped to, so if the
+    scrape dies part way a rerun can pick up from the last completed unit instead
+    of starting over.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Load the manifest at ``path``, or start a fresh one.
+
+        Parameters
+        ----------
+        path: Path
+            Where the manifest is saved, usually in the day's scrape folder
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if path.exists():
+            with open(path, "r") as f:
+                manifest = json.load(f)
+        else:
+            manifest = {"complete": False, "units": dict()}
+        self.complete: bool = manifest["complete"]
+        self._units: Dict[str, Dict[str, Any]] = manifest["units"]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get what was recorded for a completed unit.
+
+        Units whose dump has since gone missing don't count as completed.
+
+        Parameters
+        ----------
+        key: str
+            Name of the unit
+
+        Returns
+        -------
+        Optional[Dict[str, Any]]
+            What was recorded when the unit finished, or None if it hasn't
+        """
+        with self._lock:
+            unit = self._units.get(key)
+        if unit is None:
+            return None
+        output = unit.get("output")
+        if output is not None and not (self.path.parent / output).exists():
+            return None
+        return unit
+
+    def is_done(self, key: str) -> bool:
+        """Check if a unit has been completed."""
+        return self.get(key) is not None
+
+    def mark_done(self, key: str, output: Optional[Path] = None, **extra) -> None:
+        """Record that a unit is complete and save the manifest.
+
+        Parameters
+        ----------
+        key: str
+            Name of the unit
+        output: Path, optional
+            Where the unit's results were dumped
+        **extra
+            Anything else needed to resume after this unit
+        """
+        unit: Dict[str, Any] = {"finished": dt.datetime.now().isoformat(), **extra}
+        if output is not None:
+            unit["output"] = output.name
+        with self._lock:
+            self._units[key] = unit
+            self._save()
+
+    def mark_complete(self) -> None:
+        """Record that the whole scrape is done."""
+        with self._lock:
+            self.complete = True
+            self._save()
+
+    def _save(self) -> None:
+        """Write the manifest, swapping the file in whole so it's never half written."""
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"complete": self.complete, "units": self._units}, f, indent=2)
+        tmp_path.replace(self.path)
@@ -8,3 +8,5 @@ CREATE TABLE IF NOT EXISTS public.isochrones (
   cutoff_time INT,
   geom geometry(MultiPolygon, 4326)
 );
+
+CREATE INDEX IF NOT EXISTS isochrones_geom_idx ON public.isochrones USING GIST (geom);
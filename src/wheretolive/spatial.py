@@ -0,0 +1,305 @@
+"""Location features for clean listings, worked out in python without a database.
+
+The same features the PostGIS views make, the fastest commute to each place by each
+mode, flood risk, and the nearest grocery store, computed for a whole frame of
+listings at once when it's parsed and saved along with it in ``clean.pq``:
+
+- Isochrones and flood zones go in an STRtree of prepared polygons, and every
+  listing is matched against it in one vectorized query
+- Grocery stores go in a ball tree with haversine distances, queried for every
+  listing at once
+
+These are for offline analysis of ``clean.pq`` only, ingest leaves them out and the
+database keeps working out its own in the commute tables and wide views. Those get
+recomputed when isochrones change, a day's file is only as fresh as its parse.
+
+Reference data is read from the same files the database gets loaded from, under
+``data/``, once per process. Needs ``shapely`` 2 and ``scikit-learn``, which only get
+imported the first time features are worked out, they're slow to import. Without
+them, or without a reference file, the features that need them are left out, the
+rest of parsing doesn't change.
+"""
+import json
+from functools import lru_cache
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from wheretolive.commutes import CUTOFF_TIMES
+from wheretolive.commutes import MODES
+from wheretolive.commutes import SOURCES
+from wheretolive.commutes import fastest_column
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+_DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+# Mean earth radius, ball tree haversine distances come back in radians
+_EARTH_RADIUS_M = 6_371_008.8
+
+# Count grocery stores this close, matching the grocery views
+_GROCERY_RADIUS_M = 1_000
+
+# Flood labels by how often the flood comes, the most likely one wins
+_FLOOD_RISKS = {20: "1 in 20 flood risk", 100: "1 in 100 flood risk"}
+_NO_FLOOD_RISK = "Outside flood map"
+
+_GROCERY_COLUMNS = ["grocery_store_name", "m_to_grocery", "groceries_within_1km"]
+
+
+class _PolygonIndex:
+    """STRtree of prepared polygons, each with the values it stands for.
+
+    Parameters
+    ----------
+    geometries: List[Dict]
+        GeoJSON geometries to index
+    values: pd.DataFrame
+        A row of values for each geometry, in the same order
+    """
+
+    def __init__(self, geometries: List[Dict], values: pd.DataFrame) -> None:
+        import shapely
+
+        polygons = shapely.from_geojson([json.dumps(geom) for geom in geometries])
+        # Prepared polygons answer containment without walking every vertex
+        shapely.prepare(polygons)
+        self.tree = shapely.STRtree(polygons)
+        self.values = values.reset_index(drop=True)
+
+    def matches(self, lon: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Find every polygon each point falls in.
+
+        Points on an edge count as inside, like ``ST_Intersects``.
+
+        Returns
+        -------
+        Tuple[np.ndarray, ...]
+            Position of the point and of the polygon for every match
+        """
+        import shapely
+
+        # Only bounding boxes in the tree query, a predicate there would get checked
+        # from the point's side and never use the prepared polygons
+        point_idx, polygon_idx = self.tree.query(shapely.points(lon, lat))
+        inside = shapely.intersects_xy(
+            self.tree.geometries[polygon_idx], lon[point_idx], lat[point_idx]
+        )
+        return point_idx[inside], polygon_idx[inside]
+
+
+def _read_json(path: Path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _commute_index(isochrones: List[Dict]) -> _PolygonIndex:
+    """Index isochrone entries like the ones ``scripts/make_isochrone.py`` saves."""
+    values = pd.DataFrame(
+        {
+            "place_name": [iso["place_name"] for iso in isochrones],
+            "commute_mode": [iso["mode"] for iso in isochrones],
+            "cutoff_time": [iso["cutoff_time"] for iso in isochrones],
+        }
+    )
+    return _PolygonIndex([iso["shape"] for iso in isochrones], values)
+
+
+def _flood_index(flood_maps: Dict[int, Dict]) -> _PolygonIndex:
+    """Index flood map GeoJSON by how often each flood comes."""
+    geometries = list()
+    years = list()
+    for year, flood_map in flood_maps.items():
+        for feature in flood_map["features"]:
+            geometries.append(feature["geometry"])
+            years.append(year)
+    return _PolygonIndex(geometries, pd.DataFrame({"year": years}))
+
+
+def _grocery_index(groceries: pd.DataFrame) -> Tuple:
+    """Ball tree of grocery stores and their names."""
+    from sklearn.neighbors import BallTree
+
+    coords = np.radians(groceries[["latitude", "longitude"]].to_numpy(dtype="float64"))
+    return BallTree(coords, metric="haversine"), groceries["name"].to_numpy()
+
+
+@lru_cache(maxsize=None)
+def _load_commute_index() -> Optional[_PolygonIndex]:
+    iso_file = _DATA_DIR / "isochrone" / "isochrones.json"
+    if not iso_file.exists():
+        logger.info(f"No isochrones at {iso_file}, skipping commutes")
+        return None
+    return _commute_index(_read_json(iso_file))
+
+
+@lru_cache(maxsize=None)
+def _load_flood_index() -> Optional[_PolygonIndex]:
+    flood_dir = _DATA_DIR / "calgary_open"
+    flood_files = {
+        year: flood_dir / f"calgary_flood_1_in_{year}.json" for year in _FLOOD_RISKS
+    }
+    missing = [str(path) for path in flood_files.values() if not path.exists()]
+    if missing:
+        logger.info(f"No flood maps at {missing}, skipping flood risk")
+        return None
+    return _flood_index({year: _read_json(path) for year, path in flood_files.items()})
+
+
+@lru_cache(maxsize=None)
+def _load_grocery_index() -> Optional[Tuple]:
+    grocery_file = _DATA_DIR / "foursquare" / "groceries.csv"
+    if not grocery_file.exists():
+        logger.info(f"No grocery stores at {grocery_file}, skipping groceries")
+        return None
+    return _grocery_index(pd.read_csv(grocery_file))
+
+
+def commute_features(
+    index: _PolygonIndex, lon: np.ndarray, lat: np.ndarray, places: List[str]
+) -> pd.DataFrame:
+    """Fastest commute in minutes to each place by each mode, missing if over 60.
+
+    Returns
+    -------
+    pd.DataFrame
+        A ``{place}_{mode}_fastest`` column for every place and mode, a row for
+        every point
+    """
+    point_idx, polygon_idx = index.matches(lon, lat)
+    isochrones = index.values
+    pairs = pd.MultiIndex.from_product([MODES, places])
+    # Which output column each isochrone counts towards, -1 for none of them
+    column = pairs.get_indexer(
+        pd.MultiIndex.from_frame(isochrones[["commute_mode", "place_name"]])
+    )
+    column[~isochrones["cutoff_time"].isin(CUTOFF_TIMES).to_numpy()] = -1
+    column = column[polygon_idx]
+    counted = column >= 0
+    cutoff_time = isochrones["cutoff_time"].to_numpy(dtype="float64")[polygon_idx]
+    fastest = np.full((len(pairs), len(lon)), np.inf)
+    np.minimum.at(
+        fastest, (column[counted], point_idx[counted]), cutoff_time[counted]
+    )
+    fastest[np.isinf(fastest)] = np.nan
+    return pd.DataFrame(
+        {
+            fastest_column(place, mode): pd.array(fastest[i]).astype("Int8")
+            for i, (mode, place) in enumerate(pairs)
+        }
+    )
+
+
+def flood_features(
+    index: _PolygonIndex, lon: np.ndarray, lat: np.ndarray
+) -> pd.DataFrame:
+    """Label each point with the most likely flood it's in, if any."""
+    point_idx, polygon_idx = index.matches(lon, lat)
+    years = index.values["year"].to_numpy(dtype="float64")
+    most_likely = np.full(len(lon), np.inf)
+    np.minimum.at(most_likely, point_idx, years[polygon_idx])
+    risk = pd.Series(most_likely).map(_FLOOD_RISKS).fillna(_NO_FLOOD_RISK)
+    labels = [*_FLOOD_RISKS.values(), _NO_FLOOD_RISK]
+    return pd.DataFrame({"flood_risk": pd.Categorical(risk, categories=labels)})
+
+
+def grocery_features(index: Tuple, lon: np.ndarray, lat: np.ndarray) -> pd.DataFrame:
+    """Nearest grocery store, how far it is in metres, and how many are close by."""
+    tree, names = index
+    coords = np.radians(np.column_stack([lat, lon]).astype("float64"))
+    dist, nearest = tree.query(coords, k=1)
+    n_close = tree.query_radius(
+        coords, _GROCERY_RADIUS_M / _EARTH_RADIUS_M, count_only=True
+    )
+    return pd.DataFrame(
+        {
+            "grocery_store_name": pd.Series(names[nearest[:, 0]], dtype="object"),
+            "m_to_grocery": (dist[:, 0] * _EARTH_RADIUS_M).astype("float32"),
+            "groceries_within_1km": pd.array(n_close, dtype="Int16"),
+        }
+    )
+
+
+def _feature_dtypes(source: str) -> Dict[str, Any]:
+    """Type of every column ``add_spatial_features`` can add for a source."""
+    dtypes: Dict[str, Any] = {
+        fastest_column(place, mode): "Int8"
+        for mode in MODES
+        for place in SOURCES[source]["places"]
+    }
+    dtypes["flood_risk"] = pd.CategoricalDtype([*_FLOOD_RISKS.values(), _NO_FLOOD_RISK])
+    grocery_dtypes = ["object", "float32", "Int16"]
+    dtypes.update(zip(_GROCERY_COLUMNS, grocery_dtypes))
+    return dtypes
+
+
+def feature_columns(source: str) -> List[str]:
+    """Every column ``add_spatial_features`` can add for a source."""
+    return list(_feature_dtypes(source))
+
+
+def _has_spatial_packages() -> bool:
+    """Check shapely and scikit-learn are installed without importing them."""
+    return find_spec("shapely") is not None and find_spec("sklearn") is not None
+
+
+def add_spatial_features(listings_df: pd.DataFrame, source: str) -> pd.DataFrame:
+    """Add commute, flood and grocery features to clean listings.
+
+    Parameters
+    ----------
+    listings_df: pd.DataFrame
+        Clean listings with ``longitude`` and ``latitude``
+    source: str
+        "mls" or "rfaster", for which places to work out commutes to
+
+    Returns
+    -------
+    pd.DataFrame
+        The listings with whichever features there's reference data for, missing
+        for listings without a location, or every feature missing if none of them
+        have one. See ``feature_columns``
+    """
+    if not _has_spatial_packages():
+        logger.warning("Spatial features need shapely and scikit-learn, skipping")
+        return listings_df
+    located = (
+        listings_df["longitude"].notna() & listings_df["latitude"].notna()
+    ).to_numpy()
+    if not located.any():
+        # Nothing to look up, and the ball tree won't take an empty query
+        missing = pd.DataFrame(
+            {
+                col: pd.Series(index=listings_df.index, dtype=dtype)
+                for col, dtype in _feature_dtypes(source).items()
+            }
+        )
+        return pd.concat([listings_df, missing], axis=1)
+    lon = listings_df["longitude"].to_numpy(dtype="float64")[located]
+    lat = listings_df["latitude"].to_numpy(dtype="float64")[located]
+    frames = list()
+    commute_index = _load_commute_index()
+    if commute_index is not None:
+        places = SOURCES[source]["places"]
+        frames.append(commute_features(commute_index, lon, lat, places))
+    flood_index = _load_flood_index()
+    if flood_index is not None:
+        frames.append(flood_features(flood_index, lon, lat))
+    grocery_index = _load_grocery_index()
+    if grocery_index is not None:
+        frames.append(grocery_features(grocery_index, lon, lat))
+    if not frames:
+        return listings_df
+    features = pd.concat(frames, axis=1)
+    features.index = listings_df.index[located]
+    # Listings without a location get missing features
+    features = features.reindex(listings_df.index)
+    return pd.concat([listings_df, features], axis=1)
@@ -0,0 +1,204 @@
+"""Merge a day's scrape into a listings table instead of reloading it.
+
+A day's clean listings get copied into an unlogged staging table shaped like the
+real one, then merged in with ``merge_staged``:
+
+1. Listings new to the table, relisted, or with a new price (or rented status, for
+   sources that have one) get a row in the history table
+2. Listings in the table that aren't in the scrape are marked delisted, not deleted
+3. Everything staged is upserted with ``ON CONFLICT``, but rows only get rewritten
+   when something in them actually changed
+
+So the rows written each day scale with how many listings changed, not with how
+many there are. ``changed_keys`` picks out staged listings that are new or changed
+in particular columns before the merge, for things like commutes that only need
+redoing when a listing moves. Tables and history tables are set up by
+``scripts/postgis/listing_history.sql``.
+"""
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from wheretolive.logconf import get_logger
+
+logger = get_logger(__name__)
+
+
+def _history_sql(
+    table: str, staging: str, key: str, status_column: Optional[str]
+) -> str:
+    """Record listings, relistings, price changes and status changes."""
+    history = f"{table}_history"
+    scrape_dt = f"(SELECT max(scrape_dt) FROM {staging})"
+    sql = f"""
+    INSERT INTO {history} ({key}, change_dt, change_type, old_price, new_price)
+    SELECT
+        s.{key},
+        s.scrape_dt,
+        CASE
+            WHEN t.{key} IS NULL THEN 'listed'
+            WHEN t.delisted_dt IS NOT NULL THEN 'relisted'
+            ELSE 'price'
+        END,
+        t.price,
+        s.price
+    FROM {staging} s
+    LEFT JOIN {table} t ON t.{key} = s.{key}
+    WHERE
+        t.{key} IS NULL
+        OR t.delisted_dt IS NOT NULL
+        OR t.price IS DISTINCT FROM s.price;
+
+    INSERT INTO {history} ({key}, change_dt, change_type, old_price, new_price)
+    SELECT t.{key}, {scrape_dt}, 'delisted', t.price, NULL
+    FROM {table} t
+    WHERE
+        t.delisted_dt IS NULL
+        AND NOT EXISTS (SELECT 1 FROM {staging} s WHERE s.{key} = t.{key});
+    """
+    if status_column is not None:
+        sql += f"""
+    INSERT INTO {history} ({key}, change_dt, change_type, old_price, new_price)
+    SELECT
+        s.{key},
+        s.scrape_dt,
+        CASE
+            WHEN s.{status_column} THEN '{status_column}'
+            ELSE 'not {status_column}'
+        END,
+        t.price,
+        s.price
+    FROM {staging} s
+    JOIN {table} t ON t.{key} = s.{key}
+    WHERE
+        t.delisted_dt IS NULL
+        AND t.{status_column} IS DISTINCT FROM s.{status_column};
+    """
+    return sql
+
+
+def _upsert_sql(
+    table: str,
+    staging: str,
+    key: str,
+    columns: Sequence[str],
+    keep_first: Sequence[str],
+    ignore_changes: Sequence[str],
+) -> str:
+    """Insert new listings and rewrite existing ones only if they changed."""
+    column_list = ", ".join(columns)
+    updates = [
+        f"{col} = LEAST({table}.{col}, EXCLUDED.{col})"
+        if col in keep_first
+        else f"{col} = EXCLUDED.{col}"
+        for col in columns
+        if col != key
+    ]
+    updates.append("delisted_dt = NULL")
+    compared = [
+        col for col in columns if col not in (key, *keep_first, *ignore_changes)
+    ]
+    current = ", ".join(f"{table}.{col}" for col in compared)
+    incoming = ", ".join(f"EXCLUDED.{col}" for col in compared)
+    return f"""
+    INSERT INTO {table} ({column_list})
+    SELECT {column_list} FROM {staging}
+    ON CONFLICT ({key}) DO UPDATE SET {", ".join(updates)}
+    WHERE
+        ({current}) IS DISTINCT FROM ({incoming})
+        OR {table}.delisted_dt IS NOT NULL;
+    """
+
+
+def merge_staged(
+    conn,
+    table: str,
+    key: str,
+    columns: Sequence[str],
+    keep_first: Sequence[str] = (),
+    ignore_changes: Sequence[str] = ("scrape_dt",),
+    status_column: Optional[str] = None,
+) -> Dict[str, int]:
+    """Merge the staged scrape for a table into it.
+
+    Parameters
+    ----------
+    conn: sqlalchemy.engine.Connection
+        Connection inside the same transaction the staging table was loaded in
+    table: str
+        The listings table, like "mls". The scrape has to be in ``{table}_staging``
+        and history goes into ``{table}_history``
+    key: str
+        Column that identifies a listing
+    columns: Sequence[str]
+        Every staged column to merge, including ``key``
+    keep_first: Sequence[str], default ()
+        Date columns that keep the earliest value, like a first seen date
+    ignore_changes: Sequence[str], default ("scrape_dt",)
+        Columns that get updated along with a changed row but don't count as a
+        change on their own
+    status_column: str, optional
+        Boolean column whose changes get their own history entries, like "rented"
+
+    Returns
+    -------
+    Dict[str, int]
+        How many listings were upserted and delisted
+    """
+    staging = f"{table}_staging"
+    # Scrapes can pick up the same listing twice, keep the last one copied in
+    conn.execute(
+        f"DELETE FROM {staging} a USING {staging} b "
+        f"WHERE a.{key} = b.{key} AND a.ctid < b.ctid;"
+    )
+    conn.execute(_history_sql(table, staging, key, status_column))
+    n_delisted = conn.execute(
+        f"""
+        UPDATE {table} SET delisted_dt = (SELECT max(scrape_dt) FROM {staging})
+        WHERE
+            delisted_dt IS NULL
+            AND NOT EXISTS (SELECT 1 FROM {staging} s WHERE s.{key} = {table}.{key});
+        """
+    ).rowcount
+    n_upserted = conn.execute(
+        _upsert_sql(table, staging, key, columns, keep_first, ignore_changes)
+    ).rowcount
+    logger.info(
+        f"Merged scrape into {table}: {n_upserted:,.0f} new or changed listings, "
+        f"{n_delisted:,.0f} delisted"
+    )
+    return {"upserted": n_upserted, "delisted": n_delisted}
+
+
+def changed_keys(conn, table: str, key: str, columns: Sequence[str]) -> List[str]:
+    """Find staged listings that are new to a table or differ from it in some columns.
+
+    Run it before ``merge_staged``, afterwards the table matches staging.
+
+    Parameters
+    ----------
+    conn: sqlalchemy.engine.Connection
+        Connection inside the same transaction the staging table was loaded in
+    table: str
+        The listings table, like "mls", compared against ``{table}_staging``
+    key: str
+        Column that identifies a listing
+    columns: Sequence[str]
+        Columns to compare, like ["geom"]
+
+    Returns
+    -------
+    List[str]
+        Keys of the new or changed listings, as text
+    """
+    changed = " OR ".join(f"t.{col} IS DISTINCT FROM s.{col}" for col in columns)
+    rows = conn.execute(
+        f"""
+        SELECT DISTINCT s.{key}::text
+        FROM {table}_staging s
+        LEFT JOIN {table} t ON t.{key} = s.{key}
+        WHERE t.{key} IS NULL OR {changed};
+        """
+    )
+    return [row[0] for row in rows]
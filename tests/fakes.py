@@ -0,0 +1,88 @@
+"""Made up raw listings shared by the tests."""
+import random
+
+
+def fake_mls_listing(i: int, rng: random.Random) -> dict:
+    """Make up a raw MLS listing, hitting the odd cases now and then."""
+    bedrooms = rng.choice(["3 + 1", "2 + 0", "4", "Studio", None, " 1 + 2"])
+    size = rng.choice(["1200 sqft", "850 sqft", "92.5 m2", "110 m2", None])
+    stories = rng.choice(["2", "1", "", None])
+    price_change = rng.choice([None, f"2022-01-{rng.randint(1, 28):02d} 3:04:22 PM"])
+    # .NET ticks somewhere in early 2022, avoiding leap days
+    ticks = str(637_765_000_000_000_000 + rng.randint(0, 10 ** 14))
+    return {
+        "Id": str(20_000_000 + i),
+        "MlsNumber": f"A{i:07d}",
+        "PublicRemarks": rng.choice(["Bright and spacious", "Needs love", None]),
+        "Building": {
+            "StoriesTotal": stories,
+            "Bedrooms": bedrooms,
+            "BathroomTotal": rng.choice(["1", "2", "3"]),
+            "SizeInterior": size,
+            "Type": rng.choice(["House", "Apartment", "Row / Townhouse"]),
+            "Ammenities": rng.choice([None, "Exercise Centre, Party Room"]),
+        },
+        "Property": {
+            "PriceUnformattedValue": str(rng.randint(100, 2_000) * 1_000),
+            "Type": rng.choice(["Single Family"] * 9 + ["Vacant Land"]),
+            "Address": {
+                "AddressText": f"{i} Some Street SW|Calgary, Alberta T2T0A1",
+                "Longitude": f"{-114 - rng.random():.6f}",
+                "Latitude": f"{51 + rng.random():.6f}",
+            },
+            "OwnershipType": rng.choice(["Freehold", "Condominium/Strata"]),
+            "ParkingType": rng.choice(["Garage", None]),
+            "ParkingSpaceTotal": rng.choice(["1", "2", None]),
+        },
+        "Land": {"SizeTotal": rng.choice(["0.10 ac", None])},
+        "PostalCode": "T2T0A1",
+        "RelativeDetailsURL": rng.choice([f"/real-estate/{i}", None]),
+        "PriceChangeDateUTC": price_change,
+        "InsertedDateUTC": rng.choice([ticks, None]),
+    }
+
+
+def fake_rfaster_listing(i: int, rng: random.Random, utilities_as_list: bool) -> dict:
+    """Make up a raw rentfaster listing, hitting the odd cases now and then."""
+    utilities = rng.choice(
+        [
+            ["Heat", "Water"],
+            ["Electricity", "Internet", "Cable"],
+            ["See Full Description"],
+            [],
+            None,
+        ]
+    )
+    if utilities is not None and not utilities_as_list:
+        utilities = ", ".join(utilities)
+    ref_id = 500_000 + i
+    link = rng.choice([f"/ab/calgary/apartment/{ref_id}", f"/x/{ref_id}_{i % 3}"])
+    return {
+        "ref_id": str(ref_id),
+        "userId": rng.randint(1, 1_000),
+        "id": ref_id,
+        "title": f"{i} Some Street SW",
+        "price": str(rng.randint(8, 40) * 100),
+        "type": rng.choice(["Apartment", "House", "Parking Spot", "Basement"]),
+        "sq_feet": rng.choice(
+            ["750", "about 800 sq ft", "0", "", "750 - 900", "650 plus 200", None]
+        ),
+        "availability": rng.choice(
+            ["Immediate", "Negotiable", "March 1", "February 29", "December 25", None]
+        ),
+        "avdate": rng.choice(["Immediate", "No Vacancy", "March 1"]),
+        "location": "Beltline",
+        "rented": rng.choice(["Not-Rented", "Rented"]),
+        "bedrooms": rng.choice(["1", "2 + Den", "bachelor", "none", "3"]),
+        "den": rng.choice(["Yes", "No", "", None]),
+        "baths": rng.choice(["1", "1.5", "none"]),
+        "smoking": rng.choice(["Non-Smoking", "Smoke Free Building"]),
+        "lease_term": rng.choice(["Long Term", "Negotiable"]),
+        "garage_size": rng.choice(["Single Garage", "No Garage"]),
+        "cats": rng.choice([0, 1]),
+        "dogs": rng.choice([0, 1]),
+        "utilities_included": utilities,
+        "link": link,
+        "latitude": 51 + rng.random(),
+        "longitude": -114 - rng.random(),
+    }
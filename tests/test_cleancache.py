@@ -0,0 +1,48 @@
+"""Test cleaning through the cache gives the same listings as cleaning directly."""
+import datetime as dt
+import random
+from pathlib import Path
+
+import pandas as pd
+
+from tests.fakes import fake_mls_listing
+from wheretolive.cleancache import CleanCache
+from wheretolive.cleancache import clean_cached
+from wheretolive.mls.clean import clean_listings
+from wheretolive.mls.clean import clean_with_positions
+from wheretolive.mls.parse import _type_listings
+from wheretolive.rawstore import listing_hash
+
+
+def _hashed(raw: list) -> list:
+    return [(listing_hash(listing), lambda listing=listing: listing) for listing in raw]
+
+
+def test_cached_matches_uncached(tmp_path: Path) -> None:
+    """A cold cache, a warm one and no cache all give the same frame."""
+    rng = random.Random(0)
+    raw = [fake_mls_listing(i, rng) for i in range(300)]
+    date = dt.date(2022, 2, 6)
+    expected = _type_listings(clean_listings(raw), date)
+    with CleanCache(tmp_path / "cache.sqlite", "1") as cache:
+        cold = clean_cached(_hashed(raw), clean_with_positions, cache, date)
+        # Next day, a few listings changed and a few are new
+        raw[0]["Property"]["PriceUnformattedValue"] = "1"
+        raw += [fake_mls_listing(i, rng) for i in range(300, 310)]
+        next_day = date + dt.timedelta(days=1)
+        warm = clean_cached(_hashed(raw), clean_with_positions, cache, next_day)
+    pd.testing.assert_frame_equal(_type_listings(cold, date), expected)
+    pd.testing.assert_frame_equal(
+        _type_listings(warm, next_day), _type_listings(clean_listings(raw), next_day)
+    )
+
+
+def test_evict(tmp_path: Path) -> None:
+    """Entries go once they're stale or past the size bound."""
+    with CleanCache(tmp_path / "cache.sqlite", "1", max_entries=2) as cache:
+        cache.put_many({"a": {"x": 1}}, dt.date(2022, 1, 1))
+        cache.put_many({"b": {"x": 2}, "c": None, "d": {"x": 3}}, dt.date(2022, 2, 1))
+        assert cache.evict(today=dt.date(2022, 2, 5)) == 2
+        left = cache.get_many(["a", "b", "c", "d"], dt.date(2022, 2, 5))
+    assert len(left) == 2
+    assert "a" not in left
@@ -0,0 +1,52 @@
+"""Test the dataset metadata copes with days written under an older schema."""
+import datetime as dt
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from wheretolive import dataset
+from wheretolive.schema import apply_schema
+
+SCHEMA = {"listing_id": "int64", "bedrooms": "Int8", "price": "float64"}
+OLD_DAY = dt.date(2022, 2, 5)
+NEW_DAY = dt.date(2022, 2, 6)
+
+
+@pytest.fixture
+def dataset_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """One day written before bedrooms were declared small integers, one after."""
+    monkeypatch.setattr(dataset, "_find_dataset_dir", lambda source: tmp_path)
+    old = pd.DataFrame({"listing_id": [1, 2], "bedrooms": [3, 2], "price": [1.0, 2.0]})
+    dataset.write_partition("test", OLD_DAY, old)
+    new = apply_schema(
+        pd.DataFrame({"listing_id": [3], "bedrooms": [None], "price": [3.0]}),
+        SCHEMA,
+        "test",
+    )
+    dataset.write_partition("test", NEW_DAY, new)
+    return tmp_path
+
+
+def test_stale_day_rewritten(dataset_dir: Path) -> None:
+    """Days under an old schema get rewritten and stay in the dataset."""
+    dataset.refresh_metadata(
+        "test", conform=lambda df: apply_schema(df, SCHEMA, "test"), sort_by="price"
+    )
+    result = dataset.read_dataset("test")
+    assert sorted(result["listing_id"]) == [1, 2, 3]
+    assert str(result["bedrooms"].dtype) == "Int8"
+
+
+def test_stale_day_skipped(dataset_dir: Path) -> None:
+    """Days that can't be brought up to date are left out instead of failing."""
+
+    def cant_conform(listings_df: pd.DataFrame) -> pd.DataFrame:
+        raise ValueError("Missing columns")
+
+    assert dataset.refresh_metadata("test", conform=cant_conform) is not None
+    result = dataset.read_dataset("test")
+    assert result["listing_id"].tolist() == [3]
+    # Without a way to conform them the same goes
+    dataset.refresh_metadata("test")
+    assert dataset.read_dataset("test")["listing_id"].tolist() == [3]
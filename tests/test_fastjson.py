@@ -0,0 +1,79 @@
+"""Test decoding raw listings into structs cleans the same as plain dicts."""
+import random
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from tests.fakes import fake_mls_listing
+from tests.fakes import fake_rfaster_listing
+from wheretolive.fastjson import dumps
+from wheretolive.fastjson import listing_decoder
+from wheretolive.fastjson import loads
+from wheretolive.mls import clean as mls_clean
+from wheretolive.mls import parse as mls_parse
+from wheretolive.rawdump import iter_dump
+from wheretolive.rawdump import write_dump
+from wheretolive.rfaster import clean as rfaster_clean
+from wheretolive.rfaster import parse as rfaster_parse
+
+pytest.importorskip("msgspec")
+
+SOURCES = {
+    "mls": (mls_clean, mls_parse, fake_mls_listing),
+    "rfaster": (
+        rfaster_clean,
+        rfaster_parse,
+        lambda i, rng: fake_rfaster_listing(i, rng, i % 2 == 0),
+    ),
+}
+
+
+def test_round_trip() -> None:
+    """Plain encoding and decoding don't change anything."""
+    listing = {"Id": "1", "PublicRemarks": "Unicode é", "n": [1, 2.5, None, True]}
+    assert loads(dumps(listing)) == listing
+
+
+@pytest.mark.parametrize("codec", ["lzma", "gzip"])
+@pytest.mark.parametrize("source", list(SOURCES))
+def test_structs_match_dicts(tmp_path: Path, source: str, codec: str) -> None:
+    """Listings decoded into structs clean to exactly the same typed frame."""
+    clean, parse, fake = SOURCES[source]
+    rng = random.Random(0)
+    raw = [fake(i, rng) for i in range(300)]
+    # Fields cleaning never looks at get skipped when decoding into structs
+    for listing in raw:
+        listing["Photos"] = [{"HighResPath": "https://example.com/1.jpg"}] * 3
+    path = write_dump(tmp_path, "page", raw, codec)
+    decoder = listing_decoder(source)
+    assert decoder.is_typed
+    structs = list(iter_dump(path, decoder))
+    assert not isinstance(structs[0], dict)
+    date = pd.Timestamp("2022-02-06").date()
+    expected = parse._type_listings(clean.clean_listings(iter(raw)), date)
+    result = parse._type_listings(clean.clean_listings(iter(structs)), date)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+# Where a number could come through as a boolean instead
+BOOLEAN_FIELDS = {
+    "mls": lambda listing, flag: listing["Property"].update(ParkingSpaceTotal=flag),
+    "rfaster": lambda listing, flag: listing.update(cats=flag, den=not flag),
+}
+
+
+@pytest.mark.parametrize("source", list(SOURCES))
+def test_boolean_fields(source: str) -> None:
+    """Booleans in number fields decode into structs and clean the same as dicts."""
+    clean, parse, fake = SOURCES[source]
+    rng = random.Random(1)
+    raw = [fake(i, rng) for i in range(50)]
+    for i, listing in enumerate(raw):
+        BOOLEAN_FIELDS[source](listing, i % 2 == 0)
+    decoder = listing_decoder(source)
+    structs = [decoder.decode(dumps(listing)) for listing in raw]
+    date = pd.Timestamp("2022-02-06").date()
+    expected = parse._type_listings(clean.clean_listings(iter(raw)), date)
+    result = parse._type_listings(clean.clean_listings(iter(structs)), date)
+    pd.testing.assert_frame_equal(result, expected)
@@ -0,0 +1,84 @@
+"""Test the cached bounding box lookups without geocoding anything for real."""
+import datetime as dt
+import json
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from wheretolive import geobounds
+from wheretolive.geobounds import Bounds
+from wheretolive.geobounds import get_bounds
+
+QUERY = "Calgary, Canada"
+CACHED = Bounds(west=-114.3, east=-113.9, south=50.8, north=51.2, lat=51.0, lng=-114.1)
+FRESH = Bounds(west=-114.4, east=-113.8, south=50.8, north=51.2, lat=51.0, lng=-114.1)
+
+
+@pytest.fixture
+def cache_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Keep the cache in a temporary folder and start with nothing in memory."""
+    cache_file = tmp_path / "cache" / "geobounds.json"
+    monkeypatch.setattr(geobounds, "_get_cache_file", lambda: cache_file)
+    monkeypatch.setattr(geobounds, "_MEMORY", dict())
+    return cache_file
+
+
+@pytest.fixture
+def lookups(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """Geocode everything to ``FRESH``, recording every lookup."""
+    lookups = list()
+
+    def _geocode(query: str) -> Bounds:
+        lookups.append(query)
+        return FRESH
+
+    monkeypatch.setattr(geobounds, "_geocode", _geocode)
+    return lookups
+
+
+def _cache_entry(cache_file: Path, age: dt.timedelta) -> None:
+    fetched = dt.datetime.now() - age
+    cache = {QUERY: {"fetched": fetched.isoformat(), "bounds": CACHED._asdict()}}
+    cache_file.parent.mkdir(exist_ok=True, parents=True)
+    cache_file.write_text(json.dumps(cache))
+
+
+def test_fresh_entry(cache_file: Path, lookups: List[str]) -> None:
+    """Entries younger than the TTL are used without a lookup."""
+    _cache_entry(cache_file, dt.timedelta(days=29))
+    assert get_bounds(QUERY) == CACHED
+    assert lookups == []
+
+
+def test_expired_entry(cache_file: Path, lookups: List[str]) -> None:
+    """Entries past the TTL get looked up again and saved, once per process."""
+    _cache_entry(cache_file, dt.timedelta(days=31))
+    assert get_bounds(QUERY) == FRESH
+    assert get_bounds(QUERY) == FRESH
+    assert lookups == [QUERY]
+    entry = json.loads(cache_file.read_text())[QUERY]
+    assert Bounds(**entry["bounds"]) == FRESH
+    fetched = dt.datetime.fromisoformat(entry["fetched"])
+    assert dt.datetime.now() - fetched < dt.timedelta(minutes=1)
+    # A shorter TTL makes even a day old entry stale
+    geobounds._MEMORY.clear()
+    _cache_entry(cache_file, dt.timedelta(days=1))
+    assert get_bounds(QUERY, ttl=dt.timedelta(hours=1)) == FRESH
+    assert lookups == [QUERY, QUERY]
+
+
+def test_stale_fallback(cache_file: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """A failed lookup falls back to a stale entry and leaves it as it was."""
+    _cache_entry(cache_file, dt.timedelta(days=90))
+    before = cache_file.read_text()
+
+    def _offline(query: str) -> Bounds:
+        raise RuntimeError("Couldn't geocode")
+
+    monkeypatch.setattr(geobounds, "_geocode", _offline)
+    assert get_bounds(QUERY) == CACHED
+    assert cache_file.read_text() == before
+    # Without anything to fall back to the error comes through
+    with pytest.raises(RuntimeError):
+        get_bounds("Edmonton, Canada")
@@ -0,0 +1,22 @@
+"""Test the vectorized MLS cleaner matches the row by row one."""
+import random
+
+import pandas as pd
+import pytest
+
+from tests.fakes import fake_mls_listing
+from wheretolive.mls.clean import clean_listings
+from wheretolive.mls.parse import _clean_rowwise
+from wheretolive.mls.parse import _type_listings
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_rowwise(seed: int) -> None:
+    """Both cleaners give exactly the same frame once typed."""
+    rng = random.Random(seed)
+    raw = [fake_mls_listing(i, rng) for i in range(500)]
+    raw += raw[:20]  # Scrapes overlap, so duplicates need dropping the same way
+    date = pd.Timestamp("2022-02-06").date()
+    expected = _type_listings(_clean_rowwise(raw), date)
+    result = _type_listings(clean_listings(iter(raw)), date)
+    pd.testing.assert_frame_equal(result, expected)
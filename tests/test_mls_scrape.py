@@ -0,0 +1,191 @@
+"""Test the MLS scraper's price bands and delta scrapes against a made up site."""
+import datetime as dt
+from pathlib import Path
+from typing import List
+from typing import Optional
+
+import pytest
+
+from wheretolive.mls import common
+from wheretolive.mls import parse
+from wheretolive.mls import scrape
+from wheretolive.rawdump import read_dump
+from wheretolive.rawdump import write_dump
+from wheretolive.scraping import RateLimiter
+
+# Listings bunched up at the low end, with a pile all at one price
+PRICES = [100_000 + 5_000 * i for i in range(40)] + [2_500_000] * 7 + [9_000_000]
+
+
+def _listing(i: int, price: int) -> dict:
+    return {"Id": str(i), "Property": {"PriceUnformattedValue": str(price)}}
+
+
+@pytest.fixture
+def mls_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Save scrapes under a temporary folder instead of ``data/``."""
+    for module in (common, parse, scrape):
+        monkeypatch.setattr(module, "_find_base_dir", lambda: tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def site(monkeypatch: pytest.MonkeyPatch) -> List[tuple]:
+    """Answer band requests from ``PRICES``, recording every one."""
+    listings = [_listing(i, price) for i, price in enumerate(PRICES)]
+    requests = list()
+
+    def _page(
+        max_results: int = 100,
+        price_min: int = 0,
+        price_max: int = 10_000_000,
+        limiter: Optional[RateLimiter] = None,
+        **kwargs,
+    ) -> list:
+        requests.append((price_min, price_max))
+        matches = [
+            listing
+            for listing in listings
+            if price_min
+            <= float(listing["Property"]["PriceUnformattedValue"])
+            <= price_max
+        ]
+        return matches[:max_results]
+
+    monkeypatch.setattr(scrape, "_mls_scrape_page", _page)
+    return requests
+
+
+def test_price_bands() -> None:
+    """Bands cover the whole range edge to edge, narrow at the bottom."""
+    bands = scrape._price_bands(0, 10_000_000, 16)
+    assert len(bands) == 16
+    assert bands[0][0] == 0 and bands[-1][1] == 10_000_000
+    assert all(a[1] == b[0] for a, b in zip(bands, bands[1:]))
+    widths = [hi - lo for lo, hi in bands]
+    assert widths == sorted(widths)
+    assert widths[0] == round(10_000_000 / 16 ** 2)
+
+
+def test_price_bands_small_range() -> None:
+    """Too many bands for the range collapse instead of repeating an edge."""
+    assert scrape._price_bands(0, 4, 16) == [(0, 1), (1, 2), (2, 3), (3, 4)]
+
+
+def _scrape_bands(bands: list, max_results: int) -> list:
+    """Work through bands and their sub bands like the concurrent scrape does."""
+    limiter = RateLimiter(1_000)
+    checkpoint = scrape._checkpoint()
+    dumps = list()
+    while bands:
+        lo, hi = bands.pop(0)
+        dump, sub_bands = scrape._scrape_band(lo, hi, limiter, max_results, checkpoint)
+        if dump is not None:
+            dumps.append(dump)
+        bands.extend(sub_bands)
+    return dumps
+
+
+def test_scrape_band_splits(mls_dir: Path, site: List[tuple]) -> None:
+    """Full bands get split in half until every listing is in some dump."""
+    dumps = _scrape_bands([(0, 10_000_000)], max_results=10)
+    # The top band was full, then each half of the bottom one and so on
+    assert site[:3] == [(0, 10_000_000), (0, 5_000_000), (5_000_000, 10_000_000)]
+    dumped = [listing for dump in dumps for listing in read_dump(dump)]
+    # Neighbouring bands share an edge, so a few come through twice
+    assert {int(listing["Id"]) for listing in dumped} == set(range(len(PRICES)))
+    # Nothing got cut off at the page size
+    assert all(len(read_dump(dump)) < 10 for dump in dumps)
+
+
+def test_scrape_band_unsplittable(mls_dir: Path, site: List[tuple]) -> None:
+    """A full band a dollar wide gets dumped as is, there's nowhere to split it."""
+    checkpoint = scrape._checkpoint()
+    dump, sub_bands = scrape._scrape_band(
+        2_499_999, 2_500_000, RateLimiter(1_000), 5, checkpoint
+    )
+    assert sub_bands == []
+    assert len(read_dump(dump)) == 5
+
+
+def test_scrape_band_checkpoint(mls_dir: Path, site: List[tuple]) -> None:
+    """Bands that are done come back from the checkpoint without a request."""
+    first = _scrape_bands([(0, 10_000_000)], max_results=10)
+    n_requests = len(site)
+    again = _scrape_bands([(0, 10_000_000)], max_results=10)
+    assert again == first
+    assert len(site) == n_requests
+    # Empty bands finish without a dump
+    checkpoint = scrape._checkpoint()
+    assert scrape._scrape_band(
+        9_500_000, 9_600_000, RateLimiter(1_000), 10, checkpoint
+    ) == (None, [])
+
+
+def test_concurrent_rerun(mls_dir: Path, site: List[tuple]) -> None:
+    """Running again once the day's finished doesn't scrape it a second time."""
+    dumps = scrape.scrape_all_concurrent(n_bands=4, max_workers=2, max_results=10)
+    assert dumps
+    n_requests = len(site)
+    listings = parse._full_day_listings()
+    assert scrape.scrape_all_concurrent(n_bands=4, max_workers=2) == []
+    assert len(site) == n_requests
+    assert parse._full_day_listings() == listings
+
+
+def _dated_listing(i: int, price: int, inserted: int, price_change=None) -> dict:
+    listing = _listing(i, price)
+    listing["InsertedDateUTC"] = str(inserted)
+    listing["PriceChangeDateUTC"] = price_change
+    return listing
+
+
+def test_scrape_state(tmp_path: Path) -> None:
+    """New and re-priced listings count as changed, and that survives a save."""
+    state = scrape._ScrapeState(dt.date(2022, 2, 5))
+    state.update(
+        [
+            _dated_listing(1, 100, 1_000, "2022-01-05 3:04:22 PM"),
+            _dated_listing(2, 200, 2_000),
+        ]
+    )
+    state.save(tmp_path / "state.json")
+    loaded = scrape._ScrapeState.load(tmp_path / "state.json")
+    for known in (state, loaded):
+        assert not known.is_changed(_dated_listing(1, 100, 1_000))
+        assert not known.is_changed(
+            _dated_listing(2, 200, 2_000, "2022-01-05 3:04:22 PM")
+        )
+        assert known.is_changed(_dated_listing(3, 300, 1_500))
+        assert known.is_changed(_dated_listing(2, 150, 2_000, "2022-01-06 9:00:00 AM"))
+    assert loaded.full_scrape_date == dt.date(2022, 2, 5)
+    assert loaded.ids == {"1", "2"}
+
+
+def test_scrape_delta(mls_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Today is yesterday's listings with whatever's new or re-priced on top."""
+    today = dt.date.today()
+    yesterday = today - dt.timedelta(days=1)
+    previous = [_dated_listing(i, 100_000 * i, 1_000 * i) for i in range(1, 6)]
+    write_dump(mls_dir / f"{yesterday:%Y-%m-%d}", "mls_x_maxprice_00500000", previous)
+    repriced = _dated_listing(2, 150_000, 2_000, "2022-01-20 1:00:00 PM")
+    new = _dated_listing(6, 50_000, 6_000)
+    # Newest first, the second page has nothing that wasn't known already
+    pages = [[new, repriced, previous[4]], previous[3:0:-1]]
+    requested = list()
+
+    def _page(max_results: int = 100, current_page: int = 1, **kwargs) -> list:
+        requested.append(current_page)
+        return pages[current_page - 1][:max_results]
+
+    monkeypatch.setattr(scrape, "_mls_scrape_page", _page)
+    monkeypatch.setattr(scrape.time, "sleep", lambda seconds: None)
+    assert scrape.scrape_delta(max_results=3) is not None
+    assert requested == [1, 2]
+    merged = parse._full_day_listings(today)
+    assert [listing["Id"] for listing in merged] == ["6", "1", "2", "3", "4", "5"]
+    assert merged[2] == repriced
+    state = scrape._ScrapeState.load(scrape._state_file(today))
+    assert state.full_scrape_date == yesterday
+    assert state.ids == {str(i) for i in range(1, 7)}
+    assert state.max_inserted == 6_000
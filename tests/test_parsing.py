@@ -0,0 +1,37 @@
+"""Test parsing many days carries on past a day that fails."""
+import datetime as dt
+from typing import List
+
+import pytest
+
+from wheretolive.parsing import parse_days
+
+BAD_DAY = dt.date(2022, 2, 7)
+DAYS = [dt.date(2022, 2, 8), BAD_DAY, dt.date(2022, 2, 6)]
+
+
+def _parse_day(date: dt.date, force_overwrite: bool) -> dt.date:
+    """Stand in day parser that fails on one day, module level so it pickles."""
+    if date == BAD_DAY:
+        raise ValueError(f"Can't parse {date}")
+    return date
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_failed_day_returned(max_workers: int) -> None:
+    """The failing day's error comes back and every other day still gets parsed."""
+    errors = parse_days(_parse_day, DAYS, max_workers=max_workers)
+    assert list(errors) == [BAD_DAY]
+    assert isinstance(errors[BAD_DAY], ValueError)
+
+
+def test_every_day_parsed_in_order() -> None:
+    """Days get parsed oldest first, with nothing returned when they all work."""
+    parsed: List[dt.date] = list()
+
+    def parse(date: dt.date, force_overwrite: bool) -> None:
+        parsed.append(date)
+
+    good_days = [day for day in DAYS if day != BAD_DAY]
+    assert parse_days(parse, good_days, force_overwrite=True) == dict()
+    assert parsed == sorted(good_days)
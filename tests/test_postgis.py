@@ -0,0 +1,70 @@
+"""Test the geometry encodings that go through COPY and the shared engines."""
+import os
+import struct
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import sqlalchemy
+
+from wheretolive.postgis import _ENGINES
+from wheretolive.postgis import _shared_engine
+from wheretolive.postgis import geojson_ewkt
+from wheretolive.postgis import point_ewkb
+
+
+def test_point_ewkb() -> None:
+    """Points come out as standard little endian EWKB, missing coordinates as None."""
+    longitude = pd.Series([-114.07, None, -114.2], dtype="float32")
+    latitude = pd.Series([51.05, 51.0, None])
+    ewkb = point_ewkb(longitude, latitude)
+    assert ewkb[0].startswith("0101000020E6100000")
+    order, kind, srid, x, y = struct.unpack("<BIIdd", bytes.fromhex(ewkb[0]))
+    assert (order, kind, srid) == (1, 0x20000001, 4326)
+    assert (x, y) == (float(longitude[0]), 51.05)
+    assert ewkb[1] is None and ewkb[2] is None
+
+
+def test_geojson_ewkt() -> None:
+    """GeoJSON shapes come out as the EWKT PostGIS would read them from."""
+    square = [[[0, 0], [1, 0], [1, 1], [0, 0]]]
+    assert geojson_ewkt({"type": "Point", "coordinates": [-114.1, 51]}) == (
+        "SRID=4326;POINT (-114.1 51.0)"
+    )
+    assert geojson_ewkt({"type": "MultiPolygon", "coordinates": [square]}) == (
+        "SRID=4326;MULTIPOLYGON (((0.0 0.0, 1.0 0.0, 1.0 1.0, 0.0 0.0)))"
+    )
+    collection = {
+        "type": "GeometryCollection",
+        "geometries": [{"type": "Polygon", "coordinates": square}],
+    }
+    assert geojson_ewkt(collection, srid=3400) == (
+        "SRID=3400;GEOMETRYCOLLECTION (POLYGON ((0.0 0.0, 1.0 0.0, 1.0 1.0, 0.0 0.0)))"
+    )
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_fork_leaves_parent_connections(tmp_path: Path) -> None:
+    """A forked child gets fresh pools and never closes its parent's connections."""
+    url = sqlalchemy.engine.URL.create("sqlite", database=str(tmp_path / "fork.db"))
+    engine = _shared_engine(url)
+    with engine.connect() as conn:
+        conn.execute(sqlalchemy.text("SELECT 1"))
+        raw = conn.connection.dbapi_connection
+    # Back in the pool, where a plain dispose in the child would close it
+    assert engine.pool.checkedin() == 1
+    pid = os.fork()
+    if pid == 0:
+        ok = (
+            url not in _ENGINES
+            and engine.pool.checkedin() == 0
+            and raw.execute("SELECT 1").fetchone() == (1,)
+            and _shared_engine(url) is not engine
+        )
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert raw.execute("SELECT 1").fetchone() == (1,)
+    assert _shared_engine(url) is engine
+    engine.dispose()
+    _ENGINES.pop(url)
@@ -0,0 +1,51 @@
+"""Test reading and writing raw scrape dumps."""
+from pathlib import Path
+
+import pytest
+
+from wheretolive import rawdump
+from wheretolive.rawdump import available_codecs
+from wheretolive.rawdump import find_dumps
+from wheretolive.rawdump import iter_dump
+from wheretolive.rawdump import iter_dumps
+from wheretolive.rawdump import read_dump
+from wheretolive.rawdump import write_dump
+
+LISTINGS = [
+    {"Id": "1", "Property": {"PriceUnformattedValue": "350000"}},
+    {"Id": "2", "PublicRemarks": "Unicode é and a\nnewline"},
+]
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+def test_round_trip(tmp_path: Path, codec: str) -> None:
+    """Whatever was written can be read back without knowing the codec."""
+    path = write_dump(tmp_path, "mls_2022-02-06_maxprice_00350000", LISTINGS, codec)
+    assert read_dump(path) == LISTINGS
+    assert find_dumps(tmp_path, "mls_*_maxprice_*") == [path]
+
+
+def test_empty_page(tmp_path: Path) -> None:
+    """The last rentfaster page is always empty, that has to survive too."""
+    path = write_dump(tmp_path, "rfaster_2022-02-06_page_9", [])
+    assert read_dump(path) == []
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+def test_stream(tmp_path: Path, codec: str, monkeypatch) -> None:
+    """Streaming gives the same listings, even when they're split across chunks."""
+    monkeypatch.setattr(rawdump, "_CHUNK_SIZE", 7)
+    listings = LISTINGS + [{"Id": str(i), "n": 10 ** i} for i in range(20)]
+    path = write_dump(tmp_path, "page", listings, codec)
+    assert list(iter_dump(path)) == listings
+
+
+def test_stream_many(tmp_path: Path) -> None:
+    """Dumps decoded on threads still come back in the order they were given."""
+    pages = [[{"Id": f"{page}_{i}"} for i in range(50)] for page in range(10)]
+    paths = [
+        write_dump(tmp_path, f"page_{page}", listings, "lzma")
+        for page, listings in enumerate(pages)
+    ]
+    expected = [listing for listings in pages for listing in listings]
+    assert list(iter_dumps(paths, max_workers=3, max_queued=5)) == expected
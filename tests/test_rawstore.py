@@ -0,0 +1,87 @@
+"""Test the deduplicated raw store and moving a day's dumps into it."""
+import shutil
+from pathlib import Path
+
+from wheretolive.rawdump import write_dump
+from wheretolive.rawstore import compact_dumps
+from wheretolive.rawstore import iter_day_hashes
+from wheretolive.rawstore import load_day
+from wheretolive.rawstore import listing_hash
+from wheretolive.rawstore import load_listing
+from wheretolive.rawstore import store_day
+from wheretolive.rawstore import unstored_dumps
+
+DAY_ONE = [{"Id": str(i), "Price": i * 1_000} for i in range(50)]
+# Most listings are the same the next day, one changed and one is new
+DAY_TWO = DAY_ONE[1:] + [{"Id": "0", "Price": 1}, {"Id": "50", "Price": 50_000}]
+
+
+def _store_files(store_dir: Path) -> list:
+    return sorted(path.name for path in store_dir.rglob("*") if path.is_file())
+
+
+def test_store_round_trip(tmp_path: Path) -> None:
+    """Days read back the same, sharing the listings that didn't change."""
+    store_dir = tmp_path / "store"
+    day_one = tmp_path / "2022-02-06"
+    day_two = tmp_path / "2022-02-07"
+    store_day(store_dir, day_one, DAY_ONE, "Id")
+    packed = (store_dir / "packs" / "2022-02-06.pack").stat().st_size
+    store_day(store_dir, day_two, DAY_TWO, "Id")
+    assert load_day(store_dir, day_one) == DAY_ONE
+    assert load_day(store_dir, day_two) == DAY_TWO
+    assert list(iter_day_hashes(day_two)) == [listing_hash(x) for x in DAY_TWO]
+    assert load_listing(store_dir, listing_hash(DAY_TWO[-1])) == DAY_TWO[-1]
+    # A pack for each day and the index, only the two new listings stored again
+    files = ["2022-02-06.pack", "2022-02-07.pack", "index.tsv"]
+    assert _store_files(store_dir) == files
+    index = (store_dir / "packs" / "index.tsv").read_text().splitlines()
+    assert len(index) == len(DAY_ONE) + 2
+    assert (store_dir / "packs" / "2022-02-07.pack").stat().st_size < packed / 10
+
+
+def test_torn_index_line(tmp_path: Path) -> None:
+    """Half an index line from a crash doesn't stop the store working."""
+    store_dir = tmp_path / "store"
+    store_day(store_dir, tmp_path / "2022-02-06", DAY_ONE, "Id")
+    with open(store_dir / "packs" / "index.tsv", "a") as f:
+        f.write("abc\t2022-02")
+    store_day(store_dir, tmp_path / "2022-02-07", DAY_TWO, "Id")
+    assert load_day(store_dir, tmp_path / "2022-02-07") == DAY_TWO
+
+
+def test_compact_round_trip(tmp_path: Path) -> None:
+    """Dumps are moved into the store and still read back as the same day."""
+    store_dir = tmp_path / "store"
+    day_dir = tmp_path / "2022-02-06"
+    dumps = [
+        write_dump(day_dir, f"page_{page}", DAY_ONE[page * 10 : (page + 1) * 10])
+        for page in range(5)
+    ]
+    compact_dumps(store_dir, day_dir, dumps, "Id")
+    assert not any(dump.exists() for dump in dumps)
+    assert load_day(store_dir, day_dir) == DAY_ONE
+    # More pages later in the day get added to the end
+    later = write_dump(day_dir, "page_5", DAY_TWO[-2:])
+    compact_dumps(store_dir, day_dir, [later], "Id")
+    assert load_day(store_dir, day_dir) == DAY_ONE + DAY_TWO[-2:]
+
+
+def test_compact_after_crash(tmp_path: Path) -> None:
+    """Dumps left behind after their manifest was saved aren't stored twice."""
+    store_dir = tmp_path / "store"
+    day_dir = tmp_path / "2022-02-06"
+    dumps = [
+        write_dump(day_dir, f"page_{page}", DAY_ONE[page * 25 : (page + 1) * 25])
+        for page in range(2)
+    ]
+    backup = tmp_path / "backup"
+    shutil.copytree(day_dir, backup)
+    compact_dumps(store_dir, day_dir, dumps, "Id")
+    # As if it crashed before the second dump got deleted
+    shutil.copy(backup / dumps[1].name, dumps[1])
+    # Readers don't see its listings twice either
+    assert unstored_dumps(day_dir, [dumps[1]]) == []
+    compact_dumps(store_dir, day_dir, [dumps[1]], "Id")
+    assert not dumps[1].exists()
+    assert load_day(store_dir, day_dir) == DAY_ONE
@@ -0,0 +1,22 @@
+"""Test the vectorized rentfaster cleaner matches the row by row one."""
+import random
+
+import pandas as pd
+import pytest
+
+from tests.fakes import fake_rfaster_listing
+from wheretolive.rfaster.clean import clean_listings
+from wheretolive.rfaster.parse import _clean_rowwise
+from wheretolive.rfaster.parse import _type_listings
+
+
+@pytest.mark.parametrize("utilities_as_list", [True, False])
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_rowwise(seed: int, utilities_as_list: bool) -> None:
+    """Both cleaners give exactly the same frame once typed."""
+    rng = random.Random(seed)
+    raw = [fake_rfaster_listing(i, rng, utilities_as_list) for i in range(500)]
+    date = pd.Timestamp("2022-02-06").date()
+    expected = _type_listings(_clean_rowwise(raw), date)
+    result = _type_listings(clean_listings(iter(raw)), date)
+    pd.testing.assert_frame_equal(result, expected)
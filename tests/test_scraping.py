@@ -0,0 +1,231 @@
+"""Test the helpers shared by the scrapers without touching the network."""
+import datetime as dt
+import threading
+import time
+from email.utils import format_datetime
+from pathlib import Path
+from typing import List
+from typing import Optional
+
+import pytest
+import requests
+
+from wheretolive import scraping
+from wheretolive.scraping import Checkpoint
+from wheretolive.scraping import RateLimiter
+from wheretolive.scraping import ScraperClient
+from wheretolive.scraping import _backoff_delay
+from wheretolive.scraping import _retry_after
+
+
+class _FakeClock:
+    """Stands in for the ``time`` module, sleeping just moves it forward."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps = list()
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _FakeClock:
+    """Run the scraping helpers on a clock that never really waits."""
+    clock = _FakeClock()
+    monkeypatch.setattr(scraping, "time", clock)
+    return clock
+
+
+def test_rate_limiter_spacing(clock: _FakeClock) -> None:
+    """Back to back requests go out evenly spaced, the first one right away."""
+    limiter = RateLimiter(requests_per_second=4)
+    sent = list()
+    for _ in range(5):
+        limiter.wait()
+        sent.append(clock.now)
+    assert sent == pytest.approx([0.0, 0.25, 0.5, 0.75, 1.0])
+    # Time spent idle doesn't build up into a burst later
+    clock.now += 10
+    limiter.wait()
+    limiter.wait()
+    assert clock.now == pytest.approx(11.25)
+
+
+def test_rate_limiter_threads() -> None:
+    """Workers sharing a limiter never go over the rate between them."""
+    limiter = RateLimiter(requests_per_second=50)
+    sent = list()
+    lock = threading.Lock()
+
+    def _worker() -> None:
+        for _ in range(4):
+            limiter.wait()
+            with lock:
+                sent.append(time.monotonic())
+
+    threads = [threading.Thread(target=_worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sent.sort()
+    # Sleeps can run a little long but never short, so the whole lot takes at
+    # least 15 intervals
+    assert sent[-1] - sent[0] >= 15 * 0.02 - 0.005
+
+
+def test_rate_limiter_rejects_zero() -> None:
+    """A limiter that lets nothing through would just hang."""
+    with pytest.raises(ValueError):
+        RateLimiter(requests_per_second=0)
+
+
+def _response(status_code: int, retry_after: Optional[str] = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b'{"Results": []}'
+    if retry_after is not None:
+        response.headers["Retry-After"] = retry_after
+    return response
+
+
+def test_retry_after_seconds() -> None:
+    """A number of seconds is taken as is, anything unreadable is ignored."""
+    assert _retry_after(_response(429, "5")) == 5.0
+    assert _retry_after(_response(429, "-3")) == 0.0
+    assert _retry_after(_response(429)) is None
+    assert _retry_after(_response(429, "soon")) is None
+
+
+def test_retry_after_date() -> None:
+    """An HTTP date means wait until then, or not at all once it's passed."""
+    now = dt.datetime.now(dt.timezone.utc)
+    later = format_datetime(now + dt.timedelta(seconds=30), usegmt=True)
+    # HTTP dates only go down to the second
+    assert _retry_after(_response(503, later)) == pytest.approx(30, abs=1.5)
+    earlier = format_datetime(now - dt.timedelta(minutes=5), usegmt=True)
+    assert _retry_after(_response(503, earlier)) == 0.0
+
+
+def test_backoff_delay_caps(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Delays double each attempt up to the cap, but the server always wins."""
+    monkeypatch.setattr(scraping.random, "uniform", lambda low, high: high)
+    ceilings = [_backoff_delay(attempt, 1.0, 60.0) for attempt in (1, 2, 7, 20)]
+    assert ceilings == [1.0, 2.0, 60.0, 60.0]
+    assert _backoff_delay(1, base=1.0, cap=60.0, retry_after=120.0) == 120.0
+    monkeypatch.setattr(scraping.random, "uniform", lambda low, high: low)
+    assert _backoff_delay(3, retry_after=5.0) == 5.0
+    assert _backoff_delay(3) == 0.0
+
+
+class _FakeSession:
+    """Gives back canned responses in order, raising any that are exceptions."""
+
+    def __init__(self, responses: List) -> None:
+        self.responses = list(responses)
+        self.calls = list()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        self.calls.append((method, url, kwargs))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class _CountingLimiter:
+    """Counts how many attempts waited on it without ever holding them up."""
+
+    def __init__(self) -> None:
+        self.waits = 0
+
+    def wait(self) -> None:
+        self.waits += 1
+
+
+def test_request_retries(clock: _FakeClock) -> None:
+    """Errors and bad statuses get retried, waiting out what the server asks."""
+    client = ScraperClient(backoff_base=1.0, backoff_cap=2.0, timeout=5.0)
+    ok = _response(200)
+    client._session = _FakeSession(
+        [requests.ConnectionError("reset"), _response(503, "10"), ok]
+    )
+    limiter = _CountingLimiter()
+    assert client.post("https://example.com", data={"a": 1}, limiter=limiter) is ok
+    assert limiter.waits == 3
+    assert len(clock.sleeps) == 2
+    assert 0 <= clock.sleeps[0] <= 1.0
+    assert clock.sleeps[1] == 10.0
+    method, url, kwargs = client._session.calls[0]
+    assert (method, kwargs) == ("POST", {"data": {"a": 1}, "timeout": 5.0})
+    assert (client.stats.requests, client.stats.failures) == (3, 2)
+
+
+def test_request_gives_up(clock: _FakeClock) -> None:
+    """Once every attempt has failed it raises, without sleeping after the last."""
+    client = ScraperClient(max_attempts=5)
+    client._session = _FakeSession([_response(500) for _ in range(3)])
+    with pytest.raises(RuntimeError, match="failed after 3 tries"):
+        client.get("https://example.com", max_attempts=3)
+    assert len(client._session.calls) == 3
+    assert len(clock.sleeps) == 2
+    assert (client.stats.requests, client.stats.failures) == (3, 3)
+
+
+def test_checkpoint_resume(tmp_path: Path) -> None:
+    """A new checkpoint on the same manifest picks up what was already done."""
+    path = tmp_path / "checkpoint.json"
+    checkpoint = Checkpoint(path)
+    dump = tmp_path / "page_1.jsonl.gz"
+    dump.touch()
+    checkpoint.mark_done("page_1", dump, next_page=2)
+    checkpoint.mark_done("page_2")
+    resumed = Checkpoint(path)
+    assert not resumed.complete
+    assert resumed.get("page_1")["output"] == "page_1.jsonl.gz"
+    assert resumed.get("page_1")["next_page"] == 2
+    assert resumed.is_done("page_2")
+    assert not resumed.is_done("page_3")
+    resumed.mark_complete()
+    assert Checkpoint(path).complete
+
+
+def test_checkpoint_missing_dump(tmp_path: Path) -> None:
+    """Units whose dump is gone have to be scraped again."""
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json")
+    dump = tmp_path / "page_1.jsonl.gz"
+    dump.touch()
+    checkpoint.mark_done("page_1", dump)
+    dump.unlink()
+    assert checkpoint.get("page_1") is None
+    assert not Checkpoint(tmp_path / "checkpoint.json").is_done("page_1")
+
+
+def test_checkpoint_atomic_save(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Dying part way through a save leaves the last good manifest in place."""
+    path = tmp_path / "checkpoint.json"
+    checkpoint = Checkpoint(path)
+    checkpoint.mark_done("page_1")
+    assert [p.name for p in tmp_path.iterdir()] == ["checkpoint.json"]
+
+    def _die_part_way(obj, f, **kwargs) -> None:
+        f.write('{"complete": fal')
+        raise OSError("Disk full")
+
+    monkeypatch.setattr(scraping.json, "dump", _die_part_way)
+    with pytest.raises(OSError):
+        checkpoint.mark_done("page_2")
+    monkeypatch.undo()
+    resumed = Checkpoint(path)
+    assert resumed.is_done("page_1")
+    assert not resumed.is_done("page_2")
@@ -0,0 +1,90 @@
+"""Test working out location features in python against made up reference data."""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wheretolive import spatial
+
+pytest.importorskip("shapely")
+pytest.importorskip("sklearn")
+
+
+def _square(size: float) -> dict:
+    """Square around the origin, as GeoJSON."""
+    ring = [[-size, -size], [size, -size], [size, size], [-size, size], [-size, -size]]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+# Points a tenth, a third and three quarters of a degree out, one without a location
+LISTINGS = pd.DataFrame(
+    {
+        "longitude": np.array([0.1, 0.3, 0.75, np.nan], dtype="float32"),
+        "latitude": np.array([0.0, 0.0, 0.0, np.nan], dtype="float32"),
+    },
+    index=[10, 11, 12, 13],
+)
+
+
+@pytest.fixture
+def indexes(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Nested commute squares, two flood squares and two grocery stores."""
+    isochrones = [
+        {"place_name": "DOWNTOWN", "mode": "CAR", "cutoff_time": t, "shape": shape}
+        for t, shape in [(10, _square(0.2)), (15, _square(0.5)), (20, _square(0.5))]
+    ]
+    floods = {
+        20: {"features": [{"geometry": _square(0.15)}]},
+        100: {"features": [{"geometry": _square(0.4)}]},
+    }
+    groceries = pd.DataFrame(
+        {"name": ["Close", "Far"], "latitude": [0.0, 0.0], "longitude": [0.1, 2.0]}
+    )
+    monkeypatch.setattr(
+        spatial, "_load_commute_index", lambda: spatial._commute_index(isochrones)
+    )
+    monkeypatch.setattr(
+        spatial, "_load_flood_index", lambda: spatial._flood_index(floods)
+    )
+    monkeypatch.setattr(
+        spatial, "_load_grocery_index", lambda: spatial._grocery_index(groceries)
+    )
+
+
+def test_features(indexes: None, tmp_path: Path) -> None:
+    """Every feature matches what the database views would give."""
+    result = spatial.add_spatial_features(LISTINGS, "mls")
+    assert list(result.columns) == [
+        *LISTINGS.columns,
+        *spatial.feature_columns("mls"),
+    ]
+    assert result.index.equals(LISTINGS.index)
+    fastest = result["DOWNTOWN_CAR_fastest"]
+    assert fastest.tolist() == [10, 15, pd.NA, pd.NA]
+    assert result["GF_WORK_CAR_fastest"].isna().all()
+    assert result["flood_risk"].tolist()[:3] == [
+        "1 in 20 flood risk",
+        "1 in 100 flood risk",
+        "Outside flood map",
+    ]
+    assert result["grocery_store_name"].tolist()[:3] == ["Close"] * 3
+    # A degree of longitude at the equator is about 111 km
+    expected_m = np.array([0.0, 0.2, 0.65]) * 111_195
+    np.testing.assert_allclose(result["m_to_grocery"][:3], expected_m, atol=5)
+    assert result["groceries_within_1km"].tolist() == [1, 0, 0, pd.NA]
+    # Everything survives a round trip through the clean file
+    result.to_parquet(tmp_path / "clean.pq", engine="fastparquet")
+    saved = pd.read_parquet(tmp_path / "clean.pq", engine="fastparquet")
+    assert saved["DOWNTOWN_CAR_fastest"].tolist() == fastest.tolist()
+
+
+def test_no_locations(indexes: None) -> None:
+    """Without any located listings every feature is missing, typed as usual."""
+    unlocated = LISTINGS.iloc[[3, 3]].set_axis([20, 21])
+    result = spatial.add_spatial_features(unlocated, "mls")
+    features = result[spatial.feature_columns("mls")]
+    assert features.isna().all().all()
+    assert result.index.equals(unlocated.index)
+    expected = spatial.add_spatial_features(LISTINGS, "mls").dtypes
+    assert result.dtypes.equals(expected)
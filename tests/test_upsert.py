@@ -0,0 +1,186 @@
+"""Test merging staged scrapes into a listings table against a real Postgres.
+
+Runs against the database in ``WHERETOLIVE_TEST_DB``, a SQLAlchemy URL, or a
+throwaway one from ``pgserver`` if that's installed, and skips otherwise. Tables
+are temporary and everything is rolled back, so any database will do.
+"""
+import datetime as dt
+import os
+from typing import Dict
+from typing import List
+
+import pytest
+import sqlalchemy
+
+from wheretolive.upsert import changed_keys
+from wheretolive.upsert import merge_staged
+
+COLUMNS = ["rfaster_id", "price", "rented", "first_seen_dt", "scrape_dt"]
+DAYS = [dt.datetime(2022, 2, day) for day in (6, 7, 8)]
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory: pytest.TempPathFactory):
+    """Engine for the test database, started up once for the module if need be."""
+    url = os.getenv("WHERETOLIVE_TEST_DB")
+    if url is None:
+        pgserver = pytest.importorskip("pgserver")
+        server = pgserver.get_server(tmp_path_factory.mktemp("pg"), cleanup_mode="stop")
+        url = server.get_uri()
+    engine = sqlalchemy.create_engine(url)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def conn(engine):
+    """Connection with empty listings, staging and history tables like rfaster's."""
+    with engine.connect() as conn:
+        trans = conn.begin()
+        conn.execute(
+            """
+            CREATE TEMP TABLE rfaster (
+                rfaster_id VARCHAR(10) PRIMARY KEY,
+                price REAL,
+                rented BOOLEAN,
+                first_seen_dt TIMESTAMP,
+                scrape_dt TIMESTAMP,
+                delisted_dt TIMESTAMP
+            );
+            CREATE TEMP TABLE rfaster_staging (LIKE rfaster INCLUDING DEFAULTS);
+            CREATE TEMP TABLE rfaster_history (
+                rfaster_id VARCHAR(10) NOT NULL,
+                change_dt TIMESTAMP NOT NULL,
+                change_type VARCHAR(20) NOT NULL,
+                old_price REAL,
+                new_price REAL
+            );
+            """
+        )
+        yield conn
+        trans.rollback()
+
+
+def _merge_day(conn, day: dt.datetime, prices: Dict, rented=()) -> Dict[str, int]:
+    """Stage a day's scrape the way ingest does, then merge it."""
+    conn.execute("TRUNCATE rfaster_staging;")
+    rows = [
+        {
+            "rfaster_id": rfaster_id,
+            "price": price,
+            "rented": rfaster_id in rented,
+            "first_seen_dt": day,
+            "scrape_dt": day,
+        }
+        for rfaster_id, price in prices.items()
+    ]
+    conn.execute(
+        sqlalchemy.text(
+            "INSERT INTO rfaster_staging (rfaster_id, price, rented, first_seen_dt, "
+            "scrape_dt) VALUES (:rfaster_id, :price, :rented, :first_seen_dt, "
+            ":scrape_dt)"
+        ),
+        rows,
+    )
+    return merge_staged(
+        conn,
+        "rfaster",
+        "rfaster_id",
+        COLUMNS,
+        keep_first=["first_seen_dt"],
+        status_column="rented",
+    )
+
+
+def _history(conn, day: dt.datetime) -> List[tuple]:
+    return [
+        tuple(row)
+        for row in conn.execute(
+            sqlalchemy.text(
+                "SELECT rfaster_id, change_type, old_price, new_price "
+                "FROM rfaster_history WHERE change_dt = :day "
+                "ORDER BY rfaster_id, change_type"
+            ),
+            {"day": day},
+        )
+    ]
+
+
+def test_merge_days(conn) -> None:
+    """History, delistings and upserts over a few days of scrapes."""
+    # The same listing picked up twice, only the one copied in last is kept
+    conn.execute(
+        sqlalchemy.text(
+            "INSERT INTO rfaster_staging (rfaster_id, price, scrape_dt) "
+            "VALUES ('a', 90, :day)"
+        ),
+        {"day": DAYS[0]},
+    )
+    conn.execute(
+        sqlalchemy.text(
+            "INSERT INTO rfaster_staging (rfaster_id, price, rented, first_seen_dt, "
+            "scrape_dt) SELECT v.id, v.price, False, :day, :day "
+            "FROM (VALUES ('a', 100), ('b', 200), ('c', 300)) AS v(id, price)"
+        ),
+        {"day": DAYS[0]},
+    )
+    assert merge_staged(
+        conn,
+        "rfaster",
+        "rfaster_id",
+        COLUMNS,
+        keep_first=["first_seen_dt"],
+        status_column="rented",
+    ) == {"upserted": 3, "delisted": 0}
+    assert _history(conn, DAYS[0]) == [
+        ("a", "listed", None, 100),
+        ("b", "listed", None, 200),
+        ("c", "listed", None, 300),
+    ]
+
+    # a didn't change, b went up and got rented, c's gone and d is new
+    result = _merge_day(conn, DAYS[1], {"a": 100, "b": 250, "d": 400}, rented={"b"})
+    assert result == {"upserted": 2, "delisted": 1}
+    assert _history(conn, DAYS[1]) == [
+        ("b", "price", 200, 250),
+        ("b", "rented", 200, 250),
+        ("c", "delisted", 300, None),
+        ("d", "listed", None, 400),
+    ]
+
+    # c's back and nothing else changed
+    prices = {"a": 100, "b": 250, "c": 300, "d": 400}
+    result = _merge_day(conn, DAYS[2], prices, rented={"b"})
+    assert result == {"upserted": 1, "delisted": 0}
+    assert _history(conn, DAYS[2]) == [("c", "relisted", 300, 300)]
+
+    listings = {
+        row.rfaster_id: row
+        for row in conn.execute("SELECT * FROM rfaster ORDER BY rfaster_id")
+    }
+    assert sorted(listings) == ["a", "b", "c", "d"]
+    assert all(row.delisted_dt is None for row in listings.values())
+    # Unchanged rows are never rewritten, changed ones keep when they were first seen
+    assert listings["a"].scrape_dt == DAYS[0]
+    assert listings["b"].first_seen_dt == DAYS[0]
+    assert listings["b"].scrape_dt == DAYS[1]
+    assert listings["c"].scrape_dt == DAYS[2]
+
+
+def test_changed_keys(conn) -> None:
+    """Only new listings and ones that changed in the compared columns come back."""
+    _merge_day(conn, DAYS[0], {"a": 100, "b": 200, "c": 300})
+    conn.execute("TRUNCATE rfaster_staging;")
+    conn.execute(
+        sqlalchemy.text(
+            "INSERT INTO rfaster_staging (rfaster_id, price, rented, scrape_dt) "
+            "SELECT v.id, v.price, v.rented, :day "
+            "FROM (VALUES ('a', 100, False), ('b', 250, False), ('c', 300, True), "
+            "('d', 400, False), ('d', 400, False)) AS v(id, price, rented)"
+        ),
+        {"day": DAYS[1]},
+    )
+    # b got a new price, c only got rented, d is new and staged twice
+    assert sorted(changed_keys(conn, "rfaster", "rfaster_id", ["price"])) == ["b", "d"]
+    both = changed_keys(conn, "rfaster", "rfaster_id", ["price", "rented"])
+    assert sorted(both) == ["b", "c", "d"]